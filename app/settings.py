@@ -37,6 +37,9 @@ SECRET_KEY = 'dev-key-very-secure'
 DEBUG = True
 COMPRESS_ENABLED = False
 
+# Collected API usage is only written when flushed by the tests
+TX_API_USAGE_FLUSH_INTERVAL = 24 * 60 * 60
+
 TX_CHANGELOG_HASHTAG_URL = 'https://github.com/krukas/Trionyx/issues/{tag}'
 
 # Database
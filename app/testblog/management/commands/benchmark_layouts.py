@@ -0,0 +1,54 @@
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.template.context import BaseContext
+from django.test import RequestFactory
+
+from trionyx.layout import Component
+from trionyx.views import tabs, layouts
+
+from app.testblog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Benchmark rendering of the testblog layouts, single template context vs a new context per component'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        post = Post.objects.first()
+        if not post:
+            self.stderr.write('No posts found, run the sample_data command first')
+            return
+
+        request = RequestFactory().get('/')
+        request.user = get_user_model().objects.filter(is_superuser=True).first() or get_user_model()(is_superuser=True)
+        layout_codes = ['view'] + [f'testblog.post-{item.code}' for item in tabs.get_tabs(Post, post)]
+
+        original_render_component = Component.render_component
+
+        def render_component_new_context(component, context, request=None):
+            """Previous behaviour, every component is rendered with a new context and runs the context processors"""
+            if isinstance(context, BaseContext):
+                context = context.flatten()
+            return original_render_component(component, context, request)
+
+        def benchmark():
+            start = time.perf_counter()
+            for _ in range(options['iterations']):
+                for code in layout_codes:
+                    layouts.get_layout(code, post).render(request)
+            return (time.perf_counter() - start) / options['iterations'] * 1000
+
+        benchmark()  # Warm up template loaders and caches
+        single_context = benchmark()
+        with patch.object(Component, 'render_component', render_component_new_context):
+            new_context = benchmark()
+
+        self.stdout.write(f'Layouts: {", ".join(layout_codes)}')
+        self.stdout.write(f'Context per component: {new_context:.2f} ms')
+        self.stdout.write(f'Single context:        {single_context:.2f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {new_context / single_context:.2f}x'))
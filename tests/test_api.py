@@ -1,8 +1,36 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import threading
+from collections import defaultdict
+from unittest.mock import patch
+
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.contenttypes.models import ContentType
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 
-from trionyx.trionyx.models import User
+from app.testblog.models import Post, Category, Tag
+from trionyx.api import serializers
+from trionyx.api.authentication import get_token_hash
+from trionyx.api.routers import AutoRouter
+from trionyx.api.serializers import plan_serializer_relations
+from trionyx.api.streaming import StreamingListViewSetMixin
+from trionyx.api.throttling import TokenBucket, has_atomic_cache
+from trionyx.api.usage import ApiUsageCollector
+from trionyx.config import models_config
+from trionyx.models import RelationPlanner
+from trionyx.testing import QueryCountTestMixin
+from trionyx.trionyx.auth import get_auth_version, is_auth_cache_enabled
+from trionyx.trionyx.search import get_search_backend
+from trionyx.trionyx.models import User, AuditLogEntry, ApiUsage
 
 
 class ApiTest(TestCase):
@@ -47,3 +75,664 @@ class ApiTest(TestCase):
     def test_api_get(self):
         response = self.api.get(f'/api/trionyx/user/{self.user.id}/')
         self.assertEqual(response.json()['email'], self.user.email)
+
+    def test_api_get_etag(self):
+        tag = Tag.objects.create(name='Django')
+        response = self.api.get(f'/api/testblog/tag/{tag.id}/')
+        etag = response['ETag']
+
+        response = self.api.get(f'/api/testblog/tag/{tag.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        tag.name = 'Python'
+        tag.save()
+        response = self.api.get(f'/api/testblog/tag/{tag.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['name'], 'Python')
+
+    def test_api_list_etag(self):
+        Tag.objects.create(name='Django')
+        response = self.api.get('/api/testblog/tag/')
+        etag = response['ETag']
+
+        response = self.api.get('/api/testblog/tag/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.api.get('/api/testblog/tag/', {'_search': 'Django'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        Tag.objects.all().delete()
+        response = self.api.get('/api/testblog/tag/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['count'], 0)
+
+
+class ApiSchemaTest(TestCase):
+
+    def setUp(self):
+        self.schema_dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(TX_API_SCHEMA_DIR=self.schema_dir.name)
+        self.settings.enable()
+        self.version = patch('trionyx.utils.get_app_version', return_value='1.0.0')
+        self.version.start()
+
+    def tearDown(self):
+        self.version.stop()
+        self.settings.disable()
+        self.schema_dir.cleanup()
+
+    def test_generate_command(self):
+        call_command('generate_api_schema', 'en-us', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(os.listdir(self.schema_dir.name)), 2)
+
+        with open(os.path.join(self.schema_dir.name, 'openapi-1.0.0-3.0.0-en-us.json.gz'), 'rb') as _file:
+            schema = json.loads(gzip.decompress(_file.read()))
+        self.assertIn('/api/testblog/post/', schema['paths'])
+
+    def test_generate_command_no_version(self):
+        self.version.stop()
+        with self.assertRaises(CommandError):
+            call_command('generate_api_schema', 'en-us')
+        self.version.start()
+
+    def test_schema_from_file(self):
+        call_command('generate_api_schema', 'en-us', stdout=open(os.devnull, 'w'))
+        with patch('trionyx.api.schema.generate_schema') as generate_schema:
+            response = self.client.get('/openapi', {'format': 'openapi-json'}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            generate_schema.assert_not_called()
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('max-age=3600', response['Cache-Control'])
+        self.assertIn('/api/testblog/post/', json.loads(gzip.decompress(response.content))['paths'])
+
+        response = self.client.get('/openapi', {'format': 'openapi-json'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_schema_generated_on_request(self):
+        response = self.client.get('/openapi')
+        self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi')
+        self.assertIn(b'/api/testblog/post/', response.content)
+        self.assertEqual(len(os.listdir(self.schema_dir.name)), 1)
+
+
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'created_by']
+
+
+class PostSerializer(serializers.ModelSerializer):
+    category = CategorySerializer()
+    created_by = serializers.StringRelatedField()
+    tag_names = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Post
+        fields = ['id', 'title', 'category', 'created_by', 'tags', 'tag_names']
+        prefetch_related = ['tags']
+
+    def get_tag_names(self, post):
+        return [tag.name for tag in post.tags.all()]
+
+
+class ApiQueryCountTest(QueryCountTestMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(email='info@trionyx.com', password='top_secret')
+        token, _ = Token.objects.get_or_create(user=self.user)
+
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        tags = [Tag.objects.create(name=f'Tag {index}') for index in range(3)]
+        for index in range(10):
+            post = Post.objects.create(
+                title=f'Post {index}',
+                content='',
+                publish_date=timezone.now(),
+                category=Category.objects.create(name=f'Category {index}', created_by=self.user),
+                created_by=self.user,
+            )
+            post.tags.set(tags)
+
+    def request_page(self, page_size):
+        response = self.api.get('/api/testblog/post/', {'_page_size': page_size})
+        self.assertEqual(len(response.json()['results']), page_size)
+
+    def test_api_list_constant_queries(self):
+        self.assertConstantQueries(self.request_page, page_sizes=(1, 10))
+
+    def test_api_list_only_used_columns(self):
+        with self.assertNumQueries(4) as context:
+            self.request_page(10)
+        self.assertNotIn('"testblog_post"."deleted"', context.captured_queries[-1]['sql'].split('FROM')[0])
+
+    def test_plan_serializer_relations(self):
+        planner = plan_serializer_relations(RelationPlanner(Post), PostSerializer())
+        self.assertEqual(planner.select_related, {'category', 'created_by'})
+        self.assertEqual(list(planner.prefetch_related), ['tags'])
+
+        def serialize(page_size):
+            PostSerializer(planner.apply(Post.objects.all())[:page_size], many=True).data
+
+        self.assertConstantQueries(serialize, page_sizes=(1, 10))
+        self.assertEqual(self.get_query_count(serialize, 10), 2)
+
+    def test_plan_serializer_primary_key_relation(self):
+        class PostPkSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Post
+                fields = ['id', 'title', 'category']
+
+        planner = plan_serializer_relations(RelationPlanner(Post), PostPkSerializer())
+        self.assertEqual(planner.select_related, set())
+        self.assertEqual(planner.get_columns(), ['category', 'id', 'title'])
+
+    def test_api_list_fields(self):
+        with self.assertNumQueries(4) as context:
+            response = self.api.get('/api/testblog/post/', {'_fields': 'id,title'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'title'})
+        self.assertNotIn('"testblog_post"."content"', context.captured_queries[-1]['sql'])
+
+    def test_api_list_expand(self):
+        response = self.api.get('/api/testblog/post/', {'_fields': 'id', '_expand': 'category,created_by'})
+        result = response.json()['results'][0]
+        self.assertEqual(set(result), {'id', 'category', 'created_by'})
+        self.assertEqual(result['category']['name'], Post.objects.get(id=result['id']).category.name)
+        self.assertEqual(result['created_by']['email'], 'info@trionyx.com')
+
+        def request_page(page_size):
+            response = self.api.get('/api/testblog/post/', {'_page_size': page_size, '_expand': 'category'})
+            self.assertEqual(len(response.json()['results']), page_size)
+
+        self.assertConstantQueries(request_page, page_sizes=(1, 10))
+
+    def test_api_get_expand(self):
+        post = Post.objects.first()
+        response = self.api.get(f'/api/testblog/post/{post.id}/', {'_expand': 'category'})
+        self.assertEqual(response.json()['category']['id'], post.category_id)
+
+    def test_generated_user_serializer_excludes_password(self):
+        router = AutoRouter()
+        serializer = router.generate_model_serializer(User, models_config.get_config(User))
+        self.assertIn('email', serializer.Meta.fields)
+        self.assertNotIn('password', serializer.Meta.fields)
+        self.assertNotIn('password', serializer(self.user).data)
+
+        with patch.object(serializers.serializer_register, 'get', return_value=None):
+            expand_serializer, many = router.get_expand_serializers(Post, router.get_model_serializer(Post)())['created_by']
+        self.assertFalse(many)
+        self.assertNotIn('password', expand_serializer(self.user).data)
+
+    def test_api_invalid_fields(self):
+        response = self.api.get('/api/testblog/post/', {'_fields': 'id,unknown', '_expand': 'title'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'_fields', '_expand'})
+
+    def test_api_schema_fields_params(self):
+        response = self.api.get('/openapi', {'format': 'openapi-json'})
+        self.assertEqual(response.status_code, 200)
+        parameters = [param['name'] for param in response.json()['paths']['/api/testblog/post/']['get']['parameters']]
+        self.assertIn('_fields', parameters)
+        self.assertIn('_expand', parameters)
+
+    def get_stream(self, params):
+        response = self.api.get('/api/testblog/post/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_api_stream_ndjson(self):
+        with patch.object(StreamingListViewSetMixin, 'stream_chunk_size', 3):
+            lines = [json.loads(line) for line in self.get_stream({'_stream': 'ndjson', '_fields': 'id,title'}).splitlines()]
+
+        self.assertEqual([line['title'] for line in lines], [f'Post {index}' for index in range(10)])
+        self.assertEqual(set(lines[0]), {'id', 'title', '_cursor'})
+
+        resumed = [json.loads(line) for line in self.get_stream({'_stream': 'ndjson', '_cursor': lines[4]['_cursor']}).splitlines()]
+        self.assertEqual([line['id'] for line in resumed], [line['id'] for line in lines[5:]])
+
+    def test_api_stream_json(self):
+        items = json.loads(self.get_stream({'_stream': 'json', 'title': 'Post 1'}))
+        self.assertEqual([item['title'] for item in items], ['Post 1'])
+
+        self.assertEqual(json.loads(self.get_stream({'_stream': 'json', 'title': 'Unknown'})), [])
+
+    def test_api_stream_queries(self):
+        def stream():
+            self.get_stream({'_stream': 'ndjson'})
+
+        self.assertEqual(self.get_query_count(stream), 2)
+
+    def test_api_stream_prefetch_chunks(self):
+        queryset = Post.objects.prefetch_related('tags')
+        chunks = list(StreamingListViewSetMixin().iter_chunks(queryset))
+        self.assertEqual([len(chunk) for chunk in chunks], [10])
+
+        with patch.object(StreamingListViewSetMixin, 'stream_chunk_size', 4):
+            chunks = list(StreamingListViewSetMixin().iter_chunks(queryset))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+
+    def test_api_stream_invalid(self):
+        self.assertEqual(self.api.get('/api/testblog/post/', {'_stream': 'xml'}).status_code, 400)
+        self.assertEqual(self.api.get('/api/testblog/post/', {'_stream': 'json', '_cursor': 'invalid'}).status_code, 400)
+
+
+class BulkApiTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(email='info@trionyx.com', password='top_secret')
+        token, _ = Token.objects.get_or_create(user=self.user)
+
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def get_tag_logs(self):
+        return AuditLogEntry.objects.filter(content_type=ContentType.objects.get_for_model(Tag))
+
+    def test_bulk_create(self):
+        response = self.api.post('/api/testblog/tag/bulk/', [
+            {'name': f'Tag {index}'} for index in range(3)
+        ], format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['name'] for item in response.json()], ['Tag 0', 'Tag 1', 'Tag 2'])
+        self.assertEqual(Tag.objects.count(), 3)
+        self.assertEqual(Tag.objects.first().created_by, self.user)
+        self.assertEqual(self.get_tag_logs().filter(action=AuditLogEntry.ACTION_ADDED).count(), 3)
+
+    def test_bulk_create_bulk_insert(self):
+        # SQLite on Django 3.2 can't return rows from a bulk insert, emulate it with the ids of each inserted row
+        inserted = defaultdict(list)
+
+        def collect_insert_ids(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.startswith('INSERT'):
+                inserted[context['cursor']].append((context['cursor'].lastrowid,))
+            return result
+
+        with patch.object(connection.features, 'can_return_rows_from_bulk_insert', True), \
+                patch.object(connection.ops, 'fetch_returned_insert_rows', inserted.pop, create=True), \
+                patch.object(Tag.objects, 'bulk_create', wraps=Tag.objects.bulk_create) as bulk_create, \
+                connection.execute_wrapper(collect_insert_ids):
+            response = self.api.post('/api/testblog/tag/bulk/', [
+                {'name': f'Tag {index}'} for index in range(3)
+            ], format='json')
+
+        self.assertEqual(response.status_code, 201)
+        bulk_create.assert_called_once()
+        self.assertEqual(sorted(Tag.objects.values_list('verbose_name', flat=True)), ['Tag 0', 'Tag 1', 'Tag 2'])
+        self.assertEqual(Tag.objects.first().created_by, self.user)
+        self.assertEqual(self.get_tag_logs().filter(action=AuditLogEntry.ACTION_ADDED).count(), 3)
+        self.assertEqual([result.title for result in get_search_backend().search('Tag 1', models=[Tag])], ['Tag 1'])
+
+    def test_bulk_create_errors(self):
+        response = self.api.post('/api/testblog/tag/bulk/', [
+            {'name': 'Valid'},
+            {'name': ''},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()[0], {})
+        self.assertIn('name', response.json()[1])
+        self.assertEqual(Tag.objects.count(), 0)
+
+    def test_bulk_create_no_list(self):
+        response = self.api.post('/api/testblog/tag/bulk/', {'name': 'Tag'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_update(self):
+        tags = [Tag.objects.create(name=f'Tag {index}') for index in range(3)]
+
+        response = self.api.patch('/api/testblog/tag/bulk/', [
+            {'id': tag.id, 'name': f'Updated {index}'} for index, tag in enumerate(tags)
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Tag.objects.order_by('id').values_list('name', flat=True)), [
+            'Updated 0', 'Updated 1', 'Updated 2'
+        ])
+        self.assertEqual(Tag.objects.get(id=tags[0].id).verbose_name, 'Updated 0')
+        self.assertEqual(self.get_tag_logs().filter(action=AuditLogEntry.ACTION_CHANGED).count(), 3)
+
+    def test_bulk_update_bulk_write(self):
+        tags = [Tag.objects.create(name=f'Tag {index}') for index in range(2)]
+
+        with patch.object(Tag.objects, 'bulk_update', wraps=Tag.objects.bulk_update) as bulk_update:
+            response = self.api.patch('/api/testblog/tag/bulk/', [
+                {'id': tag.id, 'name': f'Updated {index}'} for index, tag in enumerate(tags)
+            ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        bulk_update.assert_called_once()
+        self.assertEqual([result.title for result in get_search_backend().search('Updated 1', models=[Tag])], ['Updated 1'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-bulk'}})
+    def test_bulk_update_model_save(self):
+        user = User.objects.create_user(email='api@trionyx.com', password='top_secret')
+        version = get_auth_version(user.id)
+
+        with patch.object(User.objects, 'bulk_update', wraps=User.objects.bulk_update) as bulk_update:
+            response = self.api.patch('/api/trionyx/user/bulk/', [
+                {'id': user.id, 'email': 'changed@trionyx.com'},
+            ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        bulk_update.assert_not_called()
+        self.assertEqual(User.objects.get(id=user.id).email, 'changed@trionyx.com')
+        self.assertNotEqual(get_auth_version(user.id), version)
+
+    def test_bulk_update_not_found(self):
+        tag = Tag.objects.create(name='Tag')
+
+        response = self.api.patch('/api/testblog/tag/bulk/', [
+            {'id': tag.id, 'name': 'Updated'},
+            {'id': 999, 'name': 'Updated'},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), [{}, {'id': ['Object not found']}])
+        self.assertEqual(Tag.objects.get(id=tag.id).name, 'Tag')
+
+    def test_bulk_delete_ids(self):
+        tags = [Tag.objects.create(name=f'Tag {index}') for index in range(3)]
+
+        response = self.api.delete('/api/testblog/tag/bulk/', {'ids': [tags[0].id, tags[1].id]}, format='json')
+
+        self.assertEqual(response.json(), {'deleted': 2})
+        self.assertEqual(list(Tag.objects.values_list('name', flat=True)), ['Tag 2'])
+        self.assertEqual(self.get_tag_logs().filter(action=AuditLogEntry.ACTION_DELETED).count(), 2)
+
+    def test_bulk_delete_filter(self):
+        Tag.objects.create(name='Delete')
+        Tag.objects.create(name='Keep')
+
+        response = self.api.delete('/api/testblog/tag/bulk/?name=Delete')
+
+        self.assertEqual(response.json(), {'deleted': 1})
+        self.assertEqual(list(Tag.objects.values_list('name', flat=True)), ['Keep'])
+
+    def test_bulk_delete_requires_filter(self):
+        Tag.objects.create(name='Keep')
+
+        response = self.api.delete('/api/testblog/tag/bulk/')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_bulk_delete_empty_filters(self):
+        Tag.objects.create(name='Keep')
+
+        for query in ['_search=', 'name=', 'name=&_search=%20']:
+            response = self.api.delete(f'/api/testblog/tag/bulk/?{query}')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_bulk_invalid_ids(self):
+        tag = Tag.objects.create(name='Tag')
+
+        response = self.api.patch('/api/testblog/tag/bulk/', [{'id': [tag.id], 'name': 'Updated'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), [{'id': ['Invalid id']}])
+
+        response = self.api.delete('/api/testblog/tag/bulk/', {'ids': [tag.id, 'a']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_bulk_permission(self):
+        user = User.objects.create_user(email='user@trionyx.com', password='top_secret')
+        token, _ = Token.objects.get_or_create(user=user)
+        self.api.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        response = self.api.post('/api/testblog/tag/bulk/', [{'name': 'Tag'}], format='json')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Tag.objects.count(), 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-ratelimit'}})
+class RateLimitTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(email='info@trionyx.com', password='top_secret')
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket('test-bucket', 2, 60)
+        self.assertEqual(bucket.consume(now=1000), (True, 1))
+        self.assertEqual(bucket.consume(now=1000), (True, 0))
+        self.assertEqual(bucket.consume(now=1000), (False, 0))
+
+        allowed, tokens = bucket.consume(now=1030)
+        self.assertTrue(allowed)
+        self.assertAlmostEqual(tokens, 0)
+
+    def test_token_bucket_idle_capacity(self):
+        bucket = TokenBucket('test-bucket', 2, 60)
+        bucket.consume(now=1000)
+        self.assertEqual(bucket.consume(now=5000), (True, 1))
+        self.assertEqual(bucket.consume(now=5000), (True, 0))
+        self.assertEqual(bucket.consume(now=5000), (False, 0))
+
+    @override_settings(TX_API_RATE_LIMIT='2/minute')
+    def test_rate_limit(self):
+        response = self.api.get('/api/testblog/tag/')
+        self.assertEqual(response['X-RateLimit-Limit'], '2')
+        self.assertEqual(response['X-RateLimit-Remaining'], '1')
+
+        self.api.get('/api/testblog/tag/')
+        response = self.api.get('/api/testblog/tag/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['X-RateLimit-Remaining'], '0')
+        self.assertIn('Retry-After', response)
+
+    @override_settings(TX_API_RATE_LIMIT='2/minute', TX_API_RATE_LIMIT_TOKEN_BUCKET=False)
+    def test_rate_limit_history(self):
+        response = self.api.get('/api/testblog/tag/')
+        self.assertEqual(response['X-RateLimit-Limit'], '2')
+        self.assertEqual(response['X-RateLimit-Remaining'], '1')
+
+        self.api.get('/api/testblog/tag/')
+        response = self.api.get('/api/testblog/tag/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['X-RateLimit-Remaining'], '0')
+        self.assertIn('Retry-After', response)
+
+    def test_has_atomic_cache(self):
+        self.assertTrue(has_atomic_cache())
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache'}}):
+            self.assertFalse(has_atomic_cache())
+        with override_settings(CACHES={'default': {'BACKEND': 'django_redis.cache.RedisCache'}}):
+            self.assertTrue(has_atomic_cache())
+
+    def test_usage_anonymous_unique(self):
+        from django.db import IntegrityError, transaction
+        values = {'period': timezone.now(), 'token': '', 'endpoint': 'testblog.tag', 'method': 'GET'}
+        ApiUsage.objects.create(**values)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ApiUsage.objects.create(**values)
+
+    @override_settings(TX_API_RATE_LIMIT=None)
+    def test_model_rate_limit(self):
+        config = models_config.get_config(Tag)
+        config.api_rate_limits = {'POST': '1/minute'}
+        try:
+            self.assertEqual(self.api.post('/api/testblog/tag/', {'name': 'Django'}).status_code, 201)
+            self.assertEqual(self.api.post('/api/testblog/tag/', {'name': 'Python'}).status_code, 429)
+
+            response = self.api.get('/api/testblog/tag/')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-RateLimit-Limit', response)
+        finally:
+            config.api_rate_limits = None
+
+    @override_settings(TX_API_RATE_LIMIT='1/minute')
+    def test_usage(self):
+        with patch('trionyx.api.usage.collector', ApiUsageCollector()) as collector:
+            self.api.get('/api/testblog/tag/')
+            self.api.get('/api/testblog/tag/')
+            self.api.get(f'/api/trionyx/user/{self.user.id}/')
+            collector.flush()
+            collector.add(self.user, get_token_hash(self.token.key), 'testblog.tag', 'GET', 5000)
+            collector.flush()
+
+        usage = ApiUsage.objects.get(endpoint='testblog.tag')
+        self.assertEqual(usage.user, self.user)
+        self.assertEqual(usage.token, get_token_hash(self.token.key))
+        self.assertEqual(usage.method, 'GET')
+        self.assertEqual(usage.request_count, 3)
+        self.assertEqual(usage.max_duration, 5000)
+        self.assertEqual(usage.throttled_count, 1)
+        self.assertEqual(usage.error_count, 1)
+        self.assertEqual(ApiUsage.objects.get(endpoint='trionyx.user').request_count, 1)
+
+    @override_settings(TX_API_USAGE_FLUSH_SIZE=1)
+    def test_usage_flush_in_background(self):
+        flush_threads = []
+        with patch('trionyx.api.usage.collector', ApiUsageCollector()) as collector, \
+                patch.object(collector, 'flush', side_effect=lambda: flush_threads.append(threading.get_ident())):
+            self.assertEqual(self.api.get('/api/testblog/tag/').status_code, 200)
+            collector.flush_thread.join()
+
+        self.assertEqual(len(flush_threads), 1)
+        self.assertNotEqual(flush_threads[0], threading.get_ident())
+
+    def test_no_default_rate_limit(self):
+        response = self.api.get('/api/testblog/tag/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-RateLimit-Limit', response)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-auth'}})
+class CachedAuthTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='api@trionyx.com', password='top_secret')
+        self.group = Group.objects.create(name='API')
+        self.group.permissions.add(Permission.objects.get(codename='view_tag'))
+        self.user.groups.add(self.group)
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.tag = Tag.objects.create(name='Django')
+
+    def get_tag(self):
+        return self.api.get(f'/api/testblog/tag/{self.tag.id}/')
+
+    def test_no_auth_queries(self):
+        self.assertEqual(self.get_tag().status_code, 200)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.get_tag().status_code, 200)
+        queries = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertNotIn('authtoken_token', queries)
+        self.assertNotIn('auth_permission', queries)
+
+    def test_group_permission_change(self):
+        self.assertEqual(self.get_tag().status_code, 200)
+        self.group.permissions.clear()
+        self.assertEqual(self.get_tag().status_code, 403)
+
+    def test_user_group_change(self):
+        self.assertEqual(self.get_tag().status_code, 200)
+        self.group.user_set.remove(self.user)
+        self.assertEqual(self.get_tag().status_code, 403)
+
+    def test_user_change(self):
+        self.assertEqual(self.get_tag().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_tag().status_code, 401)
+
+    def test_user_activity_keeps_cache(self):
+        version = get_auth_version(self.user.id)
+        self.user.last_online = timezone.now()
+        self.user.save(update_fields=['last_online'])
+        self.user.save(update_fields=['last_login', 'last_online'])
+        self.assertEqual(get_auth_version(self.user.id), version)
+
+        self.user.save(update_fields=['last_online', 'is_active'])
+        self.assertNotEqual(get_auth_version(self.user.id), version)
+
+    def test_token_deleted(self):
+        self.assertEqual(self.get_tag().status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.get_tag().status_code, 401)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'}})
+class DatabaseCacheAuthTest(TestCase):
+
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+        self.user = User.objects.create_superuser(email='api@trionyx.com', password='top_secret')
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_auth_cache_disabled(self):
+        self.assertFalse(is_auth_cache_enabled())
+        with override_settings(TX_AUTH_CACHE=True):
+            self.assertTrue(is_auth_cache_enabled())
+
+    def test_no_cache_queries(self):
+        with patch('trionyx.trionyx.auth.cache') as auth_cache, patch('trionyx.api.authentication.cache') as token_cache:
+            self.assertEqual(self.api.get('/api/testblog/tag/').status_code, 200)
+            self.user.groups.add(Group.objects.create(name='API'))
+
+        self.assertEqual(auth_cache.method_calls, [])
+        self.assertEqual(token_cache.method_calls, [])
+
+
+class QueryFilterTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(email='info@trionyx.com', password='top_secret')
+        token, _ = Token.objects.get_or_create(user=self.user)
+
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.tags = [Tag.objects.create(name=name) for name in ['Django', 'django', 'Python']]
+
+    def get_names(self, params):
+        response = self.api.get('/api/testblog/tag/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(tag['name'] for tag in response.json()['results'])
+
+    def test_contains(self):
+        self.assertEqual(self.get_names({'name': 'DJANGO'}), ['Django', 'django'])
+
+    def test_exact(self):
+        self.assertEqual(self.get_names({'name__exact': 'Django'}), ['Django'])
+
+    def test_startswith(self):
+        self.assertEqual(self.get_names({'name__startswith': 'Py'}), ['Python'])
+
+    def test_in(self):
+        self.assertEqual(self.get_names({'name__in': 'Django,Python'}), ['Django', 'Python'])
+        self.assertEqual(self.get_names({'id__in': f'{self.tags[1].id},{self.tags[2].id}'}), ['Python', 'django'])
+
+    def test_range(self):
+        self.assertEqual(self.get_names({'id__range': f'{self.tags[0].id},{self.tags[1].id}'}), ['Django', 'django'])
+
+    def test_combined(self):
+        self.assertEqual(self.get_names({'name': 'django', 'id__gt': self.tags[0].id}), ['django'])
+        self.assertEqual(self.get_names({'name__not': 'py', 'id__lte': self.tags[1].id, 'id__gte': self.tags[1].id}), ['django'])
+
+    def test_multiple_values(self):
+        self.assertEqual(self.get_names({'name__exact': ['Django', 'Python']}), ['Django', 'Python'])
+
+    def test_isnull(self):
+        self.assertEqual(self.get_names({'created_by__isnull': 'true'}), ['Django', 'Python', 'django'])
+        self.assertEqual(self.get_names({'created_by__isnull': 'false'}), [])
+
+    def test_invalid(self):
+        response = self.api.get('/api/testblog/tag/', {'id__in': '1,a', 'name__foo': 'a', 'unknown': '1', 'id__range': '1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()), 4)
+        self.assertIn('Invalid operator: foo', response.json())
+        self.assertIn('Invalid field: unknown', response.json())
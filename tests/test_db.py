@@ -0,0 +1,100 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, RequestFactory, override_settings
+from django.http import HttpResponse
+from django.core.cache import cache
+from django.contrib.sessions.models import Session
+from django.contrib.auth import get_user_model
+
+from app.testblog.models import Post, Category
+from trionyx import utils, db
+from trionyx.config import models_config
+from trionyx.trionyx.middleware import ReadReplicaMiddleware
+from trionyx.views import AsyncJsendView, database_sync_to_async
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-db'}}
+
+
+@override_settings(TX_DB_REPLICAS=['replica'], CACHES=LOCMEM_CACHE)
+class ReadReplicaRouterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.router = db.ReadReplicaRouter()
+        self.user = get_user_model().objects.create_user(email='info@trionyx.com', password='top_secret')
+        utils.clear_local_data()
+
+    def tearDown(self):
+        utils.clear_local_data()
+
+    def test_read_primary_by_default(self):
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_read_replica(self):
+        self.assertTrue(db.use_read_replica(self.user))
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+        self.assertIsNone(self.router.db_for_read(Session))
+
+    @override_settings(TX_DB_REPLICAS=[])
+    def test_no_replicas(self):
+        self.assertFalse(db.use_read_replica(self.user))
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_read_primary_after_write(self):
+        db.use_read_replica(self.user)
+        self.router.db_for_write(Session)
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+
+        self.router.db_for_write(Category)
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_model_opt_out(self):
+        db.use_read_replica(self.user)
+        config = models_config.get_config(Post)
+        config.disable_read_replica = True
+        try:
+            self.assertIsNone(self.router.db_for_read(Post))
+            self.assertEqual(self.router.db_for_read(Category), 'replica')
+        finally:
+            config.disable_read_replica = False
+
+    def test_sticky_user(self):
+        db.set_primary_sticky(self.user)
+        self.assertFalse(db.use_read_replica(self.user))
+        self.assertTrue(db.use_read_replica(get_user_model().objects.create_user(email='other@trionyx.com')))
+
+    def test_middleware_sticky_after_write(self):
+        request = RequestFactory().post('/')
+        request.user = self.user
+
+        ReadReplicaMiddleware(lambda request: HttpResponse())(request)
+        self.assertFalse(db.is_primary_sticky(self.user))
+
+        def write_view(request):
+            Category.objects.create(name='Replica')
+            return HttpResponse()
+
+        ReadReplicaMiddleware(write_view)(request)
+        self.assertTrue(db.is_primary_sticky(self.user))
+
+    def test_async_view_write_sticky(self):
+        class WriteView(AsyncJsendView):
+            async def handle_request(self, request):
+                # Concurrent tasks don't share context variable changes with the view
+                await asyncio.gather(
+                    database_sync_to_async(Category.objects.create)(name='Replica'),
+                    database_sync_to_async(Post.objects.count)(),
+                )
+                return 'ok'
+
+        request = RequestFactory().post('/')
+        request.user = self.user
+        utils.set_local_data('request', request)
+
+        async_to_sync(ReadReplicaMiddleware(WriteView.as_view()))(request)
+        self.assertTrue(db.is_primary_sticky(self.user))
+
+    def test_allow_migrate(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'testblog'))
+        self.assertIsNone(self.router.allow_migrate('default', 'testblog'))
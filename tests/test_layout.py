@@ -1,10 +1,12 @@
 import re
 from datetime import datetime
 
-from django.test import TestCase
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone
 from trionyx import layout as l  # noqa E741
 
 from trionyx.trionyx.models import User
+from app.testblog.models import Category, Post, Tag
 
 
 class ModelsTest(TestCase):
@@ -90,6 +92,105 @@ class ModelsTest(TestCase):
         </div>
         """, self.layout.render())
 
+    def test_layout_index_incremental(self):
+        index = self.layout.get_index()
+        self.layout.add_component(l.Panel('Inserted', id='inserted'), path='row.column6[1]', before=True)
+
+        self.assertIs(self.layout.get_index(), index)
+        self.assertEqual(self.layout.find_component_by_path('row.panel[1]')[0].title, 'Inserted')
+        self.assertEqual(self.layout.find_component_by_path('row.column6[2].panel')[0].title, 'Right panel')
+        self.assertEqual(self.layout.get_paths(), l.LayoutIndex(self.layout).paths)
+
+        comp, parent = self.layout.find_component_by_id('inserted')
+        self.assertEqual(parent, self.layout.components[0])
+
+        self.layout.delete_component(id='inserted')
+        self.assertEqual(self.layout.find_component_by_id('inserted'), (None, None))
+        self.assertEqual(self.layout.get_paths(), l.LayoutIndex(self.layout).paths)
+        self.assertEqual(self.layout.find_component_by_path('row.column6[1].panel')[0].title, 'Right panel')
+
+    def test_layout_index_assets(self):
+        self.layout.add_component(l.HtmlTemplate('trionyx/components/html.html', js_files=['b.js', 'a.js']), id='left-panel')
+        self.layout.add_component(l.HtmlTemplate('trionyx/components/html.html', js_files=['a.js'], id='other'), id='right-panel')
+        self.assertEqual(self.layout.collect_js_files(), ['b.js', 'a.js'])
+
+        self.layout.delete_component(id='other')
+        self.assertEqual(self.layout.collect_js_files(), ['b.js', 'a.js'])
+        self.layout.delete_component(path='row.column6.htmltemplate[1]')
+        self.assertEqual(self.layout.collect_js_files(), [])
+
+    def test_layout_index_nested_field_assets(self):
+        html = l.HtmlTemplate('trionyx/components/html.html', js_files=['deep.js'])
+        layout = l.Layout(l.DescriptionList({'label': 'Value', 'value': l.Panel('Panel', l.Column12(html))}))
+        self.assertEqual(layout.collect_js_files(), ['deep.js'])
+
+        layout.get_index().remove(layout.components[0])
+        self.assertEqual(layout.collect_js_files(), [])
+
+    def test_layout_render_direct_component_change(self):
+        layout = l.Layout(l.Panel('Panel'))
+        layout.get_index()
+        layout.components[0].components.append(l.HtmlTemplate('trionyx/components/html.html', js_files=['added.js']))
+        self.assertIn('added.js', layout.render(self.get_request()))
+
+    def get_request(self, **params):
+        request = RequestFactory().get('/', params)
+        request.user = self.user
+        return request
+
+    def test_paginated_table(self):
+        for name in ['a', 'b', 'c']:
+            Category.objects.create(name=name)
+
+        table = l.Table(Category.objects.all(), 'name', id='categories', page_size=2, sortable=True, default_sort='name')
+        table.set_object(self.user)
+        html = table.render({}, self.get_request())
+        self.assertInHTML('<td>a</td>', html)
+        self.assertInHTML('<td>c</td>', html, count=0)
+        self.assertIn('txLoadMore', html)
+
+        html = table.render({}, self.get_request(component='categories', cursor=table.next_cursor))
+        self.assertInHTML('<td>c</td>', html)
+        self.assertInHTML('<td>a</td>', html, count=0)
+        self.assertIsNone(table.next_cursor)
+
+        table.request = self.get_request(component='categories', sort='-name')
+        self.assertEqual([obj.name for obj in table.get_objects()], ['c', 'b'])
+        self.assertEqual(table.get_header_fields()[0]['sorted'], 'desc')
+
+    def test_paginated_table_datetime_sort(self):
+        from trionyx.trionyx.models import Log, LogEntry
+        log = Log.objects.create(
+            log_hash='hash', level=40, message='Error', file_path='file.py', file_line=1, last_event=timezone.now())
+        for microsecond in [123100, 123456, 123999]:
+            log.entries.create(
+                log_time=datetime(2021, 1, 1, 12, 0, 0, microsecond, tzinfo=timezone.utc), path=str(microsecond))
+
+        for sort in ['log_time', '-log_time']:
+            table = l.Table(log.entries.order_by('-id'), 'log_time', 'path', id='log-entries', page_size=1,
+                            sortable=True, object=LogEntry())
+            paths, cursor = [], ''
+            for page in range(5):
+                table.request = self.get_request(component='log-entries', sort=sort, cursor=cursor)
+                paths.extend(entry.path for entry in table.get_objects())
+                cursor = table.next_cursor
+                if not cursor:
+                    break
+
+            expected = ['123100', '123456', '123999']
+            self.assertEqual(paths, expected if sort == 'log_time' else list(reversed(expected)))
+
+    def test_paginated_table_invalid_sort(self):
+        table = l.Table(Category.objects.all(), 'name', 'description', id='categories', page_size=2, sortable=True)
+        table.request = self.get_request(component='categories', sort='description__secret')
+        self.assertEqual(table.get_sort(Category.objects.all()), 'pk')
+
+    def test_table_related_fields(self):
+        table = l.Table(Post.objects.all(), 'title', 'category', 'tags')
+        queryset = table.get_objects()
+        self.assertEqual(queryset.query.select_related, {'category': {}})
+        self.assertEqual([lookup.prefetch_to for lookup in queryset._prefetch_related_lookups], ['tags'])
+
     def test_input(self):
         self.assertHTMLEqual(l.Input(name='test').render({}), """
         <div class="form-group no-margin ">
@@ -283,3 +384,150 @@ class ModelsTest(TestCase):
 
         self.assertEqual(chart.chart_data['labels'], ['Python3', 'Javascript', 'Sql'])
         self.assertEqual(chart.chart_data['datasets'][0]['data'], [60, 30, 10])
+
+    def create_posts(self):
+        news = Category.objects.create(name='News')
+        blog = Category.objects.create(name='Blog')
+        for category, price, day in [(news, 10, 1), (news, 15, 1), (blog, 5, 2)]:
+            Post.objects.create(
+                title='Post', content='', category=category, price=price,
+                publish_date=timezone.make_aware(datetime(2020, 1, day, 12)),
+            )
+
+    def test_table_footer_aggregate(self):
+        self.create_posts()
+        table = l.Table(
+            Post.objects.all(),
+            'title',
+            'price',
+            footer=[
+                None,
+                {'value': 'Total'},
+                'price=aggregate:sum',
+                'price=aggregate:count',
+            ]
+        )
+        table.set_object(self.user)
+
+        with self.assertNumQueries(1):
+            rows = table.get_rendered_footer_objects()
+        self.assertEqual([column['value'] for column in rows[0]], ['Total', '$30.00', '3'])
+
+    def test_table_footer_aggregate_list(self):
+        table = l.Table([], 'name', footer=[[{'amount': 2}, {'amount': 4}], 'amount=aggregate:avg'])
+        table.set_object(self.user)
+        self.assertEqual(table.get_rendered_footer_objects()[0][0]['value'], '3')
+
+    def test_grouped_chart(self):
+        self.create_posts()
+        chart = l.PieChart(Post.objects.all(), 'category', 'price=aggregate:sum')
+        with self.assertNumQueries(2):
+            chart.get_objects()
+
+        chart.set_object({})
+
+        self.assertEqual(chart.chart_data['labels'], ['News', 'Blog'])
+        self.assertEqual(chart.chart_data['datasets'][0]['data'], [25.0, 5.0])
+
+        chart = l.LineChart(Post.objects.all(), 'publish_date=trunc:day', 'price=aggregate:sum', 'id=aggregate:count')
+        chart.set_object({})
+        self.assertEqual([item['y'] for item in chart.chart_data['datasets'][0]['data']], [25.0, 5.0])
+        self.assertEqual([item['y'] for item in chart.chart_data['datasets'][1]['data']], [2, 1])
+
+    def test_single_context_render(self):
+        contexts = []
+
+        class CaptureContext(l.Component):
+            def render_template(self, context, request=None):
+                contexts.append(context)
+                return ''
+
+        panel = l.Panel('Panel', CaptureContext(), CaptureContext())
+        panel.set_object(self.user)
+        panel.render({})
+
+        self.assertEqual(len(contexts), 2)
+        self.assertIs(contexts[0], contexts[1])
+        self.assertNotIn('component', contexts[0])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_component_cache(self):
+        component = l.Field('first_name', id='cached-field', cache=True)
+        component.set_object(self.user)
+        self.assertNotIn('Trionyx', component.render({}))
+
+        # Saving the object changes updated_at and with that the cache key
+        self.user.first_name = 'Trionyx'
+        self.user.save()
+        component.set_object(self.user, force=True)
+        self.assertIn('Trionyx', component.render({}))
+
+        # Unchanged object is rendered from cache
+        self.user.first_name = 'Changed'
+        component.set_object(self.user, force=True)
+        self.assertIn('Trionyx', component.render({}))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_layout_cache(self):
+        from trionyx.views import LayoutRegister
+        register = LayoutRegister()
+        category = Category.objects.create(name='Category')
+
+        @register.register('cached-layout', cache=True, cache_depends_on=[Category])
+        def layout(obj):
+            return l.Html(', '.join(Category.objects.values_list('name', flat=True)))
+
+        self.assertEqual(register.render_layout('cached-layout', self.user).count('Category'), 1)
+        with self.assertNumQueries(0):
+            register.render_layout('cached-layout', self.user)
+
+        # Saving a dependency invalidates the cache
+        category.name = 'Changed'
+        category.save()
+        self.assertIn('Changed', register.render_layout('cached-layout', self.user))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_fragment_cache_model_saved_before_component(self):
+        # Like a save in a process that never constructed a component that depends on Tag
+        key = l.fragment_cache.get_key('code', None, None, [Tag])
+        Tag.objects.create(name='Django')
+        self.assertNotEqual(key, l.fragment_cache.get_key('code', None, None, [Tag]))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_component_cache_class_depends_on(self):
+        class TagNames(l.Html):
+            cache = True
+            cache_depends_on = [Tag]
+
+            def render_component(self, context, request=None):
+                return ', '.join(Tag.objects.values_list('name', flat=True))
+
+        Tag.objects.create(name='Django')
+        self.assertEqual(TagNames(id='tags').render({}), 'Django')
+        Tag.objects.create(name='Python')
+        self.assertEqual(TagNames(id='tags').render({}), 'Django, Python')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_component_cache_paginated(self):
+        for name in ['a', 'b', 'c']:
+            Category.objects.create(name=name)
+
+        def render(**params):
+            table = l.Table(Category.objects.all(), 'name', id='categories', page_size=2, sortable=True,
+                            default_sort='name', cache=True)
+            table.set_object(self.user)
+            return table, table.render({}, self.get_request(**params))
+
+        table, html = render()
+        self.assertInHTML('<td>a</td>', html)
+        self.assertInHTML('<td>c</td>', render(component='categories', cursor=table.next_cursor)[1])
+        self.assertInHTML('<td>c</td>', render(component='categories', sort='-name')[1])
+        self.assertInHTML('<td>a</td>', render()[1])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_fragment_key_timezone(self):
+        from django.utils import timezone
+        with timezone.override('Europe/Amsterdam'):
+            key = l.fragment_cache.get_key('code', self.user)
+        with timezone.override('America/New_York'):
+            self.assertNotEqual(key, l.fragment_cache.get_key('code', self.user))
@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from django.apps import apps
+from django.db import connection, NotSupportedError
+from django.db.migrations.state import ProjectState
+from django.test import TestCase
+
+from trionyx.models import (
+    filter_verbose_name_prefix, AddVerboseNamePrefixIndex, VERBOSE_NAME_PREFIX_LENGTH,
+    keyset_paginate, keyset_filter, encode_keyset_cursor, decode_keyset_cursor,
+)
+from app.testblog.models import Category
+
+
+class VerboseNamePrefixTest(TestCase):
+
+    def test_prefix_filter(self):
+        Category.objects.create(name='Python')
+        Category.objects.create(name='Django')
+
+        queryset = filter_verbose_name_prefix(Category.objects.all(), 'pyt')
+        self.assertEqual(list(queryset.values_list('name', flat=True)), ['Python'])
+
+    def test_prefix_filter_long_value(self):
+        name = 'a' * VERBOSE_NAME_PREFIX_LENGTH
+        Category.objects.create(name=name + 'b')
+        Category.objects.create(name=name + 'c')
+
+        queryset = filter_verbose_name_prefix(Category.objects.all(), name + 'c')
+        self.assertEqual(list(queryset.values_list('name', flat=True)), [name + 'c'])
+
+    def test_prefix_index_operation(self):
+        state = ProjectState.from_apps(apps)
+        editor = connection.SchemaEditorClass(connection, collect_sql=True)
+        operation = AddVerboseNamePrefixIndex('user')
+
+        operation.database_forwards('trionyx', editor, state, state)
+        self.assertEqual(editor.collected_sql, [])
+
+        with patch.object(connection, 'vendor', 'postgresql'):
+            operation.database_forwards('trionyx', editor, state, state)
+            operation.database_backwards('trionyx', editor, state, state)
+            with self.assertRaises(NotSupportedError):
+                AddVerboseNamePrefixIndex('user', concurrently=True).database_forwards('trionyx', editor, state, state)
+
+        create_sql, drop_sql = editor.collected_sql
+        self.assertRegex(create_sql, r'^CREATE INDEX IF NOT EXISTS "trionyx_user_\w+_prefix" ON "trionyx_user" ')
+        self.assertIn('(UPPER(LEFT("verbose_name", 255)) text_pattern_ops)', create_sql)
+        self.assertRegex(drop_sql, r'^DROP INDEX IF EXISTS "trionyx_user_\w+_prefix"')
+
+
+class KeysetPaginateTest(TestCase):
+
+    def test_forged_cursor(self):
+        Category.objects.create(name='Python')
+        cursor = base64.urlsafe_b64encode(json.dumps(['a', 'b']).encode()).decode()
+
+        self.assertIsNone(decode_keyset_cursor(cursor, Category, ['verbose_name', 'pk']))
+        self.assertEqual(keyset_filter(Category.objects.all(), ['verbose_name', 'pk'], cursor).count(), 1)
+
+    def test_datetime_cursor(self):
+        value = datetime(2021, 1, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+        cursor = encode_keyset_cursor([value, 1])
+
+        self.assertEqual(decode_keyset_cursor(cursor, Category, ['created_at', 'pk']), [value, 1])
+
+    def test_datetime_paginate(self):
+        for microsecond in [123100, 123456, 123999]:
+            category = Category.objects.create(name=str(microsecond))
+            Category.objects.filter(pk=category.pk).update(
+                created_at=datetime(2021, 1, 1, 12, 0, 0, microsecond, tzinfo=timezone.utc))
+
+        for fields in [['created_at', 'pk'], ['-created_at', '-pk']]:
+            names, cursor = [], None
+            for page in range(5):
+                rows, cursor = keyset_paginate(Category.objects.all(), fields, cursor, page_size=1)
+                names.extend(row.name for row in rows)
+                if not cursor:
+                    break
+            expected = ['123100', '123456', '123999']
+            self.assertEqual(names, expected if fields[0] == 'created_at' else list(reversed(expected)))
@@ -0,0 +1,62 @@
+import contextlib
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import django
+import rest_framework
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+
+from trionyx import layout as l  # noqa E741
+from trionyx.profiler import QueryInspector, execute_wrapper
+from trionyx.testing import QueryCountTestMixin
+from trionyx.trionyx.models import User
+
+
+class QueryInspectorTest(QueryCountTestMixin, TestCase):
+
+    def is_ignored(self, filename):
+        return any(filename.startswith(path) for path in QueryInspector.ignore_paths)
+
+    def test_ignore_paths(self):
+        self.assertTrue(self.is_ignored(django.db.models.query.__file__))
+        self.assertTrue(self.is_ignored(contextlib.__file__))
+        self.assertFalse(self.is_ignored(rest_framework.__file__))
+        self.assertFalse(self.is_ignored(json.__file__))
+
+    def test_source(self):
+        inspector = self.inspect_queries(lambda: list(User.objects.all()))
+        self.assertTrue(inspector.queries[0]['source'].startswith(os.path.relpath(__file__)))
+
+    def test_source_component(self):
+        class QueryComponent(l.Component):
+            def get_users(self):
+                return list(User.objects.all())
+
+        inspector = self.inspect_queries(QueryComponent().get_users)
+        self.assertTrue(inspector.queries[0]['source'].endswith('in get_users (component QueryComponent)'))
+
+    def test_source_max_depth(self):
+        with patch.object(QueryInspector, 'max_source_depth', 2):
+            inspector = self.inspect_queries(lambda: list(User.objects.all()))
+        self.assertEqual(inspector.queries[0]['source'], 'unknown')
+
+    def test_execute_wrapper_all_connections(self):
+        wrapper = MagicMock()
+        other = MagicMock()
+        with patch.object(connections, 'all', return_value=[connection, other]):
+            with execute_wrapper(wrapper):
+                self.assertIn(wrapper, connection.execute_wrappers)
+                other.execute_wrapper.assert_called_once_with(wrapper)
+        self.assertNotIn(wrapper, connection.execute_wrappers)
+
+
+@override_settings(TX_QUERY_INSPECTOR=True)
+class QueryInspectorMiddlewareTest(TestCase):
+
+    def test_server_timing(self):
+        user = User.objects.create_superuser(email='info@trionyx.com', password='top_secret')
+        self.client.force_login(user)
+        response = self.client.get(f'/model/trionyx/user/{user.id}/')
+        self.assertIn('db;dur=', response['Server-Timing'])
@@ -1,3 +1,6 @@
+import asyncio
+
+from asgiref.sync import async_to_sync, sync_to_async
 from django.test import TestCase
 from django.utils import translation
 
@@ -10,6 +13,17 @@ class UtilsTestCase(TestCase):
         self.assertNotEqual(utils.random_string(8), utils.random_string(8))
         self.assertEqual(len(utils.random_string(16)), 16)
 
+    def test_local_data_per_async_task(self):
+        async def task(value):
+            await sync_to_async(utils.set_local_data)('value', value)
+            await asyncio.sleep(0.01)
+            return await sync_to_async(utils.get_local_data)('value')
+
+        async def run():
+            return await asyncio.gather(task(1), task(2))
+
+        self.assertEqual(async_to_sync(run)(), [1, 2])
+
     def test_get_current_language(self):
         translation.activate('nl-nl')
         self.assertEqual('nl-nl', utils.get_current_language())
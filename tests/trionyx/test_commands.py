@@ -36,3 +36,75 @@ class CommandsTest(TestCase):
             out = StringIO()
             call_command('create_app', 'new_app', stdout=out)
             self.assertRaises(CommandError, call_command, 'create_app', 'new_app', stdout=out)
+
+
+class RebuildSearchIndexTest(TestCase):
+
+    def setUp(self):
+        from trionyx.trionyx.models import User
+        for index in range(5):
+            User.objects.create_user(email=f'user{index}@trionyx.com', password='top_secret')
+
+    def get_user_entries(self, engine_slug='default'):
+        from django.contrib.contenttypes.models import ContentType
+        from watson.models import SearchEntry
+        from trionyx.trionyx.models import User
+        return SearchEntry.objects.filter(engine_slug=engine_slug, content_type=ContentType.objects.get_for_model(User))
+
+    def test_rebuild_search_index(self):
+        from trionyx.trionyx.models import Task
+        self.get_user_entries().delete()
+
+        out = StringIO()
+        call_command('rebuild_search_index', 'trionyx.user', chunk_size=2, stdout=out)
+
+        self.assertIn('Planned rebuild with 3 chunks', out.getvalue())
+        self.assertEqual(self.get_user_entries().count(), 5)
+        self.assertEqual(self.get_user_entries('trionyx-rebuild').count(), 0)
+        self.assertEqual(Task.objects.get(identifier='rebuild_search_index').status, Task.COMPLETED)
+
+    def test_rebuild_search_index_resume(self):
+        from trionyx.trionyx.search import SearchIndexRebuild
+        rebuild = SearchIndexRebuild()
+        rebuild.plan(['trionyx.user'], chunk_size=2)
+        rebuild.build_chunk(0)
+        rebuild.mark_completed(0)
+
+        out = StringIO()
+        call_command('rebuild_search_index', 'trionyx.user', stdout=out)
+
+        self.assertIn('Resume rebuild, 1 of 3 chunks completed', out.getvalue())
+        self.assertEqual(self.get_user_entries().count(), 5)
+        self.assertFalse(SearchIndexRebuild().is_planned)
+
+    def test_rebuild_search_index_changes(self):
+        from trionyx.trionyx.models import User
+        from trionyx.trionyx.search import SearchIndexRebuild
+        rebuild = SearchIndexRebuild()
+        rebuild.plan(['trionyx.user'], chunk_size=2)
+        list(rebuild.run())
+
+        # Changes made while the chunks were built
+        User.objects.create_user(email='new@trionyx.com', password='top_secret')
+        user = User.objects.get(email='user0@trionyx.com')
+        user.email = 'changed@trionyx.com'
+        user.save()
+        User.objects.filter(email='user1@trionyx.com').delete()
+        SearchIndexRebuild().finish()
+
+        self.assertEqual(self.get_user_entries().count(), 5)
+        titles = ' '.join(self.get_user_entries().values_list('title', flat=True))
+        self.assertIn('new@trionyx.com', titles)
+        self.assertIn('changed@trionyx.com', titles)
+        self.assertNotIn('user0@trionyx.com', titles)
+        self.assertNotIn('user1@trionyx.com', titles)
+
+    def test_rebuild_search_index_celery(self):
+        out = StringIO()
+        call_command('rebuild_search_index', 'trionyx.user', chunk_size=2, celery=True, stdout=out)
+
+        self.assertEqual(self.get_user_entries().count(), 5)
+        self.assertEqual(self.get_user_entries('trionyx-rebuild').count(), 0)
+
+    def test_rebuild_search_index_unknown_model(self):
+        self.assertRaises(CommandError, call_command, 'rebuild_search_index', 'trionyx.task')
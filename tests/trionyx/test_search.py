@@ -0,0 +1,113 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from app.testblog.models import Post, Category
+from trionyx.config import models_config
+from trionyx.trionyx.search import (
+    get_search_backend, format_fields, WatsonSearchBackend, PostgresSearchBackend, SearchResult
+)
+
+
+class SearchBackendTest(TestCase):
+
+    def test_default_backend(self):
+        self.assertIsInstance(get_search_backend(), WatsonSearchBackend)
+        self.assertFalse(get_search_backend().uses_search_vector(Post))
+
+    def test_watson_filter(self):
+        Category.objects.create(name='Trionyx search')
+        Category.objects.create(name='Other')
+
+        queryset = get_search_backend().filter(Category.objects.all(), 'trionyx')
+        self.assertEqual(list(queryset.values_list('name', flat=True)), ['Trionyx search'])
+
+    def test_watson_search(self):
+        Category.objects.create(name='Trionyx search')
+
+        results = get_search_backend().search('trionyx', models=[Category])
+        self.assertEqual(len(results), 1)
+        self.assertIsInstance(results[0], SearchResult)
+        self.assertEqual(results[0].title, 'Trionyx search')
+
+    def test_format_fields(self):
+        self.assertEqual(format_fields('{publish_date} {title} {category.name}'), ['publish_date', 'title', 'category__name'])
+        self.assertEqual(format_fields(None), [])
+
+    def test_postgres_weighted_fields(self):
+        weighted_fields = PostgresSearchBackend().get_weighted_fields(Post)
+        self.assertEqual(weighted_fields['A'], ['title'])
+        self.assertEqual(weighted_fields['B'], ['publish_date', 'price'])
+        self.assertIn('content', weighted_fields['C'])
+        self.assertNotIn('title', weighted_fields['C'])
+
+    def test_postgres_weighted_fields_skip_relations(self):
+        from trionyx.config import models_config
+        config = models_config.get_config(Post)
+        search_title, config.search_title = config.search_title, '{title} {category.name}'
+        search_fields, config.search_fields = config.search_fields, ['content', 'category']
+        try:
+            weighted_fields = PostgresSearchBackend().get_weighted_fields(Post)
+        finally:
+            config.search_title, config.search_fields = search_title, search_fields
+
+        self.assertEqual(weighted_fields['A'], ['title'])
+        self.assertEqual(weighted_fields['C'], ['content'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL full-text search needs a PostgreSQL database')
+class PostgresSearchBackendTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from django.contrib.postgres.search import SearchVectorField
+        super().setUpClass()
+
+        # Schema change is rolled back with the transaction of the test class
+        cls.field = SearchVectorField(null=True)
+        cls.field.contribute_to_class(Category, 'search_vector')
+        with connection.schema_editor() as schema_editor:
+            schema_editor.add_field(Category, cls.field)
+        models_config.get_config(Category).search_vector_field = 'search_vector'
+
+    @classmethod
+    def tearDownClass(cls):
+        models_config.get_config(Category).search_vector_field = None
+        Category._meta.local_fields.remove(cls.field)
+        Category._meta._expire_cache()
+        delattr(Category, 'search_vector')
+        super().tearDownClass()
+
+    def setUp(self):
+        self.backend = PostgresSearchBackend()
+        Category.objects.create(name='Trionyx', description='Django framework')
+        Category.objects.create(name='Framework', description='Trionyx is built on Django')
+        Category.objects.create(name='Other', description='Nothing')
+        self.backend.update_search_vectors(Category)
+
+    def test_filter(self):
+        queryset = self.backend.filter(Category.objects.order_by('name'), 'trionyx')
+        self.assertEqual(list(queryset.values_list('name', flat=True)), ['Framework', 'Trionyx'])
+
+    def test_filter_empty_query(self):
+        self.assertEqual(self.backend.filter(Category.objects.all(), ' ').count(), 3)
+
+    def test_filter_search_index(self):
+        self.assertFalse(self.backend.uses_search_vector(Post))
+        self.assertEqual(self.backend.filter(Post.objects.all(), 'trionyx').count(), 0)
+
+    def test_search(self):
+        results = self.backend.search('trionyx', models=[Category])
+        self.assertEqual([result.title for result in results], ['Trionyx', 'Framework'])
+        self.assertGreater(results[0].rank, results[1].rank)
+
+    def test_search_limit(self):
+        self.assertEqual(len(self.backend.search('django', models=[Category], limit=1)), 1)
+
+    def test_search_vector_updated_for_pk(self):
+        category = Category.objects.create(name='Trionyx search')
+        self.assertEqual(self.backend.filter(Category.objects.filter(pk=category.pk), 'search').count(), 0)
+
+        self.backend.update_search_vectors(Category, pk=category.pk)
+        self.assertEqual(self.backend.filter(Category.objects.filter(pk=category.pk), 'search').count(), 1)
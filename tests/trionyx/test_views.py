@@ -1,14 +1,26 @@
+import asyncio
+import json
+import threading
 from unittest.mock import patch
-from django.test import TestCase
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings, AsyncClient, RequestFactory
+from django.core.cache import cache
 from django.contrib.contenttypes.models import ContentType
 
 from trionyx.trionyx.models import User
 from trionyx.trionyx.models import Task, AuditLogEntry
+from trionyx.forms import ModelAjaxChoiceField
+from trionyx.trionyx.views import GlobalSearchJsendView, UserTasksJsend, WidgetDataJsendView
+from trionyx.views import AsyncJsendView, ListJsendView
+from app.testblog.models import Category
 
 
 class ModelsTest(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_superuser(email='info@trionyx.com', password='top_secret')
         self.test_user = User.objects.create_user(email='test@test.com', password='top_secret')
         self.client.login(email='info@trionyx.com', password='top_secret')
@@ -57,6 +69,75 @@ class ModelsTest(TestCase):
         self.assertEqual(data['status'], 'success')
         self.assertEqual(data['data'][0]['items'][0]['url'], self.user.get_absolute_url())
 
+    def test_search_typeahead(self):
+        response = self.client.get('/global-search/', {
+            'search': 'inf',
+            'typeahead': 1,
+        })
+
+        data = response.json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(len(data['data']), 1)
+        self.assertEqual(data['data'][0]['items'][0]['title'], self.user.verbose_name)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_search_cached(self):
+        self.client.get('/global-search/', {'search': 'test', 'typeahead': 1})
+        User.objects.create_user(email='test2@test.com', password='top_secret')
+
+        with self.assertNumQueries(2):  # session and user
+            response = self.client.get('/global-search/', {'search': 'test', 'typeahead': 1})
+
+        self.assertEqual(len(response.json()['data'][0]['items']), 1)
+
+    # Form choices
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_search_permission_revoked(self):
+        from django.contrib.auth.models import Permission
+        permission = Permission.objects.get(codename='view_category')
+        self.test_user.user_permissions.add(permission)
+        Category.objects.create(name='Searchable')
+        self.client.login(email='test@test.com', password='top_secret')
+
+        response = self.client.get('/global-search/', {'search': 'sea', 'typeahead': 1})
+        self.assertEqual(len(response.json()['data']), 1)
+
+        self.test_user.user_permissions.remove(permission)
+        response = self.client.get('/global-search/', {'search': 'sea', 'typeahead': 1})
+        self.assertEqual(response.json()['data'], [])
+
+    def test_form_choices(self):
+        for index in range(25):
+            Category.objects.create(name=f'Category {index:02d}')
+        field = ModelAjaxChoiceField(Category.objects.all(), required=False)
+
+        response = self.client.get(f'/form/choices/{field.field_id}/')
+        data = response.json()
+        self.assertEqual(len(data['results']), 21)
+        self.assertEqual(data['results'][0]['id'], '')
+        self.assertEqual(data['results'][1]['text'], 'Category 00')
+        self.assertTrue(data['pagination']['more'])
+
+        response = self.client.get(f'/form/choices/{field.field_id}/', {'cursor': data['pagination']['cursor']})
+        data = response.json()
+        self.assertEqual([row['text'] for row in data['results']], [f'Category {index}' for index in range(20, 25)])
+        self.assertFalse(data['pagination']['more'])
+
+    def test_form_choices_search(self):
+        Category.objects.create(name='Trionyx')
+        Category.objects.create(name='Other')
+        field = ModelAjaxChoiceField(Category.objects.all())
+
+        response = self.client.get(f'/form/choices/{field.field_id}/', {'q': 'trio'})
+        self.assertEqual([row['text'] for row in response.json()['results']], ['Trionyx'])
+
+    def test_form_choices_invalid_cursor(self):
+        Category.objects.create(name='Trionyx')
+        field = ModelAjaxChoiceField(Category.objects.all())
+
+        response = self.client.get(f'/form/choices/{field.field_id}/', {'cursor': 'invalid'})
+        self.assertEqual(len(response.json()['results']), 1)
+
     # Filters
     def test_filters(self):
         response = self.client.get('/model-filter-fields/', {
@@ -238,3 +319,120 @@ class ModelsTest(TestCase):
 
         response = self.client.get(f'/sidebar/model/trionyx/user/{self.user.id}/item/')
         self.assertContains(response, 'User title')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RenderProfilerTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(email='info@trionyx.com', password='top_secret')
+        self.client.login(email='info@trionyx.com', password='top_secret')
+
+    def test_profile_disabled(self):
+        response = self.client.get(f'/model/trionyx/user/{self.user.id}/tab/?tab=general')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_profile_header(self):
+        url = f'/model/trionyx/user/{self.user.id}/tab/?tab=general'
+        response = self.client.get(url, HTTP_X_TRIONYX_PROFILE='1')
+        self.assertTrue(response['Server-Timing'].startswith('render;dur='))
+
+        response = self.client.get('/render-profiles/')
+        profiles = response.json()['data']
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]['path'], url)
+
+        response = self.client.get(profiles[0]['url'])
+        trace = response.json()['data']
+        self.assertTrue(trace['components'])
+        self.assertIn('queries', trace['components'][0])
+
+    def test_profiles_superuser_only(self):
+        User.objects.create_user(email='test@test.com', password='top_secret')
+        self.client.login(email='test@test.com', password='top_secret')
+        response = self.client.get('/render-profiles/')
+        self.assertEqual(response.status_code, 403)
+
+
+class AsyncJsendViewTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(email='info@trionyx.com', password='top_secret')
+        self.factory = RequestFactory()
+
+    def test_async_views(self):
+        for view in [GlobalSearchJsendView, UserTasksJsend, WidgetDataJsendView, ListJsendView]:
+            self.assertTrue(asyncio.iscoroutinefunction(view.as_view()))
+
+    def test_sync_handle_request(self):
+        class SyncView(AsyncJsendView):
+            def handle_request(self, request):
+                return request.user.email
+
+        request = self.factory.get('/')
+        request.user = self.user
+        response = async_to_sync(SyncView.as_view())(request)
+        self.assertEqual(json.loads(response.content), {'status': 'success', 'data': 'info@trionyx.com'})
+
+    def test_async_handle_request_error(self):
+        class ErrorView(AsyncJsendView):
+            async def handle_request(self, request):
+                raise LookupError('Not found')
+
+        response = async_to_sync(ErrorView.as_view())(self.factory.get('/'))
+        self.assertEqual(json.loads(response.content), {'status': 'error', 'message': 'Not found'})
+
+    def test_concurrent_requests(self):
+        Task.objects.create(celery_task_id='id', description='Test task', user=self.user)
+        client = AsyncClient()
+        client.force_login(self.user)
+
+        async def requests():
+            return await asyncio.gather(
+                client.get('/user-tasks/'),
+                client.get('/global-search/', {'search': 'info'}),
+                client.post('/dashboard/widget-data/', {'code': 'auditlog'}, content_type='application/json'),
+                client.get('/model/trionyx/user/ajax/'),
+            )
+
+        for response in async_to_sync(requests)():
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['status'], 'success')
+
+    def test_transaction_shared_thread(self):
+        class ThreadView(AsyncJsendView):
+            def handle_request(self, request):
+                return threading.get_ident()
+
+        response = async_to_sync(ThreadView.as_view())(self.factory.get('/'))
+        self.assertEqual(json.loads(response.content)['data'], threading.get_ident())
+
+
+@override_settings(MIDDLEWARE=[middleware for middleware in settings.MIDDLEWARE if not middleware.startswith('debug_toolbar')])
+class AsyncJsendViewConcurrencyTest(TransactionTestCase):
+
+    def test_slow_requests_overlap(self):
+        user = User.objects.create_superuser(email='info@trionyx.com', password='top_secret')
+        client = AsyncClient()
+        client.force_login(user)
+        barrier = threading.Barrier(2, timeout=5)
+
+        def slow_search(view, request, search, typeahead=False):
+            # Both requests must be in a query at the same time to pass the barrier
+            User.objects.count()
+            barrier.wait()
+            return [search]
+
+        async def requests():
+            return await asyncio.gather(
+                client.get('/global-search/?search=first'),
+                client.get('/global-search/?search=second'),
+            )
+
+        with patch.object(GlobalSearchJsendView, 'search', slow_search):
+            responses = async_to_sync(requests)()
+        self.assertEqual([response.json() for response in responses], [
+            {'status': 'success', 'data': ['first']},
+            {'status': 'success', 'data': ['second']},
+        ])
@@ -1,8 +1,18 @@
 import io
-from django.test import TestCase
+from unittest.mock import patch
 
-from trionyx.trionyx.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from django.utils import timezone
+
+from trionyx.trionyx.models import User, Log
 from trionyx.config import models_config
+from trionyx.testing import QueryCountTestMixin
+from trionyx.models import RelationPlanner
+from trionyx.renderer import renderer
+from app.testblog.models import Post, Category, Tag
 
 
 class ModelsTest(TestCase):
@@ -41,6 +51,19 @@ class ModelsTest(TestCase):
         self.assertEqual(data['status'], 'success')
         self.assertEqual(len(data['data']['items']), 2)
 
+    def test_ajax_listview_etag(self):
+        Tag.objects.create(name='Django')
+        response = self.client.get('/model/testblog/tag/ajax/')
+        etag = response['ETag']
+
+        response = self.client.get('/model/testblog/tag/ajax/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Tag.objects.create(name='Python')
+        response = self.client.get('/model/testblog/tag/ajax/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']['items']), 2)
+
     def test_ajax_listview_filters(self):
         response = self.client.post('/model/trionyx/user/ajax/', {
             'filters': '[{"field": "email", "operator": "==", "value": "info@trionyx.com"}]'
@@ -142,7 +165,7 @@ class ModelsTest(TestCase):
 
         data = response.json()
         self.assertEqual(data['status'], 'success')
-        self.assertEqual(len(data['data']), 2)
+        self.assertEqual(len(data['data']['choices']), 2)
 
     def test_listchoices_nested(self):
         response = self.client.get('/model/testblog/post/choices/', {
@@ -151,7 +174,7 @@ class ModelsTest(TestCase):
 
         data = response.json()
         self.assertEqual(data['status'], 'success')
-        self.assertEqual(len(data['data']), 2)
+        self.assertEqual(len(data['data']['choices']), 2)
 
     def test_listchoices_invalid(self):
         response = self.client.get('/model/testblog/post/choices/', {
@@ -160,7 +183,52 @@ class ModelsTest(TestCase):
 
         data = response.json()
         self.assertEqual(data['status'], 'success')
-        self.assertEqual(len(data['data']), 0)
+        self.assertEqual(len(data['data']['choices']), 0)
+
+    def test_listchoices_paged(self):
+        for index in range(60):
+            User.objects.create_user(email=f'user{index:02d}@test.com', password='top_secret')
+
+        response = self.client.get('/model/trionyx/user/choices/', {'field': 'created_by'})
+        data = response.json()['data']
+        self.assertEqual(len(data['choices']), 50)
+        self.assertTrue(data['more'])
+
+        response = self.client.get('/model/trionyx/user/choices/', {'field': 'created_by', 'cursor': data['cursor']})
+        data = response.json()['data']
+        self.assertEqual(len(data['choices']), 12)
+        self.assertFalse(data['more'])
+
+    def test_listchoices_search(self):
+        response = self.client.get('/model/trionyx/user/choices/', {'field': 'created_by', 'q': 'INFO'})
+        self.assertEqual(response.json()['data']['choices'], [[self.user.id, 'info@trionyx.com']])
+
+    def test_listchoices_ids(self):
+        response = self.client.get('/model/trionyx/user/choices/', {'field': 'created_by', 'ids': str(self.test_user.id)})
+        self.assertEqual(response.json()['data']['choices'], [[self.test_user.id, 'test@test.com']])
+
+    def test_listchoices_etag(self):
+        response = self.client.get('/model/trionyx/user/choices/', {'field': 'created_by'})
+        etag = response['ETag']
+
+        response = self.client.get('/model/trionyx/user/choices/', {'field': 'created_by'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.test_user.first_name = 'Changed'
+        self.test_user.save()
+        response = self.client.get('/model/trionyx/user/choices/', {'field': 'created_by'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_listchoices_etag_hard_delete(self):
+        other_user = User.objects.create_user(email='other@test.com', password='top_secret')
+        self.test_user.save()
+        response = self.client.get('/model/trionyx/user/choices/', {'field': 'created_by'})
+        etag = response['ETag']
+
+        User.objects.filter(id=other_user.id).delete()
+        response = self.client.get('/model/trionyx/user/choices/', {'field': 'created_by'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('other@test.com', response.content.decode())
 
     # Test detail view
     def test_detailview(self):
@@ -270,3 +338,96 @@ class ModelsTest(TestCase):
     def test_404_delete_view(self):
         response = self.client.get(self.get_user_url(9999, action='delete'))
         self.assertEqual(response.status_code, 404)
+
+
+class ListQueryCountTest(QueryCountTestMixin, TestCase):
+
+    def setUp(self):
+        User.objects.create_superuser(email='info@trionyx.com', password='top_secret')
+        self.client.login(email='info@trionyx.com', password='top_secret')
+
+        tags = [Tag.objects.create(name=f'Tag {index}') for index in range(3)]
+        for index in range(10):
+            post = Post.objects.create(
+                title=f'Post {index}',
+                content='',
+                publish_date=timezone.now(),
+                category=Category.objects.create(name=f'Category {index}'),
+            )
+            post.tags.set(tags)
+
+    def request_page(self, page_size):
+        response = self.client.post('/model/testblog/post/ajax/', {
+            'selected_fields': 'id,title,category,created_by',
+            'page_size': page_size,
+        })
+        self.assertEqual(len(response.json()['data']['items']), page_size)
+
+    def test_ajax_listview_constant_queries(self):
+        self.assertConstantQueries(self.request_page, page_sizes=(1, 10))
+
+    def test_ajax_listview_relations_joined(self):
+        self.request_page(1)
+        with self.assertNumQueries(8):
+            self.request_page(10)
+
+    def test_relation_planner(self):
+        planner = RelationPlanner(Post)
+        for field in ['title', 'category__name', 'category__created_by', 'tags']:
+            planner.add_field(field)
+
+        queryset = planner.apply(Post.objects.all())
+        self.assertEqual(planner.select_related, {'category', 'category__created_by'})
+        with self.assertNumQueries(2):
+            rendered = [renderer.render_field(post, 'tags') for post in queryset]
+        self.assertIn('Tag 0', rendered[0])
+
+    def get_list_select(self):
+        with CaptureQueriesContext(connection) as context:
+            self.request_page(10)
+
+        return next(
+            query['sql'] for query in context.captured_queries if 'FROM "testblog_post"' in query['sql'] and 'JOIN' in query['sql'])
+
+    def test_ajax_listview_whole_rows(self):
+        self.assertIn('"testblog_post"."content"', self.get_list_select())
+
+    def test_ajax_listview_only_columns(self):
+        with patch.object(models_config.get_config(Post), 'list_only_columns', True):
+            select = self.get_list_select()
+        self.assertIn('"testblog_post"."title"', select)
+        self.assertIn('"testblog_category"."verbose_name"', select)
+        self.assertNotIn('"testblog_post"."content"', select)
+        self.assertNotIn('"testblog_category"."description"', select)
+
+    def test_relation_planner_columns(self):
+        planner = RelationPlanner(Post)
+        planner.add_field('title', columns=['content'])
+        planner.add_field('category', default_renderer=False)
+        planner.add_field('created_by')
+        self.assertEqual(
+            planner.get_columns(),
+            ['category', 'content', 'created_by', 'created_by__id', 'created_by__verbose_name', 'id', 'title'],
+        )
+
+        planner.add_field('not_a_field')
+        self.assertIsNone(planner.get_columns())
+
+    def test_ajax_listview_no_n_plus_one(self):
+        self.assertNoNPlusOne(self.request_page, 10)
+
+    def test_n_plus_one_detected(self):
+        def render_categories():
+            return [str(post.category) for post in Post.objects.all()]
+
+        with self.assertRaisesRegex(AssertionError, r'Possible N\+1 \(10x.*\n.*tests/views/test_models.py:\d+ in <listcomp>'):
+            self.assertNoNPlusOne(render_categories)
+
+        with self.assertRaisesRegex(AssertionError, 'Query budget of 5 exceeded'):
+            self.assertQueryBudget(render_categories, 5)
+
+    @override_settings(TX_QUERY_INSPECTOR=True, TX_QUERY_BUDGETS={'trionyx:model-list-ajax': 1})
+    def test_query_inspector_middleware(self):
+        response = self.client.post('/model/testblog/post/ajax/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertTrue(Log.objects.filter(message='Query budget of 1 queries exceeded by view trionyx:model-list-ajax').exists())
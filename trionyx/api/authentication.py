@@ -0,0 +1,59 @@
+"""
+trionyx.api.authentication
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+import copy
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from trionyx.trionyx.auth import auth_cache, is_auth_cache_enabled
+
+
+def get_token_hash(key):
+    """Get hash of token key, it identifies the token without making the key visible"""
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches the token and user
+
+    Token and user are cached with the auth version of the user (see `trionyx.trionyx.auth`), so a change of the
+    user or token is used by the next request. Together with the `CachedModelBackend` for permissions an
+    API request is authenticated and authorized without database queries.
+
+    Without auth cache (see `is_auth_cache_enabled`) the token is loaded from the database as the TokenAuthentication does.
+    """
+
+    def get_token_hash(self, key):
+        """Get hash of token key, so the key is not visible in the cache"""
+        return get_token_hash(key)
+
+    def authenticate_credentials(self, key):
+        """Authenticate token from cache, fallback on database"""
+        if not is_auth_cache_enabled():
+            return super().authenticate_credentials(key)
+
+        token_hash = self.get_token_hash(key)
+        user_id = cache.get(f'trionyx-auth-token-{token_hash}')
+        cached = auth_cache.get(f'token-{token_hash}', user_id) if user_id else None
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(f'trionyx-auth-token-{token_hash}', user.pk, timeout=getattr(settings, 'TX_AUTH_CACHE_TIMEOUT', 60 * 60))
+            auth_cache.set(f'token-{token_hash}', user.pk, token)
+            cached = token
+
+        # Cached objects are shared, every request gets its own copy
+        token = copy.copy(cached)
+        token.user = copy.copy(cached.user)
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
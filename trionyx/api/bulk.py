@@ -0,0 +1,252 @@
+"""
+trionyx.api.bulk
+~~~~~~~~~~~~~~~~
+
+Bulk create, update and delete endpoints for model viewsets
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+import copy
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction, connections, router
+from django.db.models import Model
+from django.db.models.signals import pre_save, post_save
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from trionyx import utils
+from trionyx.layout import fragment_cache
+from trionyx.trionyx.search import get_search_backend
+
+
+class BulkModelViewSetMixin:
+    """
+    Adds `bulk/` endpoint to a model viewset
+
+    - POST a list of objects to create them
+    - PATCH a list of objects with `id` to update them
+    - DELETE with `{"ids": [...]}` or the list filters as query params to delete objects
+
+    Items are validated in batches before anything is written. When an item is invalid nothing is written
+    and a list with the errors of every item is returned. Writes are done with bulk_create/bulk_update
+    in one transaction and audit log entries are saved in batches.
+
+    Bulk writes don't call `save()` and don't send the save signals, the search index, fragment cache and
+    audit log are updated by the mixin. Objects of models with their own `save()` or other save receivers
+    (like the auth cache of users) are saved one by one, see `can_bulk_save`.
+    """
+
+    bulk_batch_size = 500
+    """Number of items that are validated and written per batch"""
+
+    bulk_max_items = 10000
+    """Maximum number of items in one request"""
+
+    def get_bulk_items(self, request):
+        """Get and check list of items from request"""
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValidationError({'non_field_errors': ['Expected a list of objects']})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [f'Maximum of {self.bulk_max_items} items per request']})
+        return items
+
+    def get_pk_value(self, model, value):
+        """Convert id to a primary key value of model, None when it is not a valid id"""
+        try:
+            return model._meta.pk.to_python(value)
+        except (DjangoValidationError, TypeError, ValueError):
+            return None
+
+    def validate_bulk_items(self, items, instances=None):
+        """Validate items in batches, returns the validated data and the errors per item"""
+        validated_data = []
+        errors = []
+        for start in range(0, len(items), self.bulk_batch_size):
+            batch = items[start:start + self.bulk_batch_size]
+            if instances is None:
+                serializers = [self.get_serializer(data=batch, many=True)]  # type: ignore
+            else:
+                serializers = [
+                    self.get_serializer(instance, data=item, partial=True)  # type: ignore
+                    for item, instance in zip(batch, instances[start:start + self.bulk_batch_size])
+                ]
+
+            for serializer in serializers:
+                if serializer.is_valid():
+                    data = serializer.validated_data
+                    validated_data.extend(data if isinstance(data, list) else [data])
+                    errors.extend([{}] * (len(data) if isinstance(data, list) else 1))
+                else:
+                    errors.extend(serializer.errors if isinstance(serializer.errors, list) else [serializer.errors])
+        return validated_data, errors
+
+    def get_model_values(self, model, validated_data):
+        """Split validated data in field values and many to many values"""
+        many_to_many = {field.name for field in model._meta.many_to_many}
+        return (
+            {name: value for name, value in validated_data.items() if name not in many_to_many},
+            {name: value for name, value in validated_data.items() if name in many_to_many},
+        )
+
+    def save_many_to_many(self, objects, many_to_many_values):
+        """Set many to many values of saved objects"""
+        for obj, values in zip(objects, many_to_many_values):
+            for name, value in values.items():
+                getattr(obj, name).set(value)
+
+    def get_bulk_save_receivers(self):
+        """Get save signal receivers whose work is done by the mixin for bulk written objects"""
+        from watson.search import default_search_engine
+        from trionyx.trionyx.auditlog import log_add, log_change
+        from trionyx.trionyx.search import update_search_vector
+        return [
+            fragment_cache.model_changed, log_add, log_change, update_search_vector, default_search_engine._post_save_receiver,
+        ]
+
+    def can_bulk_save(self, model):
+        """Check if objects of model can be written with bulk_create/bulk_update instead of save()"""
+        from trionyx.models import BaseModel
+        if model.save not in (Model.save, BaseModel.save):
+            return False
+
+        handled_receivers = self.get_bulk_save_receivers()
+        return all(
+            receiver in handled_receivers
+            for signal in [pre_save, post_save]
+            for receiver in signal._live_receivers(model)
+        )
+
+    def bulk_saved(self, model, objects):
+        """Update search index and fragment cache of objects saved without signals"""
+        get_search_backend().update_objects(model, objects)
+        fragment_cache.model_changed(model)
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        """Bulk create, update or delete objects"""
+        from trionyx.trionyx.auditlog import batch_logs
+
+        with transaction.atomic(), batch_logs(self.bulk_batch_size):
+            if request.method == 'POST':
+                return self.bulk_create(request)
+            elif request.method == 'PATCH':
+                return self.bulk_update(request)
+            return self.bulk_destroy(request)
+
+    def bulk_create(self, request):
+        """Create list of objects"""
+        from trionyx.trionyx.auditlog import log_bulk_add
+
+        model = self.get_queryset().model  # type: ignore
+        validated_data, errors = self.validate_bulk_items(self.get_bulk_items(request))
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = utils.get_current_user()
+        objects = []
+        many_to_many_values = []
+        for data in validated_data:
+            values, many_to_many = self.get_model_values(model, data)
+            obj = model(**values)
+            if hasattr(obj, 'generate_verbose_name'):
+                # bulk_create doesn't call save, set what BaseModel.save would set
+                obj.verbose_name = obj.generate_verbose_name()
+                obj.created_by = obj.created_by or (user if user and user.is_authenticated else None)
+            objects.append(obj)
+            many_to_many_values.append(many_to_many)
+
+        if connections[router.db_for_write(model)].features.can_return_rows_from_bulk_insert and self.can_bulk_save(model):
+            model.objects.bulk_create(objects, batch_size=self.bulk_batch_size)
+            self.save_many_to_many(objects, many_to_many_values)
+            log_bulk_add(objects)
+            self.bulk_saved(model, objects)
+        else:
+            # Database can't return the ids of bulk inserted rows or model needs save(), save objects one by one
+            for obj, many_to_many in zip(objects, many_to_many_values):
+                obj.save()
+                self.save_many_to_many([obj], [many_to_many])
+
+        return Response(self.get_serializer(objects, many=True).data, status=status.HTTP_201_CREATED)  # type: ignore
+
+    def bulk_update(self, request):
+        """Update list of objects, objects are matched on id"""
+        from trionyx.trionyx.auditlog import log_bulk_change
+
+        items = self.get_bulk_items(request)
+        model = self.get_queryset().model  # type: ignore
+        pks = [self.get_pk_value(model, item.get('id')) for item in items]
+        instances = self.get_queryset().in_bulk([pk for pk in pks if pk is not None])  # type: ignore
+
+        missing_errors = [
+            {} if pk in instances else {'id': ['Invalid id' if pk is None and 'id' in item else 'Object not found']}
+            for item, pk in zip(items, pks)
+        ]
+        if any(missing_errors):
+            return Response(missing_errors, status=status.HTTP_400_BAD_REQUEST)
+
+        objects = [instances[pk] for pk in pks]
+        old_objects = [copy.copy(obj) for obj in objects]
+        validated_data, errors = self.validate_bulk_items(items, objects)
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = set()
+        many_to_many_values = []
+        for obj, data in zip(objects, validated_data):
+            values, many_to_many = self.get_model_values(model, data)
+            for name, value in values.items():
+                setattr(obj, name, value)
+            fields.update(values)
+            if hasattr(obj, 'generate_verbose_name'):
+                obj.verbose_name = obj.generate_verbose_name()
+                obj.updated_at = timezone.now()
+                fields.update(['verbose_name', 'updated_at'])
+            many_to_many_values.append(many_to_many)
+
+        if self.can_bulk_save(model):
+            if fields:
+                model.objects.bulk_update(objects, sorted(fields), batch_size=self.bulk_batch_size)
+            self.save_many_to_many(objects, many_to_many_values)
+            log_bulk_change(zip(old_objects, objects))
+            self.bulk_saved(model, objects)
+        else:
+            # Model needs save(), save objects one by one
+            for obj, many_to_many in zip(objects, many_to_many_values):
+                obj.save()
+                self.save_many_to_many([obj], [many_to_many])
+
+        return Response(self.get_serializer(objects, many=True).data)  # type: ignore
+
+    def has_bulk_filters(self, request, queryset):
+        """Check if request has filters with a value and they filter the queryset"""
+        has_values = any(
+            value.strip()
+            for key, values in request.query_params.lists() if not key.startswith('_') or key == '_search'
+            for value in values
+        )
+        unfiltered = self.get_queryset().order_by().query.sql_with_params()  # type: ignore
+        return has_values and queryset.order_by().query.sql_with_params() != unfiltered
+
+    def bulk_destroy(self, request):
+        """Delete objects by ids or list filters, filters must not select all objects"""
+        queryset = self.filter_queryset(self.get_queryset())  # type: ignore
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+
+        if ids is None and not self.has_bulk_filters(request, queryset):
+            raise ValidationError({'non_field_errors': ['Give ids or filters of the objects to delete']})
+        if ids is not None:
+            if not isinstance(ids, list):
+                raise ValidationError({'ids': ['Expected a list of ids']})
+            pks = [self.get_pk_value(queryset.model, value) for value in ids]
+            if None in pks:
+                raise ValidationError({'ids': ['Invalid id']})
+            queryset = queryset.filter(pk__in=pks)
+
+        _, deleted = queryset.delete()
+        return Response({'deleted': deleted.get(queryset.model._meta.label, 0)})
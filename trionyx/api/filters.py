@@ -6,22 +6,26 @@ trionyx.api.filters
 :license: GPLv3
 """
 import logging
+from functools import reduce
+from operator import and_, or_
 
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.encoding import force_str
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ValidationError, FieldDoesNotExist
 from rest_framework.compat import coreapi, coreschema
 from rest_framework.filters import BaseFilterBackend
-from rest_framework.exceptions import ValidationError as APIValidationError, APIException
-from watson import search as watson
+from rest_framework.exceptions import ValidationError as APIValidationError
 
+from trionyx import utils
 from trionyx.config import models_config
-from trionyx.models import filter_queryset_with_user_filters
+from trionyx.trionyx.search import get_search_backend
 
 logger = logging.getLogger(__name__)
 
 
 class SearchFilter(BaseFilterBackend):
-    """Search filter that uses watson search"""
+    """Search filter that uses the search backend"""
 
     search_param = '_search'
 
@@ -40,7 +44,7 @@ class SearchFilter(BaseFilterBackend):
         """Filter queryset"""
         if not self.get_search_term(request):
             return queryset
-        return watson.filter(queryset, self.get_search_term(request), ranking=False)
+        return get_search_backend().filter(queryset, self.get_search_term(request))
 
     def get_schema_fields(self, view):
         """Get filter schema fields"""
@@ -73,62 +77,161 @@ class SearchFilter(BaseFilterBackend):
         ]
 
 
-class QueryFilter(BaseFilterBackend):
-    """Query filter"""
-
-    def filter_queryset(self, request, queryset, view):
-        """Filter queryset with filter_queryset_with_user_filters"""
-        config = models_config.get_config(queryset.model)
-
-        field_indexed = {
+class FilterFieldIndex:
+    """
+    Filterable fields per model, these are the list fields that are backed by a model field
+
+    Index of a model is build once, models of the API are indexed when the API urls are loaded.
+    """
+
+    def __init__(self):
+        """Init index"""
+        self.index = {}
+
+    def get(self, model):
+        """Get filterable fields of model"""
+        model_name = models_config.get_model_name(model)
+        if model_name not in self.index:
+            self.index[model_name] = self.build(model)
+        return self.index[model_name]
+
+    def clear(self):
+        """Clear index, needed when list fields are changed"""
+        self.index = {}
+
+    def build(self, model):
+        """Build filterable fields of model"""
+        config = models_config.get_config(model)
+        fields = {field.name: field for field in config.get_fields(True, True)}
+        for field_config in config.list_fields or []:
+            name = field_config if isinstance(field_config, str) else field_config.get('field')
+            if name and name not in fields and '__' in name:
+                try:
+                    related_model = reduce(
+                        lambda obj, field: getattr(obj, field).field.related_model, name.split('__')[:-1], model)
+                    fields[name] = models_config.get_config(related_model).get_field(name.split('__')[-1])
+                except (AttributeError, KeyError, FieldDoesNotExist):
+                    continue
+
+        return {
             name: {
                 'name': name,
-                'label': field['label'],
-                'type': field['type'],
-                'choices': field['choices'],
+                'type': config.get_field_type(field),
+                'field': field,
             }
-            for name, field in config.get_list_fields().items()
+            for name, field in fields.items()
+            if field.concrete and not field.many_to_many
         }
 
-        operator_mapping = {
-            'isnull': 'null',
-            'not': '!=',
-            'lt': '<',
-            'lte': '<=',
-            'gt': '>',
-            'gte': '>=',
-        }
+
+filter_fields = FilterFieldIndex()
+
+
+class QueryFilter(BaseFilterBackend):
+    """
+    Filter on list fields with `<field>__<operator>=<value>`, all filters are combined into one WHERE clause
+
+    Operators:
+
+    - no operator: equal, text fields contain the value (case insensitive)
+    - `exact`: case sensitive equal, can use index
+    - `startswith`: case sensitive starts with, can use index
+    - `in`: comma separated values
+    - `range`: two comma separated values, inclusive
+    - `not`: not equal, text fields don't contain the value
+    - `isnull`: true or false
+    - `lt`, `lte`, `gt`, `gte`
+
+    Multiple values for the same filter match any of the values.
+    """
+
+    operators = ['exact', 'startswith', 'in', 'range', 'not', 'isnull', 'lt', 'lte', 'gt', 'gte']
+    """Supported operators"""
+
+    max_in_values = 1000
+    """Maximum number of values for the in operator"""
+
+    def parse_bool(self, value):
+        """Parse boolean value"""
+        if value.lower() in ('true', '1', 'yes'):
+            return True
+        if value.lower() in ('false', '0', 'no'):
+            return False
+        raise ValueError('Expected true or false')
+
+    def parse_value(self, field, value):
+        """Parse and validate value for field"""
+        if field['type'] == 'bool':
+            return self.parse_bool(value)
+        if field['type'] in ('datetime', 'date'):
+            try:
+                return timezone.make_aware(timezone.datetime.strptime(
+                    value, utils.get_datetime_input_format(date_only=field['type'] == 'date')))
+            except ValueError:
+                pass
+
+        value = field['field'].to_python(value)
+        if value is None:
+            raise ValueError('Invalid value')
+        return value
+
+    def get_filter(self, field, operator, values):
+        """Get Q of filter"""
+        name = field['name']
+        if operator == 'isnull':
+            return Q(**{f'{name}__isnull': self.parse_bool(values[-1])})
+
+        if operator == 'in':
+            values = [self.parse_value(field, value) for raw in values for value in raw.split(',') if value != '']
+            if len(values) > self.max_in_values:
+                raise ValueError(f'Maximum of {self.max_in_values} values')
+            return Q(**{f'{name}__in': values})
+
+        if operator == 'range':
+            values = values[-1].split(',')
+            if len(values) != 2:
+                raise ValueError('Expected two comma separated values')
+            return Q(**{f'{name}__range': [self.parse_value(field, value) for value in values]})
+
+        if operator in (None, 'not'):
+            lookup = 'icontains' if field['type'] == 'text' else 'exact'
+        else:
+            lookup = operator
+
+        query = reduce(or_, [
+            Q(**{f'{name}__{lookup}': value if lookup == 'icontains' else self.parse_value(field, value)})
+            for value in values
+        ])
+        return ~query if operator == 'not' else query
+
+    def filter_queryset(self, request, queryset, view):
+        """Filter queryset"""
+        fields = filter_fields.get(queryset.model)
 
         errors = []
         filters = []
-        for key in request.GET:
+        for key in request.query_params:
             if key.startswith('_'):
                 continue
 
-            field, *operator = key.split('__')
-            if field not in field_indexed:
-                errors.append(f'Invalid field: {field}')
-                continue
+            for operator_name in self.operators:
+                if key.endswith(f'__{operator_name}'):
+                    name, operator = key[:-len(operator_name) - 2], operator_name
+                    break
+            else:
+                name, operator = key, None
 
-            if operator and operator[0] not in operator_mapping:
-                errors.append(f'Invalid operator: {operator[0]}')
+            if name not in fields:
+                field_name, _, operator = key.rpartition('__')
+                errors.append(f'Invalid operator: {operator}' if field_name in fields else f'Invalid field: {name}')
                 continue
 
-            filters.append({
-                'field': field,
-                'operator': operator_mapping.get(operator[0]) if operator else '==',
-                'value': request.GET.get(key),
-            })
+            try:
+                filters.append(self.get_filter(fields[name], operator, request.query_params.getlist(key)))
+            except (ValueError, ValidationError) as e:
+                errors.append('Invalid value for {}: {}'.format(key, ', '.join(getattr(e, 'messages', [str(e)]))))
 
         if errors:
             raise APIValidationError(errors)
 
-        try:
-            return filter_queryset_with_user_filters(queryset, filters, raise_exception=True)
-        except ValidationError as e:
-            raise APIValidationError(e.messages)
-        except ValueError as e:
-            raise APIValidationError(e)
-        except Exception as e:
-            logger.exception(e)
-            raise APIException()
+        return queryset.filter(reduce(and_, filters)) if filters else queryset
@@ -9,17 +9,28 @@ from importlib import import_module
 from collections import defaultdict
 
 from django.apps import apps
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.translation import get_language
 from rest_framework import routers
+from rest_framework.exceptions import ValidationError, PermissionDenied
 from rest_framework import serializers
-from rest_framework.permissions import DjangoModelPermissions
+from rest_framework.permissions import DjangoModelPermissions, SAFE_METHODS
 from rest_framework.viewsets import ModelViewSet, mixins, GenericViewSet
 from rest_framework.schemas.openapi import AutoSchema, SchemaGenerator, is_list_view
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
 
+from trionyx import db, utils
 from trionyx.config import models_config
 from trionyx.forms import form_register
-from trionyx.api.serializers import serializer_register
+from trionyx.api.serializers import serializer_register, plan_serializer_relations
+from trionyx.api.bulk import BulkModelViewSetMixin
+from trionyx.api.filters import filter_fields
+from trionyx.api.streaming import StreamingListViewSetMixin
+from trionyx.models import RelationPlanner
 from trionyx.trionyx.conf import settings as tx_settings
 
 
@@ -107,8 +118,51 @@ class APIAutoSchema(AutoSchema):
         operation['summary'] = self._get_operation_summary(path, method)
         operation['tags'] = self.tags
         operation['x-codeSamples'] = self._get_operation_code_samples(path, method)
+
+        if method == 'GET' and isinstance(self.view, RelationPlannerViewSetMixin):
+            operation['parameters'].extend([
+                {
+                    'name': self.view.fields_param,
+                    'required': False,
+                    'in': 'query',
+                    'description': str(_('Comma separated fields to return')),
+                    'schema': {'type': 'string'},
+                },
+                {
+                    'name': self.view.expand_param,
+                    'required': False,
+                    'in': 'query',
+                    'description': str(_('Comma separated relation fields to return as object instead of id')),
+                    'schema': {'type': 'string'},
+                },
+            ])
+
+        if is_list_view(path, method, self.view) and isinstance(self.view, StreamingListViewSetMixin):
+            operation['parameters'].extend([
+                {
+                    'name': self.view.stream_param,
+                    'required': False,
+                    'in': 'query',
+                    'description': str(_('Stream all objects without pagination as ndjson or json array')),
+                    'schema': {'type': 'string', 'enum': list(self.view.stream_content_types)},
+                },
+                {
+                    'name': self.view.cursor_param,
+                    'required': False,
+                    'in': 'query',
+                    'description': str(_('Resume stream after the object with this _cursor value')),
+                    'schema': {'type': 'string'},
+                },
+            ])
         return operation
 
+    def get_operation_id(self, path, method):
+        """Get operation id, bulk actions are unique per method"""
+        operation_id = super().get_operation_id(path, method)
+        if getattr(self.view, 'action', None) == 'bulk':
+            return operation_id.replace('bulk', f'bulk{method.title()}', 1)
+        return operation_id
+
     def get_description(self, *args, **kwargs):
         """Get api description"""
         model = getattr(getattr(self.view, 'queryset', None), 'model', None)
@@ -124,6 +178,8 @@ class APIAutoSchema(AutoSchema):
         method_name = getattr(self.view, 'action', method.lower())
         if is_list_view(path, method, self.view):
             action = _('List')
+        elif method_name == 'bulk':
+            action = '{} {}'.format(_('Bulk'), str(self.translate_mapping[method.lower()]).lower())
         elif method_name not in self.translate_mapping:
             action = method_name
         else:
@@ -252,13 +308,14 @@ class AutoRouter(routers.DefaultRouter):
                 continue
 
             model = config.model
+            filter_fields.get(model)  # Index filterable fields once at startup
             basename = model._meta.object_name.lower()
             classname = model.__name__
             serializer = serializer_register.get(model)
             serializer = serializer if serializer else self.generate_model_serializer(model, config)
 
             if [name for name, field in serializer().get_fields().items() if not field.read_only]:
-                base_classes = (ModelViewSet,)
+                base_classes = (BulkModelViewSetMixin, ModelViewSet)
             else:
                 base_classes = (
                     mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.DestroyModelMixin, GenericViewSet
@@ -266,18 +323,44 @@ class AutoRouter(routers.DefaultRouter):
 
             DynamicViewSet = type(
                 classname,
-                base_classes,
+                (ReadReplicaViewSetMixin, RelationPlannerViewSetMixin, ConditionalViewSetMixin, StreamingListViewSetMixin, *base_classes),
                 {}
             )
             DynamicViewSet.model = model
             DynamicViewSet.queryset = model.objects.get_queryset()
             DynamicViewSet.serializer_class = serializer
+            DynamicViewSet.relation_planner = plan_serializer_relations(RelationPlanner(model), serializer())
+            DynamicViewSet.expand_serializers = self.get_expand_serializers(model, serializer())
             DynamicViewSet.permission_classes = (ExtendedDjangoModelPermissions,)
             DynamicViewSet.ordering = ['pk']
             DynamicViewSet.schema = APIAutoSchema(tags=[config.get_verbose_name_plural()])
 
             self.register(self.get_model_prefix(model), DynamicViewSet, basename)
 
+    def get_model_serializer(self, model):
+        """Get registered serializer for model or generate one"""
+        return serializer_register.get(model) or self.generate_model_serializer(model, models_config.get_config(model))
+
+    def get_expand_serializers(self, model, serializer):
+        """Get serializers for the relation fields of serializer that can be expanded"""
+        expand_serializers = {}
+        for name, field in serializer.fields.items():
+            if not isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField)) or len(field.source_attrs) != 1:
+                continue
+
+            try:
+                related_model = model._meta.get_field(field.source).related_model
+                config = models_config.get_config(related_model)
+            except (FieldDoesNotExist, KeyError):
+                continue
+
+            if related_model and not config.api_disable:
+                expand_serializers[name] = (
+                    self.get_model_serializer(related_model),
+                    isinstance(field, serializers.ManyRelatedField),
+                )
+        return expand_serializers
+
     def generate_model_serializer(self, model, config):
         """Generate a model serializer with all fields"""
         class MetaModelSerializer(serializers.ModelSerializer):
@@ -295,7 +378,11 @@ class AutoRouter(routers.DefaultRouter):
             for form in form_register.get_all_forms(model):
                 fields.extend([name for name in form.base_fields])
 
-        model_fields = [field.name for field in config.get_fields(True, True)]
+        exclude_fields = set(config.api_exclude_fields)
+        if issubclass(model, AbstractBaseUser):
+            exclude_fields.add('password')
+
+        model_fields = [field.name for field in config.get_fields(True, True) if field.name not in exclude_fields]
         MetaModelSerializer.Meta.fields = [field for field in model_fields]
         MetaModelSerializer.Meta.read_only_fields = list({'id', 'created_at', 'updated_at', 'verbose_name', *[
             field for field in model_fields if field not in fields
@@ -325,6 +412,153 @@ class ExtendedDjangoModelPermissions(DjangoModelPermissions):
     }
 
 
+class ReadReplicaViewSetMixin:
+    """Read safe requests from the read replicas, checked after authentication so token users are also sticky to primary"""
+
+    def initial(self, request, *args, **kwargs):
+        """Use read replicas for safe methods"""
+        super().initial(request, *args, **kwargs)  # type: ignore
+        if request.method in SAFE_METHODS:
+            db.use_read_replica(request.user)
+
+
+class RelationPlannerViewSetMixin:
+    """
+    Load the relations used by the serializer with the queryset, safe requests only select the used columns
+
+    Safe requests can select fields with `_fields=id,name` and inline relations with `_expand=created_by`.
+    """
+
+    relation_planner = None
+    expand_serializers: dict = {}
+    """Serializer class and many flag of relation fields that can be expanded"""
+
+    fields_param = '_fields'
+    expand_param = '_expand'
+
+    def get_param_list(self, param):
+        """Get comma separated query param values, only used for safe requests"""
+        request = getattr(self, 'request', None)
+        if not request or request.method not in SAFE_METHODS:
+            return []
+        return [name.strip() for name in request.query_params.get(param, '').split(',') if name.strip()]
+
+    def select_serializer_fields(self, serializer):
+        """Prune serializer to the requested fields and replace expanded relations with a nested serializer"""
+        fields = self.get_param_list(self.fields_param)
+        expand = self.get_param_list(self.expand_param)
+        if not fields and not expand:
+            return serializer
+
+        errors = {}
+        unknown_fields = [name for name in fields if name not in serializer.fields]
+        if unknown_fields:
+            errors[self.fields_param] = _('Unknown fields: {fields}').format(fields=', '.join(unknown_fields))
+        invalid_expand = [name for name in expand if name not in self.expand_serializers or name not in serializer.fields]
+        if invalid_expand:
+            errors[self.expand_param] = _('Fields can not be expanded: {fields}').format(fields=', '.join(invalid_expand))
+        if errors:
+            raise ValidationError(errors)
+
+        for name in expand:
+            serializer_class, many = self.expand_serializers[name]
+            opts = serializer_class.Meta.model._meta
+            if not self.request.user.has_perm(f'{opts.app_label}.view_{opts.model_name}'):  # type: ignore
+                raise PermissionDenied(_('No permission to expand {field}').format(field=name))
+            source = serializer.fields[name].source
+            serializer.fields[name] = serializer_class(read_only=True, many=many, **({'source': source} if source != name else {}))
+
+        if fields:
+            for name in list(serializer.fields):
+                if name not in fields and name not in expand:
+                    serializer.fields.pop(name)
+        return serializer
+
+    def get_serializer(self, *args, **kwargs):
+        """Get serializer with the requested fields"""
+        serializer = super().get_serializer(*args, **kwargs)  # type: ignore
+        self.select_serializer_fields(getattr(serializer, 'child', serializer))
+        return serializer
+
+    def get_relation_planner(self):
+        """Get relation planner, planned for the requested fields when fields are selected or expanded"""
+        if not self.get_param_list(self.fields_param) and not self.get_param_list(self.expand_param):
+            return self.relation_planner
+
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())  # type: ignore
+        return plan_serializer_relations(RelationPlanner(self.queryset.model), self.select_serializer_fields(serializer))  # type: ignore
+
+    def get_queryset(self):
+        """Get queryset with planned relation loading"""
+        queryset = super().get_queryset()  # type: ignore
+        planner = self.get_relation_planner()
+        if planner:
+            queryset = planner.apply(queryset, only_columns=self.request.method in SAFE_METHODS)  # type: ignore
+        return queryset
+
+
+class ConditionalViewSetMixin:
+    """
+    ETag for list and detail responses, a request with a matching If-None-Match gets a 304 without serializing
+
+    Detail ETag is based on the pk and updated_at of the object, list ETag on the count and max updated_at
+    of the filtered objects. The updated_at of joined relations is included, responses with prefetched
+    relations or method fields have no ETag because their changes can't be detected.
+    """
+
+    def get_versions_queryset(self):
+        """Get filtered queryset and the version fields, fields are None when changes can't be detected"""
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)  # type: ignore
+        return queryset, self.get_relation_planner().get_version_fields()  # type: ignore
+
+    def get_list_etag(self, request):
+        """Get list ETag from a count and max updated_at aggregate"""
+        if request.query_params.get(getattr(self, 'stream_param', '_stream')):
+            return None
+
+        queryset, version_fields = self.get_versions_queryset()
+        if version_fields is None:
+            return None
+
+        versions = queryset.aggregate(
+            count=Count('pk'),
+            **{f'version_{index}': Max(field) for index, field in enumerate(version_fields)}
+        )
+        return utils.create_etag(request.get_full_path(), *[versions[key] for key in sorted(versions)], get_language())
+
+    def get_detail_etag(self, request):
+        """Get detail ETag from pk and updated_at"""
+        queryset, version_fields = self.get_versions_queryset()
+        if version_fields is None:
+            return None
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field  # type: ignore
+        versions = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).values_list(  # type: ignore
+            'pk', *version_fields).first()
+        return utils.create_etag(request.get_full_path(), *versions, get_language()) if versions else None
+
+    def conditional_response(self, request, etag, get_response):
+        """Get 304 response when client has given etag, otherwise the response of get_response"""
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is None:
+            response = get_response()
+
+        if etag and response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """List objects, with 304 response when not changed"""
+        return self.conditional_response(
+            request, self.get_list_etag(request), lambda: super(ConditionalViewSetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve object, with 304 response when not changed"""
+        return self.conditional_response(
+            request, self.get_detail_etag(request), lambda: super(ConditionalViewSetMixin, self).retrieve(request, *args, **kwargs))
+
+
 def router(prefix, viewset, basename):
     """
     Define an API route
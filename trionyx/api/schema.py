@@ -0,0 +1,189 @@
+"""
+trionyx.api.schema
+~~~~~~~~~~~~~~~~~~
+
+Pre-generated OpenAPI schema
+
+Generating the schema introspects every viewset and renders the code samples of every operation,
+which takes seconds. When the app has a version (`config.__version__`) the schema is generated once
+per version and language, stored as a gzip file in `TX_API_SCHEMA_DIR` and served from disk.
+Files are generated with the `generate_api_schema` command or after `migrate`, otherwise on first request.
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+import gzip
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.translation import get_language, get_supported_language_variant, override
+from django.views.generic import View
+from rest_framework.compat import yaml
+from rest_framework.renderers import JSONOpenAPIRenderer, OpenAPIRenderer
+
+import trionyx
+from trionyx import utils
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_FORMATS = {
+    'openapi': ('yaml', OpenAPIRenderer.media_type),
+    'openapi-json': ('json', JSONOpenAPIRenderer.media_type),
+}
+"""Schema formats by format param, with file extension and content type"""
+
+
+def get_schema_version():
+    """Get version of the schema, None when the app has no version"""
+    app_version = utils.get_app_version()
+    return f'{app_version}-{trionyx.__version__}' if app_version else None
+
+
+def get_schema_dir():
+    """Get directory of the schema files"""
+    schema_dir = getattr(settings, 'TX_API_SCHEMA_DIR', None)
+    if schema_dir:
+        return schema_dir
+    if getattr(settings, 'STATIC_ROOT', None):
+        return os.path.join(settings.STATIC_ROOT, 'openapi')
+    return os.path.join(tempfile.gettempdir(), 'trionyx-openapi')
+
+
+def get_schema_path(schema_format, language, version):
+    """Get path of the gzip schema file"""
+    extension, _ = SCHEMA_FORMATS[schema_format]
+    return os.path.join(get_schema_dir(), f'openapi-{version}-{language}.{extension}.gz')
+
+
+def get_schema_formats():
+    """Get available schema formats, yaml needs PyYAML"""
+    return [schema_format for schema_format in SCHEMA_FORMATS if yaml or schema_format != 'openapi']
+
+
+def generate_schema(schema_format, language):
+    """Generate and render schema"""
+    from trionyx.api.routers import APISchemaGenerator
+
+    with override(language):
+        generator = APISchemaGenerator(description=render_to_string('trionyx/api/description.html'))
+        schema = generator.get_schema(request=None, public=True)
+        if schema_format == 'openapi':
+            return OpenAPIRenderer().render(schema)
+        return JSONOpenAPIRenderer().render(schema)
+
+
+def write_schema_file(schema_format, language, version):
+    """Generate schema and write it as gzip file, the file is replaced atomically so running workers never read half a file"""
+    path = get_schema_path(schema_format, language, version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    content = gzip.compress(generate_schema(schema_format, language), mtime=0)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.openapi-')
+    try:
+        with os.fdopen(fd, 'wb') as _file:
+            _file.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def generate_schema_files(languages=None, force=False):
+    """Generate schema files of current version, existing files are kept unless forced. Returns written paths"""
+    version = get_schema_version()
+    if not version:
+        return []
+
+    paths = []
+    for language in languages or [code for code, _ in settings.LANGUAGES]:
+        for schema_format in get_schema_formats():
+            if force or not os.path.isfile(get_schema_path(schema_format, language, version)):
+                paths.append(write_schema_file(schema_format, language, version))
+    return paths
+
+
+def generate_schema_files_after_migrate(sender, **kwargs):
+    """Generate missing schema files of a new release after migrate"""
+    if getattr(settings, 'TX_DISABLE_API', False) or not getattr(settings, 'TX_API_SCHEMA_GENERATE_ON_MIGRATE', True):
+        return
+
+    try:
+        generate_schema_files()
+    except Exception as e:
+        # Migrate must not fail on the schema, it is generated on first request
+        logger.exception(e)
+
+
+class OpenAPISchemaView(View):
+    """
+    Serve OpenAPI schema from the pre-generated gzip file
+
+    Format is selected with `?format=openapi-json` or the Accept header, default is yaml.
+    Apps without a version get a schema that is generated on request and cached for an hour.
+    """
+
+    cache_timeout = 60 * 60
+    """Max age for browsers and cache timeout of unversioned schemas"""
+
+    def get_format(self, request):
+        """Get requested schema format"""
+        schema_format = request.GET.get('format')
+        if schema_format in get_schema_formats():
+            return schema_format
+        if 'json' in request.META.get('HTTP_ACCEPT', '') or 'openapi' not in get_schema_formats():
+            return 'openapi-json'
+        return 'openapi'
+
+    def get_language(self):
+        """Get active language as one of LANGUAGES"""
+        try:
+            return get_supported_language_variant(get_language())
+        except LookupError:
+            return settings.LANGUAGE_CODE
+
+    def get_content(self, schema_format, language, version):
+        """Get gzip content of schema"""
+        if not version:
+            cache_key = f'trionyx-openapi-{schema_format}-{language}-{trionyx.__version__}'
+            content = cache.get(cache_key)
+            if content is None:
+                content = gzip.compress(generate_schema(schema_format, language), mtime=0)
+                cache.set(cache_key, content, timeout=self.cache_timeout)
+            return content
+
+        path = get_schema_path(schema_format, language, version)
+        if not os.path.isfile(path):
+            write_schema_file(schema_format, language, version)
+        with open(path, 'rb') as _file:
+            return _file.read()
+
+    def get(self, request, *args, **kwargs):
+        """Get schema"""
+        schema_format = self.get_format(request)
+        language = self.get_language()
+        version = get_schema_version()
+
+        etag = utils.create_etag(schema_format, language, version) if version else None
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is None:
+            content = self.get_content(schema_format, language, version)
+            if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+                response = HttpResponse(content, content_type=SCHEMA_FORMATS[schema_format][1])
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(gzip.decompress(content), content_type=SCHEMA_FORMATS[schema_format][1])
+
+        if etag:
+            response['ETag'] = etag
+        response['Content-Language'] = language
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding', 'Accept-Language', 'Cookie'])
+        patch_cache_control(response, public=True, max_age=self.cache_timeout)
+        return response
@@ -41,5 +41,47 @@ class SerializerRegister:
         return self.serializers.get(self.get_model_alias(model_alias))
 
 
+def plan_serializer_relations(planner, serializer, prefix=''):
+    """
+    Add the fields of serializer to the RelationPlanner, so relations are joined or prefetched and only used columns are selected
+
+    Serializers can declare relations used by method fields with the Meta options `select_related` and `prefetch_related`.
+    """
+    meta = getattr(serializer, 'Meta', None)
+    for lookup in getattr(meta, 'select_related', []):
+        planner.add_field(prefix + lookup, default_renderer=False)
+    for lookup in getattr(meta, 'prefetch_related', []):
+        planner.add_prefetch(prefix + lookup)
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        if field.source == '*':
+            if isinstance(field, BaseSerializer):  # noqa F405
+                plan_serializer_relations(planner, field, prefix)
+            else:
+                # Method fields can use any column
+                planner.full_relations.add(prefix[:-2])
+            continue
+
+        path = prefix + '__'.join(field.source_attrs)
+        if isinstance(field, ListSerializer) and hasattr(getattr(field.child, 'Meta', None), 'model'):  # noqa F405
+            planner.add_field(path, default_renderer=False)
+            child_planner = plan_serializer_relations(type(planner)(field.child.Meta.model), field.child)
+            for lookup in [*child_planner.select_related, *child_planner.prefetch_related]:
+                planner.add_prefetch(f'{path}__{lookup}')
+        elif isinstance(field, BaseSerializer):  # noqa F405
+            planner.add_field(path, default_renderer=False)
+            plan_serializer_relations(planner, field, f'{path}__')
+        elif isinstance(field, RelatedField) and field.use_pk_only_optimization() and len(field.source_attrs) == 1:  # noqa F405
+            # Only the primary key is used, which is the foreign key column
+            planner.add_column(path)
+        else:
+            planner.add_field(path, default_renderer=False)
+
+    return planner
+
+
 serializer_register = SerializerRegister()
 register = serializer_register.register
@@ -0,0 +1,105 @@
+"""
+trionyx.api.streaming
+~~~~~~~~~~~~~~~~~~~~~
+
+Streaming list responses for large API exports
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+import json
+import logging
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from trionyx.models import keyset_filter, keyset_paginate, get_keyset_cursor, decode_keyset_cursor
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingListViewSetMixin:
+    """
+    List all objects in one streamed response with `_stream=ndjson` (one object per line) or `_stream=json` (JSON array)
+
+    There is no pagination and no count query, objects are ordered by id and every object has a `_cursor` resume token.
+    When the connection drops the export continues after the last received object with `_cursor=<token>`.
+    Filters, search, `_fields` and `_expand` can be combined with streaming.
+    """
+
+    stream_param = '_stream'
+    cursor_param = '_cursor'
+
+    stream_chunk_size = 1000
+    """Number of objects that are fetched and serialized per chunk"""
+
+    stream_content_types = {
+        'ndjson': 'application/x-ndjson',
+        'json': 'application/json',
+    }
+
+    def list(self, request, *args, **kwargs):
+        """List objects, streamed when requested"""
+        stream_format = request.query_params.get(self.stream_param)
+        if not stream_format:
+            return super().list(request, *args, **kwargs)  # type: ignore
+
+        if stream_format not in self.stream_content_types:
+            raise ValidationError({self.stream_param: [f'Invalid format, options are: {", ".join(self.stream_content_types)}']})
+
+        queryset = self.filter_queryset(self.get_queryset())  # type: ignore
+        cursor = request.query_params.get(self.cursor_param)
+        if cursor and not decode_keyset_cursor(cursor, queryset.model, ['pk']):
+            raise ValidationError({self.cursor_param: ['Invalid cursor']})
+
+        content = self.stream_ndjson(queryset, cursor) if stream_format == 'ndjson' else self.stream_json(queryset, cursor)
+        return StreamingHttpResponse(content, content_type=self.stream_content_types[stream_format])
+
+    def iter_chunks(self, queryset, cursor=None):
+        """
+        Iterate over chunks of objects ordered by pk after cursor
+
+        Without prefetches the objects are read with one server-side cursor (on databases that support it),
+        prefetches don't work with iterator() so then every chunk is fetched with a keyset query.
+        """
+        fields = ['pk']
+        if not queryset._prefetch_related_lookups:
+            iterator = keyset_filter(queryset, fields, cursor).iterator(chunk_size=self.stream_chunk_size)
+            chunk = list(islice(iterator, self.stream_chunk_size))
+            while chunk:
+                yield chunk
+                chunk = list(islice(iterator, self.stream_chunk_size))
+            return
+
+        while True:
+            chunk, cursor = keyset_paginate(queryset, fields, cursor, page_size=self.stream_chunk_size)
+            if chunk:
+                yield chunk
+            if not cursor:
+                return
+
+    def iter_serialized(self, queryset, cursor=None):
+        """Iterate over JSON encoded objects with resume cursor"""
+        try:
+            for chunk in self.iter_chunks(queryset, cursor):
+                for obj, data in zip(chunk, self.get_serializer(chunk, many=True).data):  # type: ignore
+                    data[self.cursor_param] = get_keyset_cursor(obj, ['pk'])
+                    yield json.dumps(data, cls=JSONEncoder)
+        except Exception as e:
+            # Headers are already sent, client can resume with cursor of last received object
+            logger.exception(e)
+            raise
+
+    def stream_ndjson(self, queryset, cursor=None):
+        """Stream objects as newline delimited JSON"""
+        for line in self.iter_serialized(queryset, cursor):
+            yield line + '\n'
+
+    def stream_json(self, queryset, cursor=None):
+        """Stream objects as JSON array"""
+        yield '['
+        for index, line in enumerate(self.iter_serialized(queryset, cursor)):
+            yield (',\n' if index else '\n') + line
+        yield '\n]\n'
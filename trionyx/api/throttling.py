@@ -0,0 +1,208 @@
+"""
+trionyx.api.throttling
+~~~~~~~~~~~~~~~~~~~~~~
+
+Token bucket rate limiting for the API
+
+Every API token (or user/IP without token) has a bucket per limit scope in the cache. The bucket holds
+the number of requests of the rate and is refilled continuously, so short bursts are allowed while the
+average stays within the rate. Limits are set with `TX_API_RATE_LIMIT` and per model endpoint and
+method with `ModelConfig.api_rate_limits`.
+
+Token buckets need a cache backend with atomic increments that is shared by all workers (Redis or Memcached).
+Other backends (like the default DatabaseCache) implement `incr` as a get and set, and every cache call is a
+database query. With those backends the DRF request history throttle is used, which needs one get and one set
+per request but is also not exact under concurrent requests.
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+from trionyx.api.authentication import get_token_hash
+from trionyx.config import models_config
+
+ATOMIC_CACHE_BACKENDS = (
+    'django.core.cache.backends.memcached.',
+    'django.core.cache.backends.redis.',
+    'django.core.cache.backends.locmem.',
+    'django_redis.',
+    'redis_cache.',
+)
+"""Cache backends with atomic incr/decr, locmem is only atomic (and shared) within one process"""
+
+RATE_DURATIONS = {
+    's': 1,
+    'm': 60,
+    'h': 60 * 60,
+    'd': 60 * 60 * 24,
+}
+
+
+def parse_rate(rate):
+    """Parse rate like `100/minute` to number of requests and duration in seconds"""
+    if not rate:
+        return None, None
+    num, period = rate.split('/')
+    return int(num), RATE_DURATIONS[period[0]]
+
+
+def has_atomic_cache():
+    """Check if token buckets can be used, `TX_API_RATE_LIMIT_TOKEN_BUCKET` overrides the check of the cache backend"""
+    setting = getattr(settings, 'TX_API_RATE_LIMIT_TOKEN_BUCKET', None)
+    if setting is not None:
+        return bool(setting)
+    return settings.CACHES['default']['BACKEND'].startswith(ATOMIC_CACHE_BACKENDS)
+
+
+class TokenBucket:
+    """
+    Token bucket stored in the cache
+
+    The bucket is stored as a start time and a counter of taken tokens. With a cache backend that has atomic
+    increments (see `has_atomic_cache`) concurrent workers can't take the same token. The available tokens are
+    calculated from the time since start, the start is only moved when an idle bucket is full.
+    """
+
+    def __init__(self, key, capacity, duration):
+        """Init bucket"""
+        self.key = key
+        self.capacity = capacity
+        self.rate = capacity / duration
+        self.timeout = max(int(duration) * 10, 60)
+
+    def consume(self, now=None):
+        """Take one token, returns if the token was given and the tokens left in the bucket"""
+        now = time.time() if now is None else now
+        start_key = f'{self.key}-start'
+        count_key = f'{self.key}-count'
+
+        cache.add(start_key, now, self.timeout)
+        cache.add(count_key, 0, self.timeout)
+        try:
+            count = cache.incr(count_key)
+        except ValueError:
+            # Counter expired or was evicted between add and incr
+            cache.set(count_key, 1, self.timeout)
+            count = 1
+
+        start = cache.get(start_key, now)
+        available = self.capacity + (now - start) * self.rate - (count - 1)
+        if available > self.capacity:
+            # Drop tokens of an idle bucket above capacity
+            cache.set(start_key, now - (count - 1) / self.rate, self.timeout)
+            available = self.capacity
+
+        if available >= 1:
+            return True, available - 1
+
+        try:
+            cache.decr(count_key)
+        except ValueError:
+            pass
+        return False, available
+
+
+class HistoryThrottle(SimpleRateThrottle):
+    """DRF request history throttle for a given cache key and rate, used when the cache has no atomic increments"""
+
+    def __init__(self, key, rate):
+        """Init throttle"""
+        self.key = key
+        self.rate = rate
+        self.num_requests, self.duration = self.parse_rate(rate)
+
+    def get_cache_key(self, request, view):
+        """Get cache key"""
+        return self.key
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Rate limit API requests per token, user or IP with token buckets
+
+    The result is stored on the request as `rate_limit` and added as `X-RateLimit-*` headers
+    by the `ApiUsageMiddleware`, the request is also marked for usage metering.
+    """
+
+    cache_key = 'trionyx-ratelimit'
+
+    def get_model_name(self, view):
+        """Get model name of model endpoint"""
+        queryset = getattr(view, 'queryset', None)
+        return models_config.get_model_name(queryset.model) if queryset is not None else None
+
+    def get_client_key(self, request):
+        """Get key of API client, the token key is hashed so it is not visible in the cache"""
+        token_key = getattr(request.auth, 'key', None)
+        if token_key:
+            return 'token-' + get_token_hash(token_key)
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return f'ip-{self.get_ident(request)}'
+
+    def get_rate(self, request, view):
+        """Get rate and scope of request, model limits are used before the default limit"""
+        model_name = self.get_model_name(view)
+        try:
+            limits = models_config.get_config(model_name).api_rate_limits or {}
+        except (KeyError, AttributeError):
+            limits = {}
+
+        method = 'GET' if request.method in ('HEAD', 'OPTIONS') and 'GET' in limits else request.method
+        for key in [method, '*']:
+            if key in limits:
+                return limits[key], f'{model_name}-{key}'
+        return getattr(settings, 'TX_API_RATE_LIMIT', None), 'default'
+
+    def allow_request(self, request, view):
+        """Take token from bucket of client and scope"""
+        self.wait_seconds = None
+        request._request.api_usage = {
+            'endpoint': self.get_model_name(view) or getattr(view, 'basename', None) or view.__class__.__name__,
+            'method': request.method,
+            'user': request.user if request.user and request.user.is_authenticated else None,
+            'token': get_token_hash(request.auth.key) if getattr(request.auth, 'key', None) else '',
+        }
+
+        rate, scope = self.get_rate(request, view)
+        capacity, duration = parse_rate(rate)
+        if not capacity:
+            return True
+
+        key = f'{self.cache_key}-{self.get_client_key(request)}-{scope}'
+        if not has_atomic_cache():
+            return self.allow_history_request(request, view, key, rate)
+
+        bucket = TokenBucket(key, capacity, duration)
+        allowed, tokens = bucket.consume()
+        request._request.rate_limit = {
+            'limit': capacity,
+            'remaining': max(0, math.floor(tokens)),
+            'reset': math.ceil(time.time() + (capacity - tokens) / bucket.rate),
+        }
+        if not allowed:
+            self.wait_seconds = (1 - tokens) / bucket.rate
+        return allowed
+
+    def allow_history_request(self, request, view, key, rate):
+        """Check request with the DRF request history throttle"""
+        throttle = HistoryThrottle(key, rate)
+        allowed = throttle.allow_request(request, view)
+        request._request.rate_limit = {
+            'limit': throttle.num_requests,
+            'remaining': max(0, throttle.num_requests - len(throttle.history)),
+            'reset': math.ceil(throttle.history[-1] + throttle.duration if throttle.history else throttle.now),
+        }
+        if not allowed:
+            self.wait_seconds = throttle.wait()
+        return allowed
+
+    def wait(self):
+        """Seconds until a token is available"""
+        return self.wait_seconds
@@ -0,0 +1,122 @@
+"""
+trionyx.api.usage
+~~~~~~~~~~~~~~~~~
+
+API usage metering
+
+Requests are aggregated in memory per process by hour, user, token, endpoint and method,
+and written to `ApiUsage` in one batch every `TX_API_USAGE_FLUSH_INTERVAL` seconds
+or `TX_API_USAGE_FLUSH_SIZE` requests. The batch is written by a background thread, so
+requests don't wait for the database. Rows are updated with increments so multiple
+processes can write the same row. Usage that is not flushed when a process stops is lost.
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction, connections
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ApiUsageCollector:
+    """Collect API usage in memory and write it in batches"""
+
+    def __init__(self):
+        """Init collector"""
+        self.lock = threading.Lock()
+        self.usage = {}
+        self.pending = 0
+        self.last_flush = time.monotonic()
+        self.flush_thread = None
+
+    def add(self, user, token, endpoint, method, duration, error=False, throttled=False):
+        """Add request with duration in ms"""
+        period = timezone.now().replace(minute=0, second=0, microsecond=0)
+        key = (period, user.pk if user else None, token, endpoint[:128], method)
+        with self.lock:
+            usage = self.usage.setdefault(key, {
+                'request_count': 0,
+                'error_count': 0,
+                'throttled_count': 0,
+                'total_duration': 0,
+                'max_duration': 0,
+            })
+            usage['request_count'] += 1
+            usage['error_count'] += int(error)
+            usage['throttled_count'] += int(throttled)
+            usage['total_duration'] += duration
+            usage['max_duration'] = max(usage['max_duration'], duration)
+            self.pending += 1
+
+    def should_flush(self):
+        """Check if flush interval or size is reached"""
+        return bool(self.pending) and (
+            self.pending >= getattr(settings, 'TX_API_USAGE_FLUSH_SIZE', 1000)
+            or time.monotonic() - self.last_flush >= getattr(settings, 'TX_API_USAGE_FLUSH_INTERVAL', 60)
+        )
+
+    def flush_in_background(self):
+        """Write collected usage to database in a background thread, when no flush is running"""
+        with self.lock:
+            if self.flush_thread and self.flush_thread.is_alive():
+                return
+            self.flush_thread = threading.Thread(target=self.background_flush, name='trionyx-api-usage', daemon=True)
+            self.flush_thread.start()
+
+    def background_flush(self):
+        """Flush and close the database connections of the background thread"""
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        """Write collected usage to database"""
+        with self.lock:
+            usage, self.usage = self.usage, {}
+            self.pending = 0
+            self.last_flush = time.monotonic()
+
+        for key, values in usage.items():
+            try:
+                self.write(key, values)
+            except Exception as e:
+                logger.exception(e)
+
+    def write(self, key, values):
+        """Add usage values to row of key"""
+        from trionyx.trionyx.models import ApiUsage
+
+        period, user_id, token, endpoint, method = key
+        lookup = {'period': period, 'token': token, 'endpoint': endpoint, 'method': method}
+        lookup.update({'user_id': user_id} if user_id else {'user__isnull': True})
+
+        def update():
+            return ApiUsage.objects.filter(**lookup).update(
+                request_count=F('request_count') + values['request_count'],
+                error_count=F('error_count') + values['error_count'],
+                throttled_count=F('throttled_count') + values['throttled_count'],
+                total_duration=F('total_duration') + values['total_duration'],
+                max_duration=Greatest(F('max_duration'), values['max_duration']),
+            )
+
+        if update():
+            return
+
+        try:
+            with transaction.atomic():
+                ApiUsage.objects.create(period=period, user_id=user_id, token=token, endpoint=endpoint, method=method, **values)
+        except IntegrityError:
+            # Row is created by other process
+            update()
+
+
+collector = ApiUsageCollector()
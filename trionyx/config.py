@@ -138,6 +138,9 @@ class ModelConfig:
     disable_search_index: bool = False
     """Disable search index, use full for model with no list view but with allot of records"""
 
+    disable_read_replica: bool = False
+    """Always read model from the primary database, also when read replicas are configured with `TX_DB_REPLICAS`"""
+
     search_fields: List[str] = []
     """Fields to use for searching, default is all CharField and TextField"""
 
@@ -156,6 +159,12 @@ class ModelConfig:
     Is given medium priority and is used in global search page
     """
 
+    search_vector_field: Optional[str] = None
+    """
+    Name of a `SearchVectorField` on the model, when set and PostgreSQL is used the model is searched with native
+    full-text search on this field instead of the search index. Add a `GinIndex` on the field for fast searches.
+    """
+
     list_fields: Optional[List[dict]] = None
     """
     Customise the available fields for model list view, default all model fields are available.
@@ -165,6 +174,7 @@ class ModelConfig:
     - **field**: Model field name (is used for sort and getting value if no renderer is supplied)
     - **label**: Column name in list view, if not set verbose_name of model field is used
     - **renderer**: function(model, field) that returns a JSON serializable date, when not set model field is used.
+    - **columns**: Other model columns used by the renderer, list queries only select the columns of the shown fields.
 
     .. code-block:: python
 
@@ -183,6 +193,15 @@ class ModelConfig:
     list_prefetch_related: Optional[List[str]] = None
     """Array of fields to prefetch for query, use this for relations that are used in search or renderer"""
 
+    list_only_columns: bool = False
+    """
+    Only select the columns used by the list fields and their renderers, instead of whole rows.
+    Columns used by `__str__` or `get_absolute_url` of the model must be added to `list_extra_columns`
+    """
+
+    list_extra_columns: Optional[List[str]] = None
+    """Array of columns that are always selected for the list, for example columns used by get_absolute_url"""
+
     list_default_sort: str = '-pk'
     """Default sort field for list view"""
 
@@ -198,6 +217,23 @@ class ModelConfig:
     api_disable: bool = False
     """Disable API for model"""
 
+    api_exclude_fields: List[str] = []
+    """Fields that are never exposed by the generated API serializer, the password of user models is always excluded"""
+
+    api_rate_limits: Optional[Dict[str, Optional[str]]] = None
+    """
+    Rate limits per HTTP method for the model API endpoints, `*` is used for other methods
+    and methods without a limit use `TX_API_RATE_LIMIT`. A limit of `None` disables rate limiting for the method.
+
+    .. code-block:: python
+
+        api_rate_limits = {
+            'GET': '1000/minute',
+            'POST': '100/minute',
+            '*': '300/hour',
+        }
+    """
+
     verbose_name: str = "{model_name}({id})"
     """
     Verbose name used for displaying model, default value is "{model_name}({id})"
@@ -616,7 +652,8 @@ class Models:
     def get_all_models(self, user: Optional['User'] = None, trionyx_models_only: bool = True):
         """Get all user models"""
         for config in self.get_all_configs(trionyx_models_only):
-            if config.app_label == 'trionyx' and config.model_name in ['session', 'auditlogentry', 'log', 'logentry', 'userattribute']:
+            if config.app_label == 'trionyx' and config.model_name in [
+                    'session', 'auditlogentry', 'log', 'logentry', 'userattribute', 'apiusage']:
                 continue
 
             if user and user.has_perm('{app_label}.view_{model_name}'.format(
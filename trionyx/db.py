@@ -0,0 +1,135 @@
+"""
+trionyx.db
+~~~~~~~~~~
+
+Database router that sends reads of read-heavy views to the replicas in `TX_DB_REPLICAS`
+
+Views opt in with `use_read_replica`, reads of all other code (forms, tasks, etc.) stay on the primary.
+After a user writes, the reads of that user stay on the primary for `TX_DB_REPLICA_STICKY_SECONDS`
+so they don't see replication lag on their own changes.
+
+The replica and write flags are stored on the current request. Async views run database code in other
+threads and concurrent tasks, their changes of the local data (a context variable) don't always reach
+the middleware, changes of the shared request object do.
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+
+from trionyx import utils
+
+PRIMARY_ONLY_MODELS = ['sessions.session', 'django_cache.cacheentry']
+"""Models that are always read from the primary and don't make a user sticky on write"""
+
+
+def get_replicas():
+    """Get configured replica database aliases"""
+    return getattr(settings, 'TX_DB_REPLICAS', [])
+
+
+def get_sticky_cache_key(user):
+    """Get cache key that marks the user as sticky to the primary"""
+    return f'trionyx-db-primary-{user.pk}'
+
+
+def is_primary_sticky(user):
+    """Check if user has written recently and must read from the primary"""
+    return bool(user and user.is_authenticated and cache.get(get_sticky_cache_key(user)))
+
+
+def set_primary_sticky(user):
+    """Make reads of user stick to the primary for TX_DB_REPLICA_STICKY_SECONDS"""
+    timeout = getattr(settings, 'TX_DB_REPLICA_STICKY_SECONDS', 10)
+    if user and user.is_authenticated and timeout:
+        cache.set(get_sticky_cache_key(user), True, timeout=timeout)
+
+
+def get_request_flag(name):
+    """Get database flag of current request, without request the flag is kept in the local data"""
+    request = utils.get_current_request()
+    if request is None:
+        return bool(utils.get_local_data(name))
+    return bool(getattr(request, name, False))
+
+
+def set_request_flag(name, value):
+    """Set database flag of current request, without request the flag is kept in the local data"""
+    request = utils.get_current_request()
+    if request is None:
+        utils.set_local_data(name, value)
+    else:
+        setattr(request, name, value)
+
+
+def use_read_replica(user=None):
+    """
+    Read from the replicas for the rest of the current request, unless the user is sticky to the primary.
+
+    Returns True when the replicas are used.
+    """
+    if not get_replicas() or is_primary_sticky(user):
+        return False
+    set_request_flag('db_read_replica', True)
+    return True
+
+
+def has_written():
+    """Check if there was a write to the primary since the tracking started"""
+    return get_request_flag('db_write')
+
+
+def reset_written():
+    """Start tracking of writes for the current request"""
+    set_request_flag('db_write', False)
+
+
+class ReadReplicaRouter:
+    """
+    Route reads to a random replica when enabled for the current request
+
+    A write in the request sends all further reads of that request to the primary.
+    """
+
+    def get_model_name(self, model):
+        """Get model name as used by PRIMARY_ONLY_MODELS"""
+        return f'{model._meta.app_label}.{model._meta.model_name}'
+
+    def is_replica_allowed(self, model):
+        """Check if model can be read from the replicas"""
+        from trionyx.config import models_config
+
+        if self.get_model_name(model) in PRIMARY_ONLY_MODELS:
+            return False
+
+        try:
+            return not models_config.get_config(model).disable_read_replica
+        except (KeyError, AttributeError):
+            return True
+
+    def db_for_read(self, model, **hints):
+        """Get replica when enabled for request and there was no write"""
+        if not get_request_flag('db_read_replica') or has_written() or not get_replicas():
+            return None
+
+        if not self.is_replica_allowed(model):
+            return None
+
+        return random.choice(get_replicas())
+
+    def db_for_write(self, model, **hints):
+        """Write to the default database, track writes to make the request and user sticky to the primary"""
+        if self.get_model_name(model) not in PRIMARY_ONLY_MODELS:
+            set_request_flag('db_write', True)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Replicas contain the same data as the primary"""
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Replicas are migrated by replication"""
+        return False if db in get_replicas() else None
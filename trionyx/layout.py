@@ -41,18 +41,26 @@ Layouts are defined and registered in layouts.py in an app.
 
 """
 import re
+import json
 import time
+import hashlib
 import datetime
 import decimal
-from typing import List, Dict, Union, Any
+from typing import List, Dict, Union, Any, Optional
 
 from django import template
-from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.template.context import BaseContext, make_context
+from django.template.loader import render_to_string, get_template
 from django.utils.safestring import mark_safe
+from django.utils import timezone
+from django.utils.translation import get_language
 from django.conf import settings
-from django.db.models import QuerySet
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet, F, Sum, Avg, Min, Max, Count
 
 from trionyx import utils
+from trionyx.profiler import RenderProfiler
 from trionyx.trionyx.conf import settings as tx_settings
 
 register = template.Library()
@@ -76,6 +84,224 @@ class Colors:
     BLACK = 'black'
 
 
+_component_templates: Dict[str, Any] = {}
+
+
+def get_component_template(template_name):
+    """
+    Get compiled Django template for component, template is resolved once per template name.
+
+    Returns None when template is not a Django template.
+    """
+    compiled_template = _component_templates.get(template_name)
+    if compiled_template is None:
+        compiled_template = getattr(get_template(template_name), 'template', None)
+        if not settings.DEBUG:
+            _component_templates[template_name] = compiled_template
+    return compiled_template
+
+
+class FragmentCache:
+    """
+    Cache for rendered layouts and components.
+
+    Cache key is based on the code, object pk and updated_at, user permissions, language, timezone
+    and the page and sort params of component updates.
+    Models that a fragment depends on are declared with `cache_depends_on`, every save or delete of
+    a model changes its version in the shared cache and with that the cache key of all fragments that depend on it,
+    so a save in another process (worker, Celery task) also invalidates the fragments.
+    Only use it for fragments without user specific content (like forms with a CSRF token).
+    """
+
+    key_prefix = 'trionyx-fragment'
+    default_timeout = 60 * 60
+
+    request_params = ['component', 'cursor', 'sort']
+    """Request params of paginated and sortable component updates, a different page or sort is a different fragment"""
+
+    def get_model_label(self, model):
+        """Get model label for model class, instance or alias"""
+        from trionyx.config import models_config
+        return models_config.get_model_name(model).lower()
+
+    def get_model_version(self, model):
+        """Get current version of model"""
+        key = f'{self.key_prefix}-version-{self.get_model_label(model)}'
+        version = cache.get(key)
+        if version is None:
+            version = utils.random_string(8)
+            cache.set(key, version, timeout=None)
+        return version
+
+    def model_changed(self, sender, **kwargs):
+        """Signal handler for save and delete, removes version of model so a new version is used"""
+        cache.delete(f'{self.key_prefix}-version-{self.get_model_label(sender)}')
+
+    def get_permission_fingerprint(self, request):
+        """Get fingerprint of user permissions"""
+        user = getattr(request, 'user', None)
+        if not user or not user.is_authenticated:
+            return 'anonymous'
+        if user.is_superuser:
+            return 'superuser'
+        return hashlib.md5(','.join(sorted(user.get_all_permissions())).encode()).hexdigest()
+
+    def get_key(self, code, object, request=None, depends_on=None):
+        """Get cache key for fragment"""
+        object_version = ''
+        if object:
+            # For objects without updated_at the model should be added to depends_on
+            updated_at = getattr(object, 'updated_at', None)
+            object_version = f'{object.pk}-{updated_at.isoformat()}' if updated_at else str(object.pk)
+
+        return '{}-{}'.format(self.key_prefix, hashlib.md5('|'.join([
+            str(code),
+            self.get_model_label(object.__class__) if object else '',
+            object_version,
+            self.get_permission_fingerprint(request),
+            get_language() or '',
+            timezone.get_current_timezone_name(),
+            *[f'{name}={request.GET.get(name, "")}' for name in self.request_params if request],
+            *[self.get_model_version(model) for model in depends_on or []],
+        ]).encode()).hexdigest())
+
+    def get(self, key):
+        """Get cached fragment"""
+        return cache.get(key)
+
+    def set(self, key, value, timeout=None):
+        """Set cached fragment"""
+        cache.set(key, str(value), timeout=timeout if timeout is not None else self.default_timeout)
+
+
+fragment_cache = FragmentCache()
+
+
+class LayoutIndex:
+    """
+    Index of layout components by id and path and the required css/js files.
+
+    Index is built in one pass over the component tree and is updated incrementally when components
+    are added or deleted with the layout methods, so layouts with many update hooks are assembled in linear time.
+    Changes made directly to `components` lists are not seen by the index, call `Layout.invalidate_index`
+    after such a change to find the new components. The css/js files are always collected with a new index on render.
+    """
+
+    def __init__(self, layout):
+        """Build index for layout"""
+        self.layout = layout
+        self.ids = {}
+        self.paths = {}
+        self.component_paths = {}
+        self.css_files = {}
+        self.js_files = {}
+
+        for index, component in enumerate(layout.components):
+            self.add(component, '', index)
+
+    @staticmethod
+    def get_path(component, parent_path, index):
+        """Get path of component in layout"""
+        name = f'{component.__class__.__name__}-{index}'.lower()
+        return f'{parent_path}.{name}' if parent_path else name
+
+    def add(self, component, parent_path, index):
+        """Add component and child components to index"""
+        path = self.get_path(component, parent_path, index)
+        self.paths[path] = component
+        self.component_paths[id(component)] = path
+        if component.id:
+            self.ids.setdefault(component.id, component)
+        self.add_assets(component)
+
+        for child_index, child in enumerate(component.components):
+            self.add(child, path, child_index)
+
+    def remove(self, component):
+        """Remove component and child components from index"""
+        path = self.component_paths.pop(id(component), None)
+        if self.paths.get(path) is component:
+            del self.paths[path]
+        if component.id and self.ids.get(component.id) is component:
+            del self.ids[component.id]
+        self.remove_assets(component)
+
+        for child in component.components:
+            self.remove(child)
+
+    def add_assets(self, component):
+        """Add css and js files of component and components used as field value"""
+        self.update_assets(component, 1)
+
+    def remove_assets(self, component):
+        """Remove css and js files of component, files are kept while used by other components"""
+        self.update_assets(component, -1)
+
+    def update_assets(self, component, change):
+        """Change usage count of css and js files of component and of the full tree of components used as field value"""
+        for name in ['css_files', 'js_files']:
+            files = getattr(self, name)
+            for file in getattr(component, name, None) or []:
+                files[file] = files.get(file, 0) + change
+                if files[file] <= 0:
+                    del files[file]
+
+        for field_component in self.get_field_components(component):
+            self.update_tree_assets(field_component, change)
+
+    def update_tree_assets(self, component, change):
+        """Change usage count of css and js files of component and all its child components"""
+        self.update_assets(component, change)
+        for child in component.components:
+            self.update_tree_assets(child, change)
+
+    @staticmethod
+    def get_field_components(component):
+        """Get components used as field value, when ComponentFieldsMixin is used the value can be a component"""
+        if not isinstance(component, ComponentFieldsMixin):
+            return []
+        return [field['value'] for field in component.get_fields() if isinstance(field.get('value'), Component)]
+
+    def reindex(self, parent, start=0):
+        """Update paths of child components of parent from given index, after an insert or delete"""
+        parent_path = self.component_paths.get(id(parent), '')
+        for index, component in enumerate(parent.components[start:], start):
+            self.update_paths(component, parent_path, index)
+
+    def update_paths(self, component, parent_path, index):
+        """Update path of component and child components"""
+        old_path = self.component_paths.get(id(component))
+        path = self.get_path(component, parent_path, index)
+        if old_path == path:
+            return
+
+        if self.paths.get(old_path) is component:
+            del self.paths[old_path]
+        self.paths[path] = component
+        self.component_paths[id(component)] = path
+
+        for child_index, child in enumerate(component.components):
+            self.update_paths(child, path, child_index)
+
+    def insert(self, parent, index, component):
+        """Insert component in parent at index"""
+        parent.components.insert(index, component)
+        self.add(component, self.component_paths.get(id(parent), ''), index)
+        self.reindex(parent, index + 1)
+
+    def delete(self, parent, component):
+        """Delete component from parent"""
+        index = parent.components.index(component)
+        del parent.components[index]
+        self.remove(component)
+        self.reindex(parent, index)
+
+    def get_parent(self, component):
+        """Get parent of component, top level components give the layout"""
+        path = self.component_paths.get(id(component), '')
+        return self.paths.get(path.rpartition('.')[0], self.layout) if '.' in path else self.layout
+
+
 class Layout:
     """Layout object that holds components"""
 
@@ -86,6 +312,7 @@ class Layout:
         self.object = False
         self.components = list(components)
         self.options = options
+        self._index = None
 
     def __getitem__(self, slice):
         """Get component item"""
@@ -94,35 +321,30 @@ class Layout:
     def __setitem__(self, slice, value):
         """Set component"""
         self.components[slice] = value
+        self._index = None
 
     def __delitem__(self, slice):
         """Delete component"""
         del self.components[slice]
+        self._index = None
 
     def __len__(self):
         """Get component length"""
         return len(self.components)
 
-    def get_paths(self):
-        """Get all paths in layout for easy lookup"""
-        def generate_paths(component=None, path=None, index=None):
-            """Generate all paths in layout"""
-            path = [
-                *path,
-                str(component.__class__.__name__ + '-' + str(index)).lower()
-            ]
-            paths = {'.'.join(path): component}
-
-            for index, comp in enumerate(component.components):
-                paths.update(generate_paths(comp, path, index))
-            return paths
+    def get_index(self):
+        """Get index of layout, index is built on first use"""
+        if self._index is None:
+            self._index = LayoutIndex(self)
+        return self._index
 
-        paths = {}
-        for index, comp in enumerate(self.components):
-            paths.update(generate_paths(comp, [], index))
+    def invalidate_index(self):
+        """Invalidate index, must be called after components are changed without the layout methods"""
+        self._index = None
 
-        # Can't cache paths because after one change the are not valid
-        return paths
+    def get_paths(self):
+        """Get all paths in layout for easy lookup"""
+        return dict(self.get_index().paths)
 
     def find_component_by_path(self, path):
         """Find component by path, gives back component and parent"""
@@ -135,73 +357,43 @@ class Layout:
                 match.group(3) if match.group(3) else 0
             ))
 
-        paths = self.get_paths()
+        paths = self.get_index().paths
         return (
             paths.get('.'.join(new_path)),
             paths.get('.'.join(new_path[:-1]))
         )
 
-    def find_component_by_id(self, id=None, current_comp=None):
+    def find_component_by_id(self, id=None):
         """Find component by id, gives back component and parent"""
-        current_comp = current_comp if current_comp else self
-
-        for comp in current_comp.components:
-            if id and comp.id == id:
-                return (comp, current_comp)
-
-        for comp in current_comp.components:
-            r_comp, r_parent = self.find_component_by_id(id=id, current_comp=comp)
-            if r_comp:
-                return (r_comp, r_parent)
-
-        return (None, None)
+        index = self.get_index()
+        comp = index.ids.get(id) if id else None
+        if not comp:
+            return (None, None)
+        return (comp, index.get_parent(comp))
 
     def render(self, request=None):
-        """Render layout for given request"""
+        """Render layout for given request, the index is rebuilt so components changed outside the layout methods have their files"""
+        self.invalidate_index()
         return render_to_string('trionyx/layout.html', {
             'layout': self,
             'css_files': self.collect_css_files(),
             'js_files': self.collect_js_files(),
         }, request)
 
-    def collect_css_files(self, component=None):
+    def collect_css_files(self):
         """Collect all css files"""
-        component = component if component else self
-        files = getattr(component, 'css_files', None)
-        files = files if files else []
-
-        for comp in component.components:
-            files.extend(self.collect_css_files(comp))
+        return list(self.get_index().css_files)
 
-        # When ComponentFieldsMixin is used the value can be a component
-        if isinstance(component, ComponentFieldsMixin):
-            for field in component.get_fields():
-                if isinstance(field.get('value'), Component):
-                    files.extend(self.collect_css_files(field.get('value')))
-
-        return list(set(files))
-
-    def collect_js_files(self, component=None):
+    def collect_js_files(self):
         """Collect all js files"""
-        component = component if component else self
-        files = getattr(component, 'js_files', None)
-        files = files if files else []
-
-        for comp in component.components:
-            files.extend(self.collect_js_files(comp))
-
-        # When ComponentFieldsMixin is used the value can be a component
-        if isinstance(component, ComponentFieldsMixin):
-            for field in component.get_fields():
-                if isinstance(field.get('value'), Component):
-                    files.extend(self.collect_js_files(field.get('value')))
-
-        return list(set(files))
+        return list(self.get_index().js_files)
 
     def set_object(self, object):
         """
         Set object for rendering layout and set object to all components
 
+        Components can change there child components in the updated hook, so index is invalidated.
+
         :param object:
         :return:
         """
@@ -212,6 +404,8 @@ class Layout:
         for component in self.components:
             component.set_object(self.object, layout_id=self.id)
 
+        self._index = None
+
     def add_component(self, component, id=None, path=None, before=False, append=False):
         """
         Add component to existing layout can insert component before or after component
@@ -222,11 +416,10 @@ class Layout:
         :param append: append component to selected component from id or path
         :return:
         """
+        index = self.get_index()
         if not id and not path:
-            if before:
-                self.components.append(component)
-            else:
-                self.components.insert(0, component)
+            index.insert(self, len(self.components) if before else 0, component)
+            return
 
         if id:
             comp, parent = self.find_component_by_id(id)
@@ -237,16 +430,11 @@ class Layout:
             raise LookupError('Could not add component: Unknown path {} or id {}'.format(path, id))
 
         if append:
-            if before:
-                comp.components.append(component)
-            else:
-                comp.components.insert(0, component)
-        elif parent:
-            index = parent.components.index(comp) if before else parent.components.index(comp) + 1
-            parent.components.insert(index, component)
-        elif comp:
-            index = self.components.index(comp) if before else self.components.index(comp) + 1
-            self.components.insert(index, component)
+            index.insert(comp, len(comp.components) if before else 0, component)
+        else:
+            parent = parent if parent else self
+            position = parent.components.index(comp) if before else parent.components.index(comp) + 1
+            index.insert(parent, position, component)
 
     def delete_component(self, id=None, path=None):
         """
@@ -267,10 +455,7 @@ class Layout:
         if not comp:
             raise ValueError('Could not delete component: Unknown path {} or id {}'.format(path, id))
 
-        if parent:
-            parent.components.remove(comp)
-        elif comp:
-            self.components.remove(comp)
+        self.get_index().delete(parent if parent else self, comp)
 
 
 class Component:
@@ -285,6 +470,15 @@ class Component:
     css_files: List[str] = []
     """List of required css files"""
 
+    cache: bool = False
+    """Cache rendered component, only works for components with an id"""
+
+    cache_timeout: Optional[int] = None
+    """Seconds rendered component is cached"""
+
+    cache_depends_on: List[Any] = []
+    """Models (class or alias) the rendered component depends on, cache is invalidated when one is saved"""
+
     def __init__(self, *components, **options):
         """Initialize Component"""
         self.id = options.pop('id', None)
@@ -331,48 +525,51 @@ class Component:
         pass
 
     def render(self, context, request=None):
-        """Render component"""
+        """Render component, from cache when cache is enabled"""
         if not self.should_render(self):
             return ''
 
-        context['component'] = self
-        self.context = context
-        self.request = request
-
-        if settings.DEBUG:
-            path = [
-                *getattr(self, '_debug_path', []),
-                '{name}[{index}]'.format(
-                    name=str(self.__class__.__name__).lower(),
-                    index=getattr(self, '_debug_path_index', 0),
-                )
-            ]
-            self._debug_full_path = '.'.join(path)
-            for index, comp in enumerate(self.components):
-                comp._debug_path = path
-                comp._debug_path_index = index
+        if not self.cache or not self.id:
+            return self.render_component(context, request)
 
-            start_time = time.time()
+        key = fragment_cache.get_key(f'component-{self.id}', self.object, request, self.cache_depends_on)
+        output = fragment_cache.get(key)
+        if output is None:
+            output = self.render_component(context, request)
+            fragment_cache.set(key, output, self.cache_timeout)
+        return mark_safe(output)
+
+    def render_component(self, context, request=None):
+        """
+        Render component
 
-        if self.template_name:
-            output = render_to_string(self.template_name, context, request)
+        The whole component tree is rendered in one template Context, the component is pushed on the context
+        and popped after rendering. Context processors only run when the top component is rendered with a dict.
+        """
+        if not isinstance(context, BaseContext):
+            context = make_context(context, request)
+
+        with context.push(component=self):
+            self.context = context
+            self.request = request
+
+            profiler = RenderProfiler.get_active()
+            if not profiler:
+                return self.render_template(context, request)
+
+            with profiler.record(self):
+                return self.render_template(context, request)
+
+    def render_template(self, context, request=None):
+        """Render component template or child components with given template Context"""
+        compiled_template = get_component_template(self.template_name) if self.template_name else None
+        if compiled_template:
+            output = compiled_template.render(context)
+        elif self.template_name:
+            output = render_to_string(self.template_name, context.flatten(), request)
         else:
             output = ''.join(comp.render(context, request) for comp in self.components)
 
-        if settings.DEBUG:
-            output = """
-                <!--{class_name}: {template_name}-->
-                <!--Path: {path}-->
-                <!--Render time: {render_time}-->
-                {output}
-            """.format(
-                class_name=".".join([self.__class__.__module__, self.__class__.__name__]),
-                template_name=self.template_name,
-                path=self._debug_full_path,
-                render_time=round(time.time() - start_time, 4),
-                output=output,
-            )
-
         return mark_safe(output)
 
 
@@ -388,6 +585,9 @@ class ComponentFieldsMixin:
     - **value**: Value to be rendered (Can also be a component)
     - **format**: String format for rendering field, default is '{0}'
     - **renderer**: Render function for rendering value, result will be given to format. (lambda value, **options: value)
+    - **aggregate**: Aggregate function (sum, avg, min, max or count) for table footers and chart series,
+      aggregates of a QuerySet are calculated by the database
+    - **trunc**: Truncate date of chart group field (year, quarter, month, week, day or hour)
 
     Based on the order the fields are in the list a __index__ is set with the list index,
     this is used for rendering a object that is a list.
@@ -432,6 +632,15 @@ class ComponentFieldsMixin:
     The items in the objects list can be a mix of Models, dicts or lists.
     """
 
+    aggregate_functions = {
+        'sum': Sum,
+        'avg': Avg,
+        'min': Min,
+        'max': Max,
+        'count': Count,
+    }
+    """Aggregate functions that can be used with the aggregate field option"""
+
     def add_field(self, field, index=None):
         """Add field"""
         self.fields = list(self.fields)
@@ -560,7 +769,7 @@ class ComponentFieldsMixin:
             value = field['renderer'](value, data_object=data, **options)
         elif isinstance(value, Component):
             value.set_object(data, True, self.layout_id)
-            value = value.render(self.context.copy(), self.request)
+            value = value.render(self.context, self.request)
         elif isinstance(data, object) and field['field'] and hasattr(data, field['field']):
             value = renderer.render_field(data, field['field'], **field)
         else:
@@ -588,13 +797,227 @@ class ComponentFieldsMixin:
 
     def get_objects(self):
         """Get objects"""
-        objects = self.objects
+        return self.resolve_objects(self.objects)
 
+    def resolve_objects(self, objects):
+        """Resolve objects, when objects is a string it is used as relation name of object"""
         if isinstance(objects, str):
             objects = getattr(self.object, objects).all()
 
         return objects
 
+    @staticmethod
+    def get_aggregate_alias(field):
+        """Get alias used for aggregate in query"""
+        return f"{field['field']}__{field['aggregate']}"
+
+    def get_aggregate_expression(self, field):
+        """Get database aggregate expression for field"""
+        if field['aggregate'] not in self.aggregate_functions:
+            raise ValueError('Unknown aggregate {} for field {}'.format(field['aggregate'], field['field']))
+        return self.aggregate_functions[field['aggregate']](field['field'])
+
+    def aggregate_values(self, field, objects):
+        """Aggregate values of field for objects that are not a QuerySet"""
+        values = [self.get_value(field, obj) for obj in objects]
+        if field['aggregate'] == 'count':
+            return len(values)
+
+        values = [value for value in values if value is not None]
+        if not values:
+            return None
+        if field['aggregate'] == 'sum':
+            return sum(values)
+        if field['aggregate'] == 'avg':
+            return sum(values) / len(values)
+        return min(values) if field['aggregate'] == 'min' else max(values)
+
+    def create_row(self, fields, values):
+        """Create list row with values by field index, this way multiple aggregates of the same field can be rendered"""
+        row = [None] * (max([field['__index__'] for field in fields], default=-1) + 1)
+        for field in fields:
+            row[field['__index__']] = values.get(field['__index__'])
+        return row
+
+    def aggregate_objects(self, objects, fields):
+        """Aggregate objects to one row, QuerySets are aggregated in a single query"""
+        aggregate_fields = [field for field in fields if field.get('aggregate')]
+        if isinstance(objects, QuerySet):
+            result = objects.order_by().aggregate(**{
+                self.get_aggregate_alias(field): self.get_aggregate_expression(field)
+                for field in aggregate_fields
+            })
+            values = {field['__index__']: result[self.get_aggregate_alias(field)] for field in aggregate_fields}
+        else:
+            values = {field['__index__']: self.aggregate_values(field, objects) for field in aggregate_fields}
+
+        return self.create_row(fields, values)
+
+    def group_objects(self, queryset, group_field, fields):
+        """Aggregate fields of queryset grouped by the group field in a single query, rows are ordered by group"""
+        from django.db.models.functions import Trunc
+        group = group_field['field']
+        group_expression = Trunc(group, group_field['trunc']) if group_field.get('trunc') else F(group)
+        aggregate_fields = [field for field in fields if field.get('aggregate')]
+
+        rows = list(queryset.order_by().values(tx_group=group_expression).annotate(**{
+            self.get_aggregate_alias(field): self.get_aggregate_expression(field)
+            for field in aggregate_fields
+        }).order_by('tx_group'))
+
+        try:
+            model_field = queryset.model._meta.get_field(group)
+        except FieldDoesNotExist:
+            model_field = None
+
+        if model_field and model_field.many_to_one and not group_field.get('trunc'):
+            related = model_field.related_model._default_manager.in_bulk([row['tx_group'] for row in rows])
+            for row in rows:
+                row['tx_group'] = related.get(row['tx_group'], row['tx_group'])
+
+        return [
+            self.create_row([group_field, *fields], {
+                group_field['__index__']: row['tx_group'],
+                **{field['__index__']: row[self.get_aggregate_alias(field)] for field in aggregate_fields},
+            })
+            for row in rows
+        ]
+
+    def render_aggregate_field(self, field, row, model=None):
+        """Render aggregated field, values of model fields are rendered with the renderer of the model field"""
+        value = row[field['__index__']]
+        if model and field['aggregate'] != 'count' and value is not None:
+            try:
+                model._meta.get_field(field['field'])
+                return self.render_field(field, model(**{field['field']: value}))
+            except (FieldDoesNotExist, TypeError, ValueError):
+                pass
+        return self.render_field(field, row)
+
+
+class PaginatedObjectsMixin:
+    """
+    Mixin for rendering objects in pages, only the first page is rendered server side
+    and next pages are loaded with the layout update view.
+
+    Pagination is only used for components with an id and objects that are a QuerySet or relation name.
+    Pages use keyset paging on the sort field and primary key, so loading a page deep in a large relation stays fast.
+    """
+
+    page_size: Optional[int] = None
+    """Number of objects rendered per page, when not set all objects are rendered"""
+
+    sortable: bool = False
+    """Objects can be sorted server side on fields that are not nullable model fields"""
+
+    default_sort: str = ''
+    """Sort field when no sort is requested, prefix with `-` for descending. Default is queryset ordering or pk"""
+
+    next_cursor: Optional[str] = None
+    """Cursor of next page, set after objects are fetched"""
+
+    def is_paginated(self):
+        """Check if objects are paginated"""
+        return bool(self.page_size and self.id)
+
+    def get_request_param(self, name):
+        """Get request param, only when the request is an update of this component"""
+        request = self.request or utils.get_current_request()
+        if not request or not self.id or request.GET.get('component') != self.id:
+            return None
+        return request.GET.get(name)
+
+    def get_model_fields(self, model):
+        """Get model fields for the component fields"""
+        model_fields = {}
+        for field in self.get_fields():
+            try:
+                model_fields[field['field']] = model._meta.get_field(field['field'] or '')
+            except FieldDoesNotExist:
+                pass
+        return model_fields
+
+    def get_sort_fields(self, model):
+        """Get field names objects can be sorted on, nullable fields are excluded because they can't be used for keyset paging"""
+        return [
+            name for name, model_field in self.get_model_fields(model).items()
+            if model_field.concrete and not model_field.is_relation and not model_field.null
+        ]
+
+    def get_sort(self, queryset):
+        """Get sort for queryset, requested sort is only used when it is a valid sort field"""
+        sort_fields = ['pk', queryset.model._meta.pk.name] + self.get_sort_fields(queryset.model)
+        requested = self.get_request_param('sort') if self.sortable else None
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+
+        for sort in [requested, self.default_sort, ordering[0] if ordering else None]:
+            if isinstance(sort, str) and sort.lstrip('-') in sort_fields:
+                return sort
+        return 'pk'
+
+    def optimize_queryset(self, queryset):
+        """Add select_related and prefetch_related for the relation fields that are rendered"""
+        from django.db.models.query import ModelIterable
+        from trionyx.models import RelationPlanner
+        if queryset._iterable_class is not ModelIterable:
+            return queryset
+
+        planner = RelationPlanner(queryset.model)
+        for field in self.get_fields():
+            if field['field'] and 'value' not in field:
+                planner.add_field(field['field'], default_renderer='renderer' not in field)
+        return planner.apply(queryset)
+
+    def get_objects(self):
+        """Get objects, for paginated objects the requested page"""
+        from trionyx.models import keyset_paginate
+        objects = super().get_objects()
+        self.next_cursor = None
+
+        if not isinstance(objects, QuerySet):
+            return objects
+
+        objects = self.optimize_queryset(objects)
+        if not self.is_paginated() or objects.query.is_sliced:
+            return objects
+
+        sort = self.get_sort(objects)
+        ordering = [sort] if sort.lstrip('-') in ['pk', objects.model._meta.pk.name] else [
+            sort, '-pk' if sort.startswith('-') else 'pk'
+        ]
+        rows, self.next_cursor = keyset_paginate(
+            objects, ordering, self.get_request_param('cursor'), page_size=int(self.page_size))
+        return rows
+
+    def get_page_params(self):
+        """Get request params for loading the next page"""
+        params = {'cursor': self.next_cursor}
+        if self.sortable and self.get_request_param('sort'):
+            params['sort'] = self.get_request_param('sort')
+        return json.dumps(params)
+
+    def get_header_fields(self):
+        """Get fields with the request params for sorting and the current sort direction"""
+        objects = self.objects
+        if isinstance(objects, str) and self.object:
+            objects = getattr(self.object, objects).all()
+
+        sort_fields = []
+        if self.sortable and self.is_paginated() and isinstance(objects, QuerySet):
+            sort_fields = self.get_sort_fields(objects.model)
+
+        current = self.get_request_param('sort') or ''
+        return [
+            {
+                **field,
+                'sort_params': json.dumps({
+                    'sort': f"-{field['field']}" if current == field['field'] else field['field']
+                }) if field['field'] in sort_fields else None,
+                'sorted': ('desc' if current.startswith('-') else 'asc') if current.lstrip('-') == field['field'] else '',
+            }
+            for field in self.get_fields()
+        ]
+
 
 # =============================================================================
 # Simple HTML tags
@@ -612,11 +1035,21 @@ class HtmlTemplate(Component):
 
     def render(self, context, request=None):
         """Render component"""
-        context['component'] = self
-        context.update(self.context)
-        self.context = context
-        self.request = request
-        return render_to_string(self.template_name, context, request)
+        if not isinstance(context, BaseContext):
+            context = make_context(context, request)
+
+        template_context = self.context
+        with context.push(component=self, **template_context):
+            self.context = context
+            self.request = request
+            compiled_template = get_component_template(self.template_name)
+            if compiled_template:
+                output = compiled_template.render(context)
+            else:
+                output = render_to_string(self.template_name, context.flatten(), request)
+
+        self.context = template_context
+        return output
 
 
 class HtmlTagWrapper(Component):
@@ -1058,8 +1491,8 @@ class DescriptionList(Component, ComponentFieldsMixin):
         self.fields = fields
 
 
-class UnorderedList(Html, ComponentFieldsMixin):
-    """Unordered list"""
+class UnorderedList(Html, PaginatedObjectsMixin, ComponentFieldsMixin):
+    """Unordered list, objects can be paginated with page_size"""
 
     tag = 'ul'
 
@@ -1085,6 +1518,11 @@ class UnorderedList(Html, ComponentFieldsMixin):
             value=value
         ) for index, value in enumerate(values))
 
+        if self.objects and self.is_paginated():
+            self.attr['data-lazy-rows'] = 'true'
+            if self.next_cursor:
+                self.html += render_to_string('trionyx/components/load_more.html', {'component': self, 'tag': 'li'})
+
 
 class OrderedList(UnorderedList):
     """Ordered list"""
@@ -1131,12 +1569,16 @@ class TableDescription(Component, ComponentFieldsMixin):
         self.fields = fields
 
 
-class Table(Component, ComponentFieldsMixin):
+class Table(Component, PaginatedObjectsMixin, ComponentFieldsMixin):
     """
     Bootstrap table
 
     footer: array with first items array/queryset and other items are the fields,
-            Same way how the constructor works
+            Same way how the constructor works. Fields with an aggregate option are aggregated,
+            when the first item is None the table objects are aggregated.
+
+    Large tables can be paginated with the page_size option, the next pages are loaded on request
+    and with sortable the table can be sorted server side. The table must have an id.
 
     """
 
@@ -1161,7 +1603,7 @@ class Table(Component, ComponentFieldsMixin):
         self.header = header
 
         self.footer_objects = footer[0] if footer else None
-        """Can be string with field name relation, Queryset or list"""
+        """Can be string with field name relation, Queryset, list or None to aggregate the table objects"""
 
         self.footer_fields = footer[1:] if footer else []
 
@@ -1185,16 +1627,29 @@ class Table(Component, ComponentFieldsMixin):
         ]
 
     def get_rendered_footer_objects(self):
-        """Render footer objects"""
-        objects = self.footer_objects
+        """
+        Render footer objects
 
-        if isinstance(objects, str):
-            objects = getattr(self.object, objects).all()
+        When footer fields have an aggregate the footer is one row with the aggregated footer objects,
+        or the aggregated table objects when footer objects is None.
+        """
+        fields = self.get_footer_fields()
+        if not any(field.get('aggregate') for field in fields):
+            return [
+                self.get_rendered_footer_object(obj)
+                for obj in self.resolve_objects(self.footer_objects) or []
+            ]
 
-        return [
-            self.get_rendered_footer_object(obj)
-            for obj in objects
-        ]
+        objects = self.resolve_objects(self.objects if self.footer_objects is None else self.footer_objects)
+        row = self.aggregate_objects(objects, fields)
+        model = objects.model if isinstance(objects, QuerySet) else None
+        return [[
+            {
+                **field,
+                'value': self.render_aggregate_field(field, row, model) if field.get('aggregate') else self.render_field(field, row)
+            }
+            for field in fields
+        ]]
 
 
 class Chart(Component, ComponentFieldsMixin):
@@ -1251,6 +1706,18 @@ class Chart(Component, ComponentFieldsMixin):
         self.color_order = ['blue', 'yellow', 'green', 'purple', 'red', 'black']
         self.theme_color = tx_settings.THEME_COLOR.replace('-light', '')
 
+    def get_objects(self):
+        """
+        Get objects, when series fields have an aggregate option the objects are grouped by the first field
+
+        Grouped QuerySets are aggregated in a single query and give a list row per group.
+        """
+        objects = super().get_objects()
+        fields = self.get_fields()
+        if not isinstance(objects, QuerySet) or not any(field.get('aggregate') for field in fields[1:]):
+            return objects
+        return self.group_objects(objects, fields[0], fields[1:])
+
     def get_json_value(self, value):
         """Get json value"""
         if issubclass(value.__class__, (int, float, str, bool)):
@@ -5,12 +5,21 @@ trionyx.models
 :copyright: 2018 by Maikel Martens
 :license: GPLv3
 """
+import json
+import base64
+import binascii
+import datetime
 import operator
 from collections import defaultdict
 from functools import reduce
 
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import NotSupportedError
+from django.db.migrations.operations.base import Operation
 from django.db.models import *  # noqa F403
+from django.db.models.functions import Left, Upper
 from django.urls import reverse
 
 from django.contrib import messages
@@ -20,7 +29,6 @@ from django.utils.translation import ugettext_lazy as _
 from trionyx.config import models_config
 from trionyx import utils
 
-
 TX_MODEL_OVERWRITES = {key.lower(): value.lower() for key, value in settings.TX_MODEL_OVERWRITES.items()}
 
 
@@ -127,6 +135,101 @@ class BaseModel(Model):  # noqa F405
         })
 
 
+VERBOSE_NAME_PREFIX_LENGTH = 255
+"""Number of verbose name characters in the prefix index, long values don't fit in a B-tree index"""
+
+
+def filter_verbose_name_prefix(queryset, prefix):
+    """
+    Filter BaseModel queryset on a case insensitive verbose_name prefix
+
+    On PostgreSQL the filter uses the prefix index of the table (see `AddVerboseNamePrefixIndex`).
+    """
+    queryset = queryset.alias(verbose_name_prefix=Upper(Left('verbose_name', VERBOSE_NAME_PREFIX_LENGTH))).filter(
+        verbose_name_prefix__startswith=Upper(Value(prefix[:VERBOSE_NAME_PREFIX_LENGTH])),  # noqa F405
+    )
+    if len(prefix) > VERBOSE_NAME_PREFIX_LENGTH:
+        queryset = queryset.filter(verbose_name__istartswith=prefix)
+    return queryset
+
+
+class AddVerboseNamePrefixIndex(Operation):
+    """
+    Migration operation that adds the verbose name prefix index of a BaseModel on PostgreSQL
+
+    The index is on the upper case verbose name with `text_pattern_ops`, so it is used by
+    `filter_verbose_name_prefix` for typeahead and select2 searches. Other databases are skipped.
+    Add it to a migration of your app for the models that are searched:
+
+    .. code-block:: python
+
+        from trionyx.models import AddVerboseNamePrefixIndex
+
+        class Migration(migrations.Migration):
+            atomic = False
+
+            operations = [
+                AddVerboseNamePrefixIndex('Post', concurrently=True),
+            ]
+
+    With `concurrently` the index is built without blocking writes, this can't run in a transaction
+    so the migration must have `atomic = False`.
+    """
+
+    reversible = True
+
+    def __init__(self, model_name, concurrently=False):
+        """Init operation"""
+        self.model_name = model_name
+        self.concurrently = concurrently
+
+    def state_forwards(self, app_label, state):
+        """Index is not part of the model state"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        """Create index"""
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.is_supported(schema_editor, model):
+            schema_editor.execute('CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({expression})'.format(
+                concurrently='CONCURRENTLY ' if self.concurrently else '',
+                name=self.get_index_name(schema_editor, model),
+                table=schema_editor.quote_name(model._meta.db_table),
+                expression='UPPER(LEFT({column}, {length})) text_pattern_ops'.format(
+                    column=schema_editor.quote_name(model._meta.get_field('verbose_name').column),
+                    length=VERBOSE_NAME_PREFIX_LENGTH,
+                ),
+            ))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        """Drop index"""
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.is_supported(schema_editor, model):
+            schema_editor.execute('DROP INDEX {concurrently}IF EXISTS {name}'.format(
+                concurrently='CONCURRENTLY ' if self.concurrently else '',
+                name=self.get_index_name(schema_editor, model),
+            ))
+
+    def describe(self):
+        """Describe operation"""
+        return 'Create verbose name prefix index on {}'.format(self.model_name)
+
+    def is_supported(self, schema_editor, model):
+        """Check if index is created for model on the database of schema editor"""
+        if schema_editor.connection.vendor != 'postgresql' or not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return False
+
+        if self.concurrently and schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                'AddVerboseNamePrefixIndex with concurrently cannot be executed inside a transaction, '
+                'set atomic = False on the migration.'
+            )
+        return True
+
+    def get_index_name(self, schema_editor, model):
+        """Get quoted index name"""
+        return schema_editor.quote_name(schema_editor._create_index_name(model._meta.db_table, ['verbose_name'], suffix='_prefix'))
+
+
 def filter_queryset_with_user_filters(queryset, filters, request=None, raise_exception=False):
     """Apply user provided filters on queryset"""
     config = models_config.get_config(queryset.model)
@@ -193,3 +296,222 @@ def filter_queryset_with_user_filters(queryset, filters, request=None, raise_exc
             queryset = queryset.filter(reduce(operator.or_, or_queries))
 
     return queryset
+
+
+class KeysetCursorEncoder(DjangoJSONEncoder):
+    """JSON encoder for cursor values, datetimes and times keep their microseconds so the keyset is exact"""
+
+    def default(self, o):
+        """Encode value"""
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_keyset_cursor(values):
+    """Encode keyset values to url safe cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values, cls=KeysetCursorEncoder).encode()).decode()
+
+
+def get_keyset_field(model, name):
+    """Get model field of keyset field name (can be a relation path), None when it's not a model field"""
+    field = None
+    for part in name.split('__'):
+        if model is None:
+            return None
+        try:
+            field = model._meta.pk if part == 'pk' else model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model
+    return field
+
+
+def decode_keyset_cursor(cursor, model=None, fields=None):
+    """
+    Decode cursor to keyset values, returns None for invalid cursor
+
+    When model and fields are given the values are validated and converted with the `to_python` of the model fields.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, ValueError, UnicodeError):
+        return None
+    if not isinstance(values, list):
+        return None
+    if model is None or fields is None:
+        return values
+
+    if len(values) != len(fields) or any(value is None for value in values):
+        return None
+    try:
+        return [
+            field.to_python(value) if field else value
+            for field, value in zip([get_keyset_field(model, name.lstrip('-')) for name in fields], values)
+        ]
+    except (ValidationError, TypeError, ValueError):
+        return None
+
+
+def keyset_paginate(queryset, fields, cursor=None, page_size=20):
+    """
+    Get page of queryset ordered by fields after given cursor, without COUNT and OFFSET queries.
+
+    The fields (prefix with `-` for descending) must be a unique combination, for example `['verbose_name', 'pk']`.
+    One extra row is fetched to determine if there is a next page.
+    Returns list of rows and the cursor for the next page (None when there is no next page).
+    """
+    rows = list(keyset_filter(queryset, fields, cursor)[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    return rows, get_keyset_cursor(rows[-1], fields)
+
+
+def keyset_filter(queryset, fields, cursor=None):
+    """Get queryset ordered by fields with only the rows after given cursor"""
+    names = [field.lstrip('-') for field in fields]
+    values = decode_keyset_cursor(cursor, queryset.model, fields) if cursor else None
+
+    if values:
+        or_queries = []
+        for index, field in enumerate(fields):
+            lookup = '{}__{}'.format(names[index], 'lt' if field.startswith('-') else 'gt')
+            or_queries.append(Q(**dict(zip(names[:index], values[:index])), **{lookup: values[index]}))  # noqa F405
+        queryset = queryset.filter(reduce(operator.or_, or_queries))
+
+    return queryset.order_by(*fields)
+
+
+def get_keyset_cursor(row, fields):
+    """Get cursor for the rows after given row (model instance or dict)"""
+    return encode_keyset_cursor([
+        row[name] if isinstance(row, dict) else getattr(row, name) for name in [field.lstrip('-') for field in fields]
+    ])
+
+
+class RelationPlanner:
+    """
+    Plan how relations and columns used by rendered fields are loaded for a queryset.
+
+    Forward foreign key and one to one chains are joined with select_related. Many to many and reverse relations
+    are prefetched, when the default renderer is used (str and get_absolute_url) only the columns needed for that are loaded.
+    The planner also keeps the concrete columns used by the fields, so only those can be selected.
+    """
+
+    def __init__(self, model):
+        """Init planner"""
+        self.model = model
+        self.select_related = set()
+        self.prefetch_related = {}
+        self.columns = {model._meta.pk.name}
+        self.full_relations = set()
+
+    def add_field(self, field_path, default_renderer=True, columns=None):
+        """
+        Add field path (relations separated by __) that is rendered
+
+        :param field_path: Field path
+        :param default_renderer: Field is rendered with the default renderer
+        :param columns: Extra columns used by the renderer of the field
+        """
+        for column in columns or []:
+            self.add_field(column, default_renderer=False)
+
+        model = self.model
+        chain = []
+        path = ''
+        for name in field_path.split('__'):
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # Attribute or property, the columns it uses are unknown
+                self.full_relations.add('__'.join(chain))
+                return
+
+            path = '__'.join([*chain, name])
+            if not field.is_relation:
+                if field.concrete:
+                    self.columns.add(path)
+                return
+
+            if not field.related_model:
+                # Generic foreign key
+                self.full_relations.add('__'.join(chain))
+                return
+
+            chain.append(name)
+            if field.many_to_many or field.one_to_many:
+                self.add_prefetch(path, field, default_renderer)
+                return
+
+            self.select_related.add(path)
+            if field.concrete:
+                self.columns.add(path)
+            model = field.related_model
+
+        if default_renderer and issubclass(model, BaseModel):
+            self.columns.update([f'{path}__{model._meta.pk.name}', f'{path}__verbose_name'])
+        else:
+            self.full_relations.add(path)
+
+    def add_column(self, field_path):
+        """Add concrete column that is used without loading the relation, like the foreign key of a relation"""
+        self.columns.add(field_path)
+
+    def get_columns(self):
+        """Get columns needed for the fields, None when all columns of the model are needed"""
+        if '' in self.full_relations:
+            return None
+
+        return sorted(
+            column for column in self.columns
+            if not any(column.startswith(f'{relation}__') for relation in self.full_relations)
+        )
+
+    def get_version_fields(self):
+        """
+        Get updated_at fields of the model and the joined relations, together they change when the planned data changes.
+
+        Returns None when that is unknown: with prefetched relations, attributes that can use any relation
+        or models without updated_at.
+        """
+        if self.prefetch_related or '' in self.full_relations:
+            return None
+
+        fields = []
+        for path in ['', *sorted(self.select_related)]:
+            model = self.model
+            for name in path.split('__') if path else []:
+                model = model._meta.get_field(name).related_model
+            if not issubclass(model, BaseModel):
+                return None
+            fields.append(f'{path}__updated_at' if path else 'updated_at')
+        return fields
+
+    def add_prefetch(self, lookup, field=None, default_renderer=False):
+        """Add prefetch lookup, only the columns used by the default renderer are loaded when possible"""
+        if lookup in self.prefetch_related and not isinstance(self.prefetch_related[lookup], Prefetch):  # noqa F405
+            return
+        if '__' in lookup or not field or not default_renderer or not issubclass(field.related_model, BaseModel):
+            self.prefetch_related[lookup] = lookup
+            return
+
+        columns = [field.related_model._meta.pk.name, 'verbose_name']
+        if field.one_to_many:
+            columns.append(field.field.attname)
+
+        self.prefetch_related[lookup] = Prefetch(  # noqa F405
+            lookup, queryset=field.related_model._default_manager.only(*columns))
+
+    def apply(self, queryset, only_columns=False):
+        """Apply planned relation loading to queryset, with only_columns only the needed columns are selected"""
+        columns = self.get_columns() if only_columns else None
+        if columns:
+            queryset = queryset.only(*columns)
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related.values())
+        return queryset
@@ -0,0 +1,261 @@
+"""
+trionyx.profiler
+~~~~~~~~~~~~~~~~
+
+Render profiler that records the component tree of layout renders and
+query inspector that records the SQL queries of a request
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+import os
+import re
+import sys
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, ExitStack
+
+import django
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+
+from trionyx import utils
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """Install database execute wrapper on all database connections"""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+class RenderProfiler:
+    """
+    Records a tree of component renders with render time and SQL query count for one request.
+
+    Profiler is stored in the request local data, when no profiler is active rendering has no overhead.
+    """
+
+    cache_key = 'trionyx-render-profile'
+    cache_timeout = 60 * 60
+    max_stored_profiles = 50
+
+    def __init__(self, path=''):
+        """Init profiler"""
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.created_at = timezone.now()
+        self.query_count = 0
+        self.root = {'path': '', 'children': []}
+        self.stack = [self.root]
+
+    @classmethod
+    def get_active(cls):
+        """Get active profiler for current request"""
+        return utils.get_local_data('render_profiler')
+
+    def activate(self):
+        """Activate profiler for current request"""
+        utils.set_local_data('render_profiler', self)
+
+    def deactivate(self):
+        """Deactivate profiler for current request"""
+        utils.set_local_data('render_profiler', None)
+
+    def count_query(self, execute, sql, params, many, context):
+        """Database execute wrapper that counts queries"""
+        self.query_count += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def record(self, component):
+        """Record render of component"""
+        parent = self.stack[-1]
+        name = '{}[{}]'.format(component.__class__.__name__.lower(), getattr(component, '_profile_index', 0))
+        node = {
+            'path': f"{parent['path']}.{name}" if parent['path'] else name,
+            'class': '.'.join([component.__class__.__module__, component.__class__.__name__]),
+            'template': component.template_name,
+            'time': 0,
+            'queries': 0,
+            'children': [],
+        }
+        parent['children'].append(node)
+        self.stack.append(node)
+
+        for index, child in enumerate(component.components):
+            child._profile_index = index
+
+        start_time = time.perf_counter()
+        start_queries = self.query_count
+        try:
+            yield node
+        finally:
+            node['time'] = round((time.perf_counter() - start_time) * 1000, 3)
+            node['queries'] = self.query_count - start_queries
+            self.stack.pop()
+
+    @property
+    def total_time(self):
+        """Total render time in ms"""
+        return round(sum(node['time'] for node in self.root['children']), 3)
+
+    @property
+    def total_queries(self):
+        """Total queries executed during render"""
+        return sum(node['queries'] for node in self.root['children'])
+
+    def has_records(self):
+        """Check if there are any recorded renders"""
+        return bool(self.root['children'])
+
+    def get_server_timing(self):
+        """Get Server-Timing header value, with the total and the top level components"""
+        timings = [f'render;dur={self.total_time};desc="Layout render ({self.total_queries} queries)"']
+        for index, node in enumerate(self.root['children'][:20]):
+            timings.append('c{};dur={};desc="{} ({} queries)"'.format(index, node['time'], node['path'], node['queries']))
+        return ', '.join(timings)
+
+    def to_dict(self):
+        """Get JSON serializable trace"""
+        return {
+            'id': self.id,
+            'path': self.path,
+            'created_at': self.created_at.isoformat(),
+            'time': self.total_time,
+            'queries': self.total_queries,
+            'components': self.root['children'],
+        }
+
+    def save(self):
+        """Store trace in cache, only the latest profiles are kept"""
+        cache.set(f'{self.cache_key}-{self.id}', self.to_dict(), timeout=self.cache_timeout)
+        profiles = [self.id] + (cache.get(f'{self.cache_key}s') or [])
+        cache.set(f'{self.cache_key}s', profiles[:self.max_stored_profiles], timeout=self.cache_timeout)
+
+    @classmethod
+    def get_profile(cls, id):
+        """Get stored trace"""
+        return cache.get(f'{cls.cache_key}-{id}')
+
+    @classmethod
+    def get_profiles(cls):
+        """Get latest stored traces"""
+        traces = cache.get_many([f'{cls.cache_key}-{id}' for id in cache.get(f'{cls.cache_key}s') or []])
+        return sorted(
+            [
+                {key: value for key, value in trace.items() if key != 'components'}
+                for trace in traces.values()
+            ],
+            key=lambda trace: trace['created_at'],
+            reverse=True,
+        )
+
+
+class QueryInspector:
+    """
+    Records the SQL queries executed while active, with execution time and the code that executed them.
+
+    Queries that only differ in parameters and are executed at least `n_plus_one_threshold` times are N+1 suspects.
+    Use as database execute wrapper: `with connection.execute_wrapper(inspector):`
+    """
+
+    ignore_paths = [
+        os.path.dirname(django.__file__) + os.sep,
+        contextmanager.__code__.co_filename,
+        __file__,
+    ]
+    """Code paths that are skipped when looking for the source of a query"""
+
+    max_source_depth = 100
+    """Maximum number of stack frames that are walked when looking for the source of a query"""
+
+    def __init__(self, name='', n_plus_one_threshold=5):
+        """Init inspector"""
+        self.name = name
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute and record query"""
+        start_time = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'fingerprint': self.get_fingerprint(sql),
+                'time': round((time.perf_counter() - start_time) * 1000, 3),
+                'source': self.get_source(),
+            })
+
+    @staticmethod
+    def get_fingerprint(sql):
+        """Get fingerprint of query, parameters are already separated so only IN lists and whitespace are normalized"""
+        sql = re.sub(r'IN \((?:%s, )*%s\)', 'IN (...)', sql)
+        return re.sub(r'\s+', ' ', sql).strip()
+
+    def get_source(self):
+        """Get code location and layout component that executed the query"""
+        from trionyx.layout import Component
+        frame = sys._getframe(2)
+        location = None
+        component = None
+        depth = 0
+        while frame and not (location and component) and depth < self.max_source_depth:
+            code = frame.f_code
+            if not location and not any(code.co_filename.startswith(path) for path in self.ignore_paths):
+                location = '{}:{} in {}'.format(os.path.relpath(code.co_filename), frame.f_lineno, code.co_name)
+            # Only frames of methods are checked, reading f_locals is expensive
+            if not component and code.co_argcount and code.co_varnames[0] == 'self':
+                instance = frame.f_locals.get('self')
+                # Use type() because isinstance can evaluate lazy objects, which would execute a query
+                if issubclass(type(instance), Component):
+                    component = instance.__class__.__name__ + (f'#{instance.id}' if instance.id else '')
+            frame = frame.f_back
+            depth += 1
+
+        return ' '.join(filter(None, [location, f'(component {component})' if component else None])) or 'unknown'
+
+    @property
+    def count(self):
+        """Number of executed queries"""
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        """Total query time in ms"""
+        return round(sum(query['time'] for query in self.queries), 3)
+
+    def get_duplicates(self):
+        """Get fingerprints that are executed more than once, with count"""
+        return {
+            fingerprint: count
+            for fingerprint, count in Counter(query['fingerprint'] for query in self.queries).items()
+            if count > 1
+        }
+
+    def get_n_plus_one_suspects(self):
+        """Get repeated queries that only differ in parameters, with the sources that executed them"""
+        return [
+            {
+                'fingerprint': fingerprint,
+                'count': count,
+                'time': round(sum(query['time'] for query in self.queries if query['fingerprint'] == fingerprint), 3),
+                'sources': Counter(query['source'] for query in self.queries if query['fingerprint'] == fingerprint),
+            }
+            for fingerprint, count in self.get_duplicates().items()
+            if count >= self.n_plus_one_threshold
+        ]
+
+    def get_report(self):
+        """Get readable report"""
+        lines = [f'{self.name}: {self.count} queries in {self.total_time} ms, {len(self.get_duplicates())} duplicated statements']
+        for suspect in self.get_n_plus_one_suspects():
+            lines.append('Possible N+1 ({count}x, {time} ms): {fingerprint}'.format(**suspect))
+            lines.extend(f'    {count}x {source}' for source, count in suspect['sources'].most_common())
+        return '\n'.join(lines)
@@ -20,6 +20,19 @@ from trionyx import utils
 from trionyx import models
 
 
+def requires_columns(*columns):
+    """
+    Declare the extra model columns a list field renderer uses
+
+    List queries only select the columns of the shown fields, other columns used by a renderer must be declared
+    (or given with the columns option of the list field), else they are loaded per row.
+    """
+    def wrapper(func):
+        func.required_columns = columns
+        return func
+    return wrapper
+
+
 def date_value_renderer(value, **options):
     """Render date value with django formats, default is SHORT_DATE_FORMAT"""
     date_format = options.get('date_format', 'SHORT_DATE_FORMAT')
@@ -145,8 +145,20 @@ MIDDLEWARE = [
     'trionyx.trionyx.middleware.LoginRequiredMiddleware',
     'trionyx.trionyx.middleware.GlobalRequestMiddleware',
     'trionyx.trionyx.middleware.LastLoginMiddleware',
+    'trionyx.trionyx.middleware.ApiUsageMiddleware',
+    'trionyx.trionyx.middleware.ReadReplicaMiddleware',
+    'trionyx.trionyx.middleware.QueryInspectorMiddleware',
+    'trionyx.trionyx.middleware.RenderProfilerMiddleware',
 ]
 
+AUTHENTICATION_BACKENDS = [
+    'trionyx.trionyx.auth.CachedModelBackend',
+]
+"""
+Replaces Django's ModelBackend, it is a ModelBackend that caches the permission sets (see `TX_AUTH_CACHE`).
+Projects that set their own backends should add `trionyx.trionyx.auth.CachedModelBackend` instead of the ModelBackend.
+"""
+
 # ==============================================================================
 # Database
 # ==============================================================================
@@ -159,6 +171,8 @@ DATABASES = get_env_var('DATABASES', {
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
+DATABASE_ROUTERS = ['trionyx.db.ReadReplicaRouter']
+
 # ==============================================================================
 # Email
 # ==============================================================================
@@ -304,9 +318,12 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'trionyx.api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'trionyx.api.throttling.TokenBucketThrottle',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'trionyx.api.pagination.PageNumberPagination',
     'PAGE_SIZE': 25,
     'ORDERING_PARAM': '_ordering',
@@ -354,6 +371,69 @@ TX_DISABLE_AUDITLOG = False
 TX_DISABLE_API = False
 """Diable API"""
 
+TX_API_RATE_LIMIT: Optional[str] = None
+"""
+Default rate limit per API token (or user) for all API endpoints, like `1000/minute`, default `None` has no limit.
+Rate is number of requests per second, minute, hour or day, short bursts up to the number of requests are allowed.
+Endpoints without a limit are only limited by `ModelConfig.api_rate_limits`.
+"""
+
+TX_API_RATE_LIMIT_TOKEN_BUCKET: Optional[bool] = None
+"""
+Use token buckets for rate limiting, they need a shared cache with atomic increments (Redis or Memcached).
+Default `None` checks the cache backend, other backends use the DRF request history throttle.
+"""
+
+TX_AUTH_CACHE: Optional[bool] = None
+"""
+Cache API tokens, users and permission sets, this needs a cache backend that is faster than the database.
+Default `None` checks the cache backend, the auth data is not cached with the default DatabaseCache or the DummyCache.
+"""
+
+TX_AUTH_CACHE_TIMEOUT: int = 60 * 60
+"""Seconds that API tokens, users and permission sets are cached, changes invalidate the cache directly"""
+
+TX_API_USAGE_FLUSH_INTERVAL: int = 60
+"""Seconds after which the API usage collected by a process is written to the database"""
+
+TX_API_USAGE_FLUSH_SIZE: int = 1000
+"""Number of API requests after which the API usage collected by a process is written to the database"""
+
+TX_API_SCHEMA_DIR: Optional[str] = None
+"""Directory for the pre-generated OpenAPI schema files, default is `openapi` in the STATIC_ROOT"""
+
+TX_API_SCHEMA_GENERATE_ON_MIGRATE: bool = True
+"""Generate the OpenAPI schema files of a new app version after migrate"""
+
+TX_RENDER_PROFILER_SAMPLE_RATE: float = 0
+"""
+Fraction (0 - 1) of requests where layout renders are profiled, profiles can be viewed on /render-profiles/.
+Superusers can also profile a request with the `X-Trionyx-Profile: 1` header.
+"""
+
+TX_QUERY_INSPECTOR: bool = False
+"""Record the SQL queries of every request, possible N+1 queries and exceeded query budgets are logged"""
+
+TX_QUERY_BUDGETS: Dict[str, int] = {}
+"""
+Maximum number of queries per view name (example: `trionyx:model-list-ajax`), use `*` for the default budget.
+Only used when TX_QUERY_INSPECTOR is enabled.
+"""
+
+TX_QUERY_N_PLUS_ONE_THRESHOLD: int = 5
+"""Number of times a query that only differs in parameters must be executed to be logged as possible N+1"""
+
+TX_DB_REPLICAS: List[str] = []
+"""
+Database aliases of read replicas, list, export, widget data, global search and safe API requests read from a random replica
+"""
+
+TX_DB_REPLICA_STICKY_SECONDS: int = 10
+"""Seconds that reads of a user stay on the primary after the user wrote, should be longer than the replication lag"""
+
+TX_SEARCH_BACKEND: Optional[str] = None
+"""Search backend class, default is PostgresSearchBackend on PostgreSQL and WatsonSearchBackend for other databases"""
+
 
 def TX_DEFAULT_DASHBOARD():
     """Return default dashboard"""
@@ -0,0 +1,56 @@
+"""
+trionyx.testing
+~~~~~~~~~~~~~~~
+
+Helpers for testing Trionyx apps
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from trionyx.profiler import QueryInspector
+
+
+class QueryCountTestMixin:
+    """TestCase mixin with assertions on the number and repetition of executed queries"""
+
+    def get_query_count(self, func, *args, using='default', **kwargs):
+        """Get number of queries executed by func"""
+        with CaptureQueriesContext(connections[using]) as context:
+            func(*args, **kwargs)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, request_page, page_sizes=(1, 10), using='default'):  # noqa N802
+        """
+        Assert that the number of queries for a page does not depend on the page size
+
+        :param request_page: Callable that requests a page, it is called with the page size
+        :param page_sizes: Page sizes to compare, data for at least the largest page size must exist
+        """
+        request_page(page_sizes[0])  # Warm up caches, like content types and system variables
+        counts = {page_size: self.get_query_count(request_page, page_size, using=using) for page_size in page_sizes}
+        if len(set(counts.values())) > 1:
+            self.fail('Query count depends on page size (page size: queries): {}'.format(
+                ', '.join(f'{page_size}: {count}' for page_size, count in counts.items())
+            ))
+
+    def inspect_queries(self, func, *args, using='default', n_plus_one_threshold=5, **kwargs):
+        """Run func and give the QueryInspector with the recorded queries"""
+        inspector = QueryInspector(getattr(func, '__name__', ''), n_plus_one_threshold=n_plus_one_threshold)
+        with connections[using].execute_wrapper(inspector):
+            func(*args, **kwargs)
+        return inspector
+
+    def assertNoNPlusOne(self, func, *args, n_plus_one_threshold=5, **kwargs):  # noqa N802
+        """Assert that func executes no query more than the threshold with only different parameters"""
+        inspector = self.inspect_queries(func, *args, n_plus_one_threshold=n_plus_one_threshold, **kwargs)
+        if inspector.get_n_plus_one_suspects():
+            self.fail(inspector.get_report())
+
+    def assertQueryBudget(self, func, budget, *args, **kwargs):  # noqa N802
+        """Assert that func executes at most budget queries"""
+        inspector = self.inspect_queries(func, *args, **kwargs)
+        if inspector.count > budget:
+            self.fail(f'Query budget of {budget} exceeded\n{inspector.get_report()}')
@@ -61,6 +61,20 @@ class Config(BaseConfig):
         from trionyx.trionyx.auditlog import init_auditlog
         init_auditlog()
 
+        from trionyx.trionyx.auth import init_auth_cache
+        init_auth_cache()
+
+        # Invalidate fragment cache of layouts and components that depend on changed models
+        from django.db.models.signals import post_save, post_delete
+        from trionyx.layout import fragment_cache
+        post_save.connect(fragment_cache.model_changed, dispatch_uid='trionyx-fragment-cache-save')
+        post_delete.connect(fragment_cache.model_changed, dispatch_uid='trionyx-fragment-cache-delete')
+
+        # Generate API schema of a new release after migrate
+        from django.db.models.signals import post_migrate
+        from trionyx.api.schema import generate_schema_files_after_migrate
+        post_migrate.connect(generate_schema_files_after_migrate, sender=self, dispatch_uid='trionyx-api-schema')
+
         # Add admin menu items
         from trionyx.urls import model_url
         app_menu.add_item('dashboard', _('Dashboard'), url='/', icon='fa fa-dashboard', order=1)
@@ -69,6 +83,8 @@ class Config(BaseConfig):
         app_menu.add_item(
             'admin/groups', _('Permission groups'), url=model_url('auth.group', 'list'), order=9010, permission='is_superuser')
         app_menu.add_item('admin/logs', _('Logs'), url=model_url('trionyx.log', 'list'), order=9090, permission='is_superuser')
+        app_menu.add_item(
+            'admin/api-usage', _('API usage'), url=model_url('trionyx.apiusage', 'list'), order=9095, permission='is_superuser')
 
         # Add User renderer
         from trionyx.renderer import renderer
@@ -123,6 +139,25 @@ class Config(BaseConfig):
             }
         ]
 
+    class ApiUsage(ModelConfig):
+        """API usage config"""
+
+        verbose_name = '{method} {endpoint}'
+
+        list_default_fields = ['period', 'user', 'endpoint', 'method', 'request_count', 'error_count', 'throttled_count', 'max_duration']
+        list_default_sort = '-period'
+
+        disable_search_index = True
+        global_search = False
+        menu_exclude = True
+
+        disable_add = True
+        disable_change = True
+        disable_delete = True
+
+        auditlog_disable = True
+        api_disable = True
+
     class AuditLogEntry(ModelConfig):
         """AuditlogEntry config"""
 
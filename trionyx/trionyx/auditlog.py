@@ -6,6 +6,7 @@ trionyx.trionyx.auditlog
 :license: GPLv3
 """
 import logging
+from contextlib import contextmanager
 
 from django.conf import settings
 from django.utils import timezone
@@ -15,6 +16,7 @@ from django.utils.translation import ugettext_lazy as _
 from trionyx import models
 from trionyx.config import models_config
 from trionyx.trionyx.models import AuditLogEntry
+from trionyx import utils
 from trionyx.utils import get_current_user
 from trionyx.trionyx.layouts import auditlog as auditlog_layout
 from trionyx.views import tabs
@@ -75,8 +77,8 @@ def get_rendered_value(ModelClass, field_name, value):
 
 
 def create_log(instance, changes, action):
-    """Create a new log entry"""
-    AuditLogEntry.objects.create(
+    """Create a new log entry, when batch_logs is active the entry is saved at the end of the batch"""
+    entry = AuditLogEntry(
         content_object=instance,
         object_verbose_name=str(instance),
         action=action,
@@ -84,6 +86,41 @@ def create_log(instance, changes, action):
         user=get_current_user() if get_current_user() and not get_current_user().is_anonymous else None
     )
 
+    batch = utils.get_local_data('auditlog_batch')
+    if batch is None:
+        entry.save()
+    else:
+        batch.append(entry)
+
+
+@contextmanager
+def batch_logs(batch_size=500):
+    """Collect log entries created in block and save them with bulk inserts"""
+    if utils.get_local_data('auditlog_batch') is not None:
+        # Already in a batch, entries are saved by the outer batch
+        yield
+        return
+
+    utils.set_local_data('auditlog_batch', [])
+    try:
+        yield
+        entries = utils.get_local_data('auditlog_batch')
+        for entry in entries:
+            # bulk_create doesn't call save, set what BaseModel.save would set
+            entry.verbose_name = entry.generate_verbose_name()
+            entry.created_by = entry.user
+        AuditLogEntry.objects.bulk_create(entries, batch_size=batch_size)
+    finally:
+        utils.set_local_data('auditlog_batch', None)
+
+
+def is_enabled(model):
+    """Check if auditlog is enabled for model"""
+    config = models_config.get_config(model)
+    if settings.TX_DISABLE_AUDITLOG or config.auditlog_disable:
+        return False
+    return config.is_trionyx_model or config.has_config('auditlog_disable')
+
 
 def log_add(sender, instance, created, **kwargs):
     """Log model add"""
@@ -123,13 +160,33 @@ def log_delete(sender, instance, **kwargs):
         logger.exception(e)
 
 
+def log_bulk_add(objects):
+    """Log add of objects that are created without signals, like with bulk_create"""
+    for obj in objects:
+        if is_enabled(type(obj)):
+            log_add(type(obj), obj, created=True)
+
+
+def log_bulk_change(changed_objects):
+    """Log change of (old, new) object pairs that are updated without signals, like with bulk_update"""
+    for old, new in changed_objects:
+        if not is_enabled(type(new)):
+            continue
+        try:
+            changes = model_instance_diff(old, new)
+            if changes:
+                create_log(new, changes, AuditLogEntry.ACTION_CHANGED)
+        except Exception as e:
+            logger.exception(e)
+
+
 def init_auditlog():
     """Init auditlog"""
     if settings.TX_DISABLE_AUDITLOG:
         return
 
     for config in models_config.get_all_configs(False):
-        if config.auditlog_disable or (not config.is_trionyx_model and not config.has_config('auditlog_disable')):
+        if not is_enabled(config.model):
             continue
 
         post_save.connect(log_add, sender=config.model, dispatch_uid=(log_add, config.model, post_save))
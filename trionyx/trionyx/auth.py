@@ -0,0 +1,209 @@
+"""
+trionyx.trionyx.auth
+~~~~~~~~~~~~~~~~~~~~
+
+Cached authentication data
+
+Users, API tokens and permission sets are cached in process and in the shared cache with a version stamp.
+The stamp is a global version (groups and permissions) plus a version per user, they are replaced when
+the user, its groups, its permissions or its tokens change, which invalidates all cached data of that user.
+
+The cache is only used with a cache backend that is faster than the database (see `is_auth_cache_enabled`).
+With the DatabaseCache every cache call is a query, the auth data is then loaded from the database as Django does.
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from trionyx import utils
+
+GLOBAL_VERSION_KEY = 'trionyx-auth-version'
+
+AUTH_IGNORE_FIELDS = {'last_online', 'last_login', 'verbose_name'}
+"""User fields that don't change auth data, activity fields are saved on almost every request"""
+
+UNCACHED_BACKENDS = (
+    'django.core.cache.backends.db.',
+    'django.core.cache.backends.dummy.',
+)
+"""Cache backends that don't save database queries for auth data"""
+
+
+def is_auth_cache_enabled():
+    """Check if auth data is cached, `TX_AUTH_CACHE` overrides the check of the cache backend"""
+    setting = getattr(settings, 'TX_AUTH_CACHE', None)
+    if setting is not None:
+        return bool(setting)
+    return not settings.CACHES['default']['BACKEND'].startswith(UNCACHED_BACKENDS)
+
+
+def get_version_key(user_id):
+    """Get cache key of auth version of user"""
+    return f'{GLOBAL_VERSION_KEY}-{user_id}'
+
+
+def get_auth_version(user_id):
+    """Get version stamp of cached auth data of user, within a request the stamp is only fetched once"""
+    versions = utils.get_local_data('auth_versions') if utils.get_current_request() else None
+    if versions is None:
+        versions = {}
+        if utils.get_current_request():
+            utils.set_local_data('auth_versions', versions)
+
+    if user_id not in versions:
+        keys = [GLOBAL_VERSION_KEY, get_version_key(user_id)]
+        values = cache.get_many(keys)
+        versions[user_id] = '-'.join(
+            values.get(key) or cache.get_or_set(key, uuid.uuid4().hex, timeout=None)
+            for key in keys
+        )
+    return versions[user_id]
+
+
+def invalidate_user(user_id):
+    """Invalidate cached auth data of user"""
+    if not is_auth_cache_enabled():
+        return
+    cache.set(get_version_key(user_id), uuid.uuid4().hex, timeout=None)
+    (utils.get_local_data('auth_versions') or {}).pop(user_id, None)
+
+
+def invalidate_all():
+    """Invalidate cached auth data of all users"""
+    if not is_auth_cache_enabled():
+        return
+    cache.set(GLOBAL_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    (utils.get_local_data('auth_versions') or {}).clear()
+
+
+class AuthCache:
+    """Versioned cache for auth data of a user, recently used entries are also kept in process"""
+
+    max_process_entries = 1000
+    """Maximum number of entries kept in process"""
+
+    def __init__(self):
+        """Init cache"""
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get_cache_key(self, name, user_id):
+        """Get shared cache key"""
+        return f'trionyx-auth-{user_id}-{name}'
+
+    def get(self, name, user_id):
+        """Get value when it is cached for the current auth version of the user"""
+        version = get_auth_version(user_id)
+        key = self.get_cache_key(name, user_id)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == version:
+                self.entries.move_to_end(key)
+                return entry[1]
+
+        entry = cache.get(key)
+        if entry and entry[0] == version:
+            self.set_process_entry(key, entry)
+            return entry[1]
+        return None
+
+    def set(self, name, user_id, value):
+        """Cache value for current auth version of the user"""
+        key = self.get_cache_key(name, user_id)
+        entry = (get_auth_version(user_id), value)
+        cache.set(key, entry, timeout=getattr(settings, 'TX_AUTH_CACHE_TIMEOUT', 60 * 60))
+        self.set_process_entry(key, entry)
+
+    def set_process_entry(self, key, entry):
+        """Keep entry in process, least recently used entries are removed"""
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_process_entries:
+                self.entries.popitem(last=False)
+
+
+auth_cache = AuthCache()
+
+
+class CachedModelBackend(ModelBackend):
+    """Model backend that caches the permission sets of active users, without auth cache it is the ModelBackend"""
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        """Get cached user or group permissions"""
+        perm_cache_name = f'_{from_name}_perm_cache'
+        if not is_auth_cache_enabled():
+            return super()._get_permissions(user_obj, obj, from_name)
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None or hasattr(user_obj, perm_cache_name):
+            return super()._get_permissions(user_obj, obj, from_name)
+
+        perms = auth_cache.get(f'{from_name}-perms', user_obj.pk)
+        if perms is None:
+            perms = super()._get_permissions(user_obj, obj, from_name)
+            auth_cache.set(f'{from_name}-perms', user_obj.pk, perms)
+        setattr(user_obj, perm_cache_name, perms)
+        return perms
+
+
+def invalidate_user_changed(sender, instance, **kwargs):
+    """Invalidate auth data of saved or deleted user, saves that only update ignored fields are skipped"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= AUTH_IGNORE_FIELDS:
+        return
+    invalidate_user(instance.pk)
+
+
+def invalidate_token_changed(sender, instance, **kwargs):
+    """Invalidate auth data of user of saved or deleted token"""
+    invalidate_user(instance.user_id)
+
+
+def invalidate_user_relation_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate auth data when groups or permissions of a user change"""
+    if not action.startswith('post_'):
+        return
+
+    if not reverse:
+        invalidate_user(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            invalidate_user(user_id)
+    else:
+        invalidate_all()
+
+
+def invalidate_all_changed(sender, **kwargs):
+    """Invalidate auth data of all users when a group or permission changes"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        invalidate_all()
+
+
+def init_auth_cache():
+    """Connect signals that invalidate cached auth data"""
+    from rest_framework.authtoken.models import Token
+
+    User = get_user_model()
+    post_save.connect(invalidate_user_changed, sender=User, dispatch_uid='trionyx-auth-user-save')
+    post_delete.connect(invalidate_user_changed, sender=User, dispatch_uid='trionyx-auth-user-delete')
+    post_save.connect(invalidate_token_changed, sender=Token, dispatch_uid='trionyx-auth-token-save')
+    post_delete.connect(invalidate_token_changed, sender=Token, dispatch_uid='trionyx-auth-token-delete')
+
+    m2m_changed.connect(invalidate_user_relation_changed, sender=User.groups.through, dispatch_uid='trionyx-auth-user-groups')
+    m2m_changed.connect(
+        invalidate_user_relation_changed, sender=User.user_permissions.through, dispatch_uid='trionyx-auth-user-permissions')
+
+    m2m_changed.connect(invalidate_all_changed, sender=Group.permissions.through, dispatch_uid='trionyx-auth-group-permissions')
+    post_save.connect(invalidate_all_changed, sender=Group, dispatch_uid='trionyx-auth-group-save')
+    post_delete.connect(invalidate_all_changed, sender=Group, dispatch_uid='trionyx-auth-group-delete')
+    post_delete.connect(invalidate_all_changed, sender=Permission, dispatch_uid='trionyx-auth-permission-delete')
@@ -211,11 +211,14 @@ def trionyx_log(obj):
                 Panel(
                     _('Last log entries'),
                     Table(
-                        obj.entries.select_related('user').order_by('-id')[:25],
+                        obj.entries.order_by('-id'),
                         'log_time',
                         'user',
                         'path',
                         'user_agent',
+                        id='log-entries',
+                        page_size=25,
+                        sortable=True,
                         object=LogEntry()
                     )
                 )
@@ -0,0 +1,34 @@
+"""
+trionyx.trionyx.management.commands.generate_api_schema
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trionyx.api.schema import generate_schema_files, get_schema_version
+
+
+class Command(BaseCommand):
+    """Command to pre-generate the OpenAPI schema files of the current app version"""
+
+    help = 'Generate OpenAPI schema files of the current app version'
+
+    def add_arguments(self, parser):
+        """Add arguments"""
+        parser.add_argument('languages', nargs='*', type=str, help='Languages to generate, default is all LANGUAGES')
+        parser.add_argument('--force', action='store_true', help='Overwrite existing schema files')
+
+    def handle(self, *args, **options):
+        """Generate schema files"""
+        if settings.TX_DISABLE_API:
+            raise CommandError('API is disabled')
+        if not get_schema_version():
+            raise CommandError('App has no version (config.__version__), schema is generated on request')
+
+        paths = generate_schema_files(options['languages'], force=options['force'])
+        for path in paths:
+            self.stdout.write(f'Generated {path}')
+        self.stdout.write(self.style.SUCCESS(f'Generated {len(paths)} schema files for version {get_schema_version()}'))
@@ -0,0 +1,94 @@
+"""
+trionyx.trionyx.management.commands.rebuild_search_index
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: 2021 by Maikel Martens
+:license: GPLv3
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import override
+from watson import search
+
+from trionyx.config import models_config
+from trionyx.trionyx.search import SearchIndexRebuild, get_search_backend
+from trionyx.trionyx.tasks import rebuild_search_index_chunk
+
+
+class Command(BaseCommand):
+    """Command for a chunked and resumable rebuild of the search index"""
+
+    help = 'Rebuild search index in chunks, an interrupted rebuild is resumed'
+
+    def add_arguments(self, parser):
+        """Add arguments"""
+        parser.add_argument('models', nargs='*', type=str, help='Models (app_label.model_name) to rebuild, default is all')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of pks per chunk')
+        parser.add_argument('--workers', type=int, default=1, help='Number of processes used to build the chunks')
+        parser.add_argument('--celery', action='store_true', help='Build chunks as Celery tasks')
+        parser.add_argument('--restart', action='store_true', help='Discard interrupted rebuild and start over')
+
+    def handle(self, *args, **options):
+        """Rebuild search index"""
+        with override(settings.LANGUAGE_CODE):
+            self.rebuild(options)
+
+    def rebuild(self, options):
+        """Plan or resume rebuild and build all pending chunks"""
+        backend = get_search_backend()
+        model_labels = []
+        vector_models = []
+        for label in [models_config.get_model_name(label) for label in options['models']]:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError(f'Unknown model {label}')
+
+            if backend.uses_search_vector(model):
+                vector_models.append(model)
+            elif search.default_search_engine.is_registered(model):
+                model_labels.append(label)
+            else:
+                raise CommandError(f'Model {label} has no search index')
+
+        if not options['models']:
+            vector_models = [
+                config.model for config in models_config.get_all_configs(False)
+                if not config.disable_search_index and backend.uses_search_vector(config.model)
+            ]
+
+        for model in vector_models:
+            backend.update_search_vectors(model)
+            self.stdout.write(f'Updated search vectors of {models_config.get_model_name(model)}')
+
+        if options['models'] and not model_labels:
+            return
+
+        rebuild = SearchIndexRebuild()
+        if rebuild.is_planned and (options['restart'] or (model_labels and rebuild.state['models'] != model_labels)):
+            rebuild.discard()
+
+        if rebuild.is_planned:
+            self.stdout.write('Resume rebuild, {} of {} chunks completed'.format(
+                len(rebuild.state['completed']),
+                len(rebuild.state['chunks']),
+            ))
+        else:
+            rebuild.plan(model_labels, chunk_size=options['chunk_size'])
+            self.stdout.write('Planned rebuild with {} chunks'.format(len(rebuild.state['chunks'])))
+
+        if options['celery']:
+            pending = rebuild.pending_chunks
+            if not pending:
+                rebuild.finish()
+            for index in pending:
+                rebuild_search_index_chunk.delay(index)
+            self.stdout.write(self.style.SUCCESS(f'Scheduled {len(pending)} chunks'))
+            return
+
+        for index in rebuild.run(workers=options['workers']):
+            self.stdout.write('Chunk {} completed ({}%)'.format(index, rebuild.progress))
+
+        count = rebuild.finish()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} search entries'))
@@ -5,15 +5,27 @@ trionyx.trionyx.middleware
 :copyright: 2018 by Maikel Martens
 :license: GPLv3
 """
+import asyncio
+import random
+import time
+import logging
 from re import compile
 
+from asgiref.sync import async_to_sync, sync_to_async
 from django.urls import reverse
 from django.http import HttpResponseRedirect
 from django.conf import settings
 from django.utils import timezone
 from django.utils import translation
+from django.utils.deprecation import MiddlewareMixin
 
-from trionyx import utils
+from trionyx import utils, db
+from trionyx.profiler import RenderProfiler, QueryInspector, execute_wrapper
+
+logger = logging.getLogger(__name__)
+
+# Middleware uses the MiddlewareMixin hooks so it is async capable. Under ASGI Django runs plain sync
+# middleware on one shared thread that stays blocked while the rest of the request runs.
 
 EXEMPT_URLS = [
     compile(reverse(settings.LOGIN_URL).lstrip('/')),
@@ -22,7 +34,7 @@ if hasattr(settings, 'LOGIN_EXEMPT_URLS'):
     EXEMPT_URLS += [compile(expr) for expr in settings.LOGIN_EXEMPT_URLS]
 
 
-class LoginRequiredMiddleware:
+class LoginRequiredMiddleware(MiddlewareMixin):
     """
     Middleware that requires a user to be authenticated to view any page other
     than LOGIN_URL. Exemptions to this requirement can optionally be specified
@@ -33,31 +45,24 @@ class LoginRequiredMiddleware:
     loaded. You'll get an error if they aren't.
     """
 
-    def __init__(self, get_response):
-        """Init"""
-        self.get_response = get_response
-
-    def __call__(self, request):
+    def process_request(self, request):
         """Check if user is logged in"""
         if not request.user.is_authenticated:
             path = request.path_info.lstrip('/')
             if not any(m.match(path) for m in EXEMPT_URLS):
                 return HttpResponseRedirect(reverse(settings.LOGIN_URL) + '?next=' + request.path_info)
-
-        return self.get_response(request)
+        return None
 
 
-class GlobalRequestMiddleware:
+class GlobalRequestMiddleware(MiddlewareMixin):
     """Store request in thread local data"""
 
-    def __init__(self, get_response):
-        """Init"""
-        self.get_response = get_response
-
-    def __call__(self, request):
+    def process_request(self, request):
         """Store request in local data"""
         utils.set_local_data('request', request)
 
+    def process_response(self, request, response):
+        """Clear local data, for streaming responses after the content is streamed"""
         def streaming_content_wrapper(content):
             try:
                 for chunk in content:
@@ -65,12 +70,6 @@ class GlobalRequestMiddleware:
             finally:
                 utils.clear_local_data()
 
-        try:
-            response = self.get_response(request)
-        except Exception as e:
-            utils.clear_local_data()
-            raise e
-
         if response.streaming:
             response.streaming_content = streaming_content_wrapper(response.streaming_content)
         else:
@@ -79,34 +78,167 @@ class GlobalRequestMiddleware:
         return response
 
 
-class LastLoginMiddleware:
+class LastLoginMiddleware(MiddlewareMixin):
     """Set last login for user"""
 
-    def __init__(self, get_response):
-        """Init"""
-        self.get_response = get_response
-
-    def __call__(self, request):
+    def process_request(self, request):
         """Set last login"""
         minute_ago = timezone.now() - timezone.timedelta(minutes=1)
         if request.user.is_authenticated and (not request.user.last_online or request.user.last_online <= minute_ago):
             request.user.last_online = timezone.now()
             request.user.save(update_fields=['last_online'])
 
-        return self.get_response(request)
 
+class ReadReplicaMiddleware(MiddlewareMixin):
+    """Keep reads of a user on the primary database for a short time after the user wrote"""
 
-class LocalizationMiddleware:
-    """Localize request to user settings"""
+    def process_request(self, request):
+        """Start tracking writes of request"""
+        if db.get_replicas():
+            db.reset_written()
 
-    def __init__(self, get_response):
-        """Init"""
-        self.get_response = get_response
+    def process_response(self, request, response):
+        """Make user sticky to primary when request wrote to the database"""
+        if db.get_replicas() and db.has_written():
+            db.set_primary_sticky(getattr(request, 'user', None))
+        return response
 
-    def __call__(self, request):
+
+class ApiUsageMiddleware(MiddlewareMixin):
+    """Add rate limit headers to API responses and collect API usage"""
+
+    def process_request(self, request):
+        """Start measuring request"""
+        request.api_start_time = time.perf_counter()
+
+    def process_response(self, request, response):
+        """Measure API request"""
+        from trionyx.api.usage import collector
+
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit:
+            response['X-RateLimit-Limit'] = rate_limit['limit']
+            response['X-RateLimit-Remaining'] = rate_limit['remaining']
+            response['X-RateLimit-Reset'] = rate_limit['reset']
+
+        usage = getattr(request, 'api_usage', None)
+        if usage:
+            collector.add(
+                **usage,
+                duration=round((time.perf_counter() - request.api_start_time) * 1000, 3),
+                error=response.status_code >= 400,
+                throttled=response.status_code == 429,
+            )
+            if collector.should_flush():
+                collector.flush_in_background()
+
+        return response
+
+
+class LocalizationMiddleware(MiddlewareMixin):
+    """Localize request to user settings"""
+
+    def process_request(self, request):
         """Set localization"""
         if request.user.is_authenticated:
             translation.activate(request.user.language)
             timezone.activate(request.user.timezone)
 
-        return self.get_response(request)
+
+class RenderProfilerMiddleware(MiddlewareMixin):
+    """
+    Profile layout renders of request, enabled for superusers with the `X-Trionyx-Profile` header
+    or for a sample of all requests with the `TX_RENDER_PROFILER_SAMPLE_RATE` setting
+
+    Under ASGI a profiled request runs on one thread, so the queries of async views are counted.
+    """
+
+    def __init__(self, get_response=None):
+        """Init"""
+        super().__init__(get_response)
+        self.sample_rate = getattr(settings, 'TX_RENDER_PROFILER_SAMPLE_RATE', 0)
+
+    def is_enabled(self, request):
+        """Check if profiler is enabled for request"""
+        if request.headers.get('X-Trionyx-Profile') and getattr(request, 'user', None) and request.user.is_superuser:
+            return True
+        return bool(self.sample_rate) and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        """Profile request"""
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+
+        if not self.is_enabled(request):
+            return self.get_response(request)
+        return self.profile(request, self.get_response)
+
+    async def acall(self, request):
+        """Profile request under ASGI"""
+        if not await sync_to_async(self.is_enabled)(request):
+            return await self.get_response(request)
+        return await sync_to_async(self.profile)(request, async_to_sync(self.get_response))
+
+    def profile(self, request, get_response):
+        """Get response with profiler active"""
+        profiler = RenderProfiler(request.get_full_path())
+        profiler.activate()
+        try:
+            with execute_wrapper(profiler.count_query):
+                response = get_response(request)
+        finally:
+            profiler.deactivate()
+
+        if profiler.has_records():
+            profiler.save()
+            response['Server-Timing'] = profiler.get_server_timing()
+            response['X-Trionyx-Profile-Id'] = profiler.id
+        return response
+
+
+class QueryInspectorMiddleware(MiddlewareMixin):
+    """
+    Record the SQL queries of requests when `TX_QUERY_INSPECTOR` is enabled.
+
+    Possible N+1 queries and views that exceed their query budget (`TX_QUERY_BUDGETS`) are logged.
+    Under ASGI an inspected request runs on one thread, so the queries of async views are recorded.
+    """
+
+    def __init__(self, get_response=None):
+        """Init"""
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'TX_QUERY_INSPECTOR', False)
+        self.budgets = getattr(settings, 'TX_QUERY_BUDGETS', {})
+        self.n_plus_one_threshold = getattr(settings, 'TX_QUERY_N_PLUS_ONE_THRESHOLD', 5)
+
+    def get_budget(self, view_name):
+        """Get query budget for view"""
+        return self.budgets.get(view_name, self.budgets.get('*'))
+
+    def __call__(self, request):
+        """Inspect queries of request"""
+        if not self.enabled:
+            return self.get_response(request)
+        if asyncio.iscoroutinefunction(self.get_response):
+            return sync_to_async(self.inspect)(request, async_to_sync(self.get_response))
+        return self.inspect(request, self.get_response)
+
+    def inspect(self, request, get_response):
+        """Get response with query inspector active"""
+        inspector = QueryInspector(request.path, n_plus_one_threshold=self.n_plus_one_threshold)
+        with execute_wrapper(inspector):
+            response = get_response(request)
+
+        view_name = request.resolver_match.view_name if request.resolver_match else request.path
+        inspector.name = view_name
+        budget = self.get_budget(view_name)
+        if budget is not None and inspector.count > budget:
+            logger.warning('Query budget of %s queries exceeded by view %s', budget, view_name)
+
+        for suspect in inspector.get_n_plus_one_suspects():
+            logger.warning('Possible N+1 queries in view %s from %s: %s', view_name,
+                           suspect['sources'].most_common(1)[0][0], suspect['fingerprint'][:500])
+
+        timing = f'db;dur={inspector.total_time};desc="{inspector.count} queries"'
+        response['Server-Timing'] = ', '.join(filter(None, [response.get('Server-Timing'), timing]))
+        return response
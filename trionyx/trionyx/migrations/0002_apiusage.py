@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 16:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trionyx', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateTimeField(verbose_name='Period')),
+                ('token', models.CharField(blank=True, default='', max_length=8, verbose_name='Token')),
+                ('endpoint', models.CharField(max_length=128, verbose_name='Endpoint')),
+                ('method', models.CharField(max_length=8, verbose_name='Method')),
+                ('request_count', models.PositiveIntegerField(default=0, verbose_name='Requests')),
+                ('error_count', models.PositiveIntegerField(default=0, verbose_name='Errors')),
+                ('throttled_count', models.PositiveIntegerField(default=0, verbose_name='Throttled')),
+                ('total_duration', models.FloatField(default=0, verbose_name='Total duration (ms)')),
+                ('max_duration', models.FloatField(default=0, verbose_name='Max duration (ms)')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'API usage',
+                'verbose_name_plural': 'API usage',
+                'unique_together': {('period', 'user', 'token', 'endpoint', 'method')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trionyx', '0002_apiusage'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='apiusage',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('period', 'token', 'endpoint', 'method'), name='trionyx_apiusage_unique_anonymous'),
+        ),
+    ]
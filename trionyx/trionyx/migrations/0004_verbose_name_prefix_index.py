@@ -0,0 +1,16 @@
+from django.db import migrations
+
+from trionyx.models import AddVerboseNamePrefixIndex
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('trionyx', '0003_apiusage_unique_anonymous'),
+    ]
+
+    operations = [
+        AddVerboseNamePrefixIndex('user', concurrently=True),
+        AddVerboseNamePrefixIndex('log', concurrently=True),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:18
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_token_prefixes(apps, schema_editor):
+    """Replace stored token key prefixes with a hash, usage rows stay unique"""
+    ApiUsage = apps.get_model('trionyx', 'ApiUsage')
+    for usage in ApiUsage.objects.using(schema_editor.connection.alias).exclude(token=''):
+        usage.token = hashlib.md5(usage.token.encode()).hexdigest()
+        usage.save(update_fields=['token'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trionyx', '0004_verbose_name_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='apiusage',
+            name='token',
+            field=models.CharField(blank=True, default='', max_length=32, verbose_name='Token hash'),
+        ),
+        migrations.RunPython(hash_token_prefixes, migrations.RunPython.noop),
+    ]
@@ -260,7 +260,7 @@ class LogManager(models.BaseManager):
             log_time=timezone.now(),
             user=request.user if request and not request.user.is_anonymous else None,
             path=request.path if request else '',
-            user_agent=request.META.get('HTTP_USER_AGENT') if request else '',
+            user_agent=request.META.get('HTTP_USER_AGENT', '') if request else '',
         )
 
         log.last_event = entry.log_time
@@ -323,6 +323,41 @@ class LogEntry(models.Model):
         verbose_name_plural = _('Log entries')
 
 
+class ApiUsage(models.Model):
+    """API requests per hour, user, token, endpoint and method"""
+
+    period = models.DateTimeField(_('Period'))
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, models.SET_NULL, null=True, blank=True, related_name='+', verbose_name=_('User'))
+    token = models.CharField(_('Token hash'), max_length=32, blank=True, default='')
+    endpoint = models.CharField(_('Endpoint'), max_length=128)
+    method = models.CharField(_('Method'), max_length=8)
+
+    request_count = models.PositiveIntegerField(_('Requests'), default=0)
+    error_count = models.PositiveIntegerField(_('Errors'), default=0)
+    throttled_count = models.PositiveIntegerField(_('Throttled'), default=0)
+    total_duration = models.FloatField(_('Total duration (ms)'), default=0)
+    max_duration = models.FloatField(_('Max duration (ms)'), default=0)
+
+    class Meta:
+        """Model meta description"""
+
+        verbose_name = _('API usage')
+        verbose_name_plural = _('API usage')
+        unique_together = [('period', 'user', 'token', 'endpoint', 'method')]
+        constraints = [
+            # NULL values are not equal in unique_together, anonymous usage needs its own constraint
+            models.UniqueConstraint(
+                fields=['period', 'token', 'endpoint', 'method'],
+                condition=models.Q(user__isnull=True),
+                name='trionyx_apiusage_unique_anonymous',
+            ),
+        ]
+
+    def __str__(self):
+        """Get API usage representation"""
+        return f'{self.method} {self.endpoint} ({self.period})'
+
+
 class AuditLogEntry(models.BaseModel):
     """Auditlog model"""
 
@@ -7,9 +7,26 @@ Add search and global search to models
 :copyright: 2018 by Maikel Martens
 :license: GPLv3
 """
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from string import Formatter
+
+from celery.utils import uuid
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction, connection, connections, router
+from django.db.models import Min, Max, F, Q, CharField, TextField
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import ugettext as _
 from watson import search
 
-from trionyx.config import models_config
+from trionyx.config import models_config, variables
+from trionyx.utils import CacheLock, import_object_by_string
+from trionyx import utils
+
+SearchResult = namedtuple('SearchResult', ['content_type_id', 'title', 'description', 'url', 'rank'])
 
 
 class ModelSearchAdapter(search.SearchAdapter):
@@ -53,13 +70,495 @@ class ModelSearchAdapter(search.SearchAdapter):
 
 def auto_register_search_models():
     """Auto register all search models"""
+    backend = get_search_backend()
     for config in models_config.get_all_configs(False):
         if config.disable_search_index:
             continue
 
+        if backend.uses_search_vector(config.model):
+            post_save.connect(update_search_vector, sender=config.model, dispatch_uid=f'trionyx-search-vector-{config.model_name}')
+            continue
+
         search.register(
             config.model.objects.get_queryset(),
             ModelSearchAdapter,
             fields=config.search_fields,
             exclude=config.search_exclude_fields,
         )
+
+
+def update_search_vector(sender, instance, **kwargs):
+    """Signal handler that updates the search vector of saved object"""
+    get_search_backend().update_search_vectors(sender, pk=instance.pk)
+
+
+class SearchBackend:
+    """Base search backend, used by list, API, select2 and global search"""
+
+    def uses_search_vector(self, model):
+        """Check if model is searched with its own search vector field instead of the search index"""
+        return False
+
+    def filter(self, queryset, query):
+        """Filter queryset on search query"""
+        raise NotImplementedError()
+
+    def search(self, query, models, limit=100):
+        """Search given models, returns list of SearchResult ordered by relevance"""
+        raise NotImplementedError()
+
+    def typeahead(self, query, model, limit=10):
+        """Get SearchResult list for objects of model where the verbose_name starts with query"""
+        from django.contrib.contenttypes.models import ContentType
+        from trionyx.models import BaseModel, filter_verbose_name_prefix
+
+        if not issubclass(model, BaseModel):
+            return self.search(query, [model], limit)
+
+        config = models_config.get_config(model)
+        content_type_id = ContentType.objects.get_for_model(model, False).id
+        return [
+            SearchResult(content_type_id, obj.verbose_name, '', config.get_absolute_url(obj), 1)
+            for obj in filter_verbose_name_prefix(model.objects.all(), query).order_by('verbose_name')[:limit]
+        ]
+
+    def update_search_vectors(self, model, pk=None, pks=None):
+        """Update search vectors of model, when pk or pks are given only for those objects"""
+        pass
+
+    def update_objects(self, model, objects):
+        """Update search index of objects that are saved without signals, like with bulk_create and bulk_update"""
+        if self.uses_search_vector(model):
+            self.update_search_vectors(model, pks=[obj.pk for obj in objects])
+        elif search.is_registered(model):
+            with search.update_index():
+                for obj in objects:
+                    search.search_context_manager.add_to_context(search.default_search_engine, obj)
+
+
+class WatsonSearchBackend(SearchBackend):
+    """Search backend that uses the watson search index, supported on all databases"""
+
+    def filter(self, queryset, query):
+        """Filter queryset on search query"""
+        return search.filter(queryset, query, ranking=False)
+
+    def search(self, query, models, limit=100):
+        """Search given models, returns list of SearchResult ordered by relevance"""
+        return [
+            SearchResult(entry.content_type_id, entry.title, entry.description, entry.url, getattr(entry, 'watson_rank', 0))
+            for entry in search.search(query, models=models)[:limit]
+        ]
+
+
+class PostgresSearchBackend(WatsonSearchBackend):
+    """
+    Search backend that uses native PostgreSQL full-text search.
+
+    Models with a `search_vector_field` are searched on that field (which should have a GinIndex)
+    and ranked with the weights from `search_title` (A), `search_description` (B) and `search_fields` (C).
+    Only local columns are indexed, fields of related models are skipped. Other models fall back on the watson search index.
+    """
+
+    def __init__(self):
+        """Init backend"""
+        self.search_config = getattr(settings, 'WATSON_POSTGRES_SEARCH_CONFIG', 'pg_catalog.english')
+
+    def get_vector_field(self, model):
+        """Get search vector field name of model"""
+        return models_config.get_config(model).search_vector_field
+
+    def uses_search_vector(self, model):
+        """Check if model is searched with its own search vector field instead of the search index"""
+        return bool(self.get_vector_field(model))
+
+    def get_weighted_fields(self, model):
+        """Get dict with search weight and the model fields that are indexed with that weight"""
+        config = models_config.get_config(model)
+        # Vectors are updated with a queryset update that can't join relations, so only local columns are indexed
+        concrete_fields = {field.name for field in model._meta.concrete_fields if not field.is_relation}
+        search_fields = config.search_fields or [
+            field.name for field in model._meta.concrete_fields
+            if isinstance(field, (CharField, TextField)) and field.name not in config.search_exclude_fields
+        ]
+
+        weighted_fields = {}
+        for weight, fields in [
+            ('A', format_fields(config.search_title or config.verbose_name)),
+            ('B', format_fields(config.search_description)),
+            ('C', search_fields),
+        ]:
+            for field in fields:
+                if field in concrete_fields and not any(field in indexed for indexed in weighted_fields.values()):
+                    weighted_fields.setdefault(weight, []).append(field)
+        return weighted_fields
+
+    def get_search_vector(self, model):
+        """Get weighted search vector expression for model"""
+        from django.contrib.postgres.search import SearchVector
+
+        vector = None
+        for weight, fields in self.get_weighted_fields(model).items():
+            field_vector = SearchVector(*fields, weight=weight, config=self.search_config)
+            vector = field_vector if vector is None else vector + field_vector
+        return vector
+
+    def get_search_query(self, query):
+        """Get search query expression"""
+        from django.contrib.postgres.search import SearchQuery
+        return SearchQuery(query, config=self.search_config)
+
+    def filter(self, queryset, query):
+        """Filter queryset on search query"""
+        field = self.get_vector_field(queryset.model)
+        if not field:
+            return super().filter(queryset, query)
+        if not query.strip():
+            return queryset
+        return queryset.filter(**{field: self.get_search_query(query)})
+
+    def search(self, query, models, limit=100):
+        """Search given models, returns list of SearchResult ordered by relevance"""
+        from django.contrib.contenttypes.models import ContentType
+        from django.contrib.postgres.search import SearchRank
+
+        index_models = [model for model in models if not self.uses_search_vector(model)]
+        results = super().search(query, index_models, limit) if index_models else []
+
+        search_query = self.get_search_query(query)
+        for model in models:
+            if model in index_models:
+                continue
+
+            field = self.get_vector_field(model)
+            adapter = ModelSearchAdapter(model)
+            content_type_id = ContentType.objects.get_for_model(model, False).id
+            queryset = model.objects.filter(**{field: search_query}).annotate(
+                search_rank=SearchRank(F(field), search_query),
+            ).order_by('-search_rank')[:limit]
+
+            results.extend(
+                SearchResult(content_type_id, adapter.get_title(obj), adapter.get_description(obj), adapter.get_url(obj), obj.search_rank)
+                for obj in queryset
+            )
+
+        return sorted(results, key=lambda result: result.rank, reverse=True)[:limit]
+
+    def update_search_vectors(self, model, pk=None, pks=None):
+        """Update search vectors of model, when pk or pks are given only for those objects"""
+        vector = self.get_search_vector(model)
+        if not vector:
+            return
+
+        queryset = model.objects.all()
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+        elif pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        queryset.update(**{self.get_vector_field(model): vector})
+
+
+_search_backend = None
+
+
+def get_search_backend():
+    """Get search backend, default is PostgresSearchBackend on PostgreSQL and WatsonSearchBackend for other databases"""
+    global _search_backend
+    if _search_backend is None:
+        if getattr(settings, 'TX_SEARCH_BACKEND', None):
+            _search_backend = import_object_by_string(settings.TX_SEARCH_BACKEND)()
+        elif connection.vendor == 'postgresql':
+            _search_backend = PostgresSearchBackend()
+        else:
+            _search_backend = WatsonSearchBackend()
+    return _search_backend
+
+
+def format_fields(format_string):
+    """Get field paths used in format string, attributes of relations are given as lookup path (`category__name`)"""
+    if not format_string:
+        return []
+    return [
+        field.split('[')[0].replace('.', '__')
+        for literal, field, spec, conversion in Formatter().parse(format_string) if field
+    ]
+
+
+def _build_search_index_chunk(index):
+    """Build search index chunk, module level function so it can be used in a process pool"""
+    SearchIndexRebuild().build_chunk(index)
+    return index
+
+
+class SearchIndexRebuild:
+    """
+    Resumable full rebuild of the search index.
+
+    The pk range of every search model is split in chunks, each chunk is indexed in a staging engine slug
+    and is checkpointed as completed. When all chunks are completed the staging entries replace the live
+    entries in a single transaction, so search results are never incomplete during a rebuild.
+
+    Objects that are created or changed (`updated_at`) after the rebuild was planned and objects that are
+    deleted during the rebuild are synced in the same transaction. Changes of objects without `updated_at`
+    that are made during the rebuild are not in the new index.
+    """
+
+    engine_slug = 'default'
+    staging_engine_slug = 'trionyx-rebuild'
+    variable_code = 'trionyx_search_index_rebuild'
+
+    def __init__(self):
+        """Init rebuild"""
+        self.state = self.load_state()
+
+    @property
+    def is_planned(self):
+        """Check if there is a planned or interrupted rebuild"""
+        return bool(self.state)
+
+    @property
+    def pending_chunks(self):
+        """Indexes of chunks that are not completed"""
+        completed = set(self.state.get('completed', [])) if self.state else set()
+        return [index for index in range(len(self.state['chunks'])) if index not in completed] if self.state else []
+
+    @property
+    def progress(self):
+        """Rebuild progress percentage"""
+        if not self.state or not self.state['chunks']:
+            return 100
+        return int(len(self.state['completed']) / len(self.state['chunks']) * 100)
+
+    def load_state(self):
+        """Load rebuild state, local cache is skipped because other processes could have changed it"""
+        utils.set_local_data('trionyx_variables', None)
+        return variables.get(self.variable_code, {})
+
+    def save_state(self):
+        """Save rebuild state"""
+        variables.set(self.variable_code, self.state)
+
+    def get_models(self, model_labels=None):
+        """Get models to rebuild, default all registered search models"""
+        if not model_labels:
+            return search.default_search_engine.get_registered_models()
+        return [apps.get_model(label) for label in model_labels]
+
+    def get_queryset(self, model):
+        """Get queryset with all objects that should be indexed"""
+        queryset = search.default_search_engine.get_adapter(model).get_live_queryset()
+        return queryset if queryset is not None else model._default_manager.all()
+
+    def plan(self, model_labels=None, chunk_size=1000):
+        """Split the pk range of all models in chunks and store them as new rebuild state"""
+        from watson.models import SearchEntry, has_int_pk
+        from trionyx.models import get_class
+
+        SearchEntry.objects.filter(engine_slug=self.staging_engine_slug).delete()
+
+        started_at = timezone.now()
+        models = self.get_models(model_labels)
+        chunks = []
+        max_pks = {}
+        for model in models:
+            label = models_config.get_model_name(model)
+            if not has_int_pk(model):
+                chunks.append([label, None, None])
+                continue
+
+            pk_range = self.get_queryset(model).aggregate(start=Min('pk'), end=Max('pk'))
+            max_pks[label] = pk_range['end']
+            if pk_range['start'] is None:
+                continue
+
+            for start in range(pk_range['start'], pk_range['end'] + 1, chunk_size):
+                chunks.append([label, start, start + chunk_size - 1])
+
+        Task = get_class('trionyx.Task')
+        task = Task.objects.create(
+            celery_task_id=uuid(),
+            identifier='rebuild_search_index',
+            description=_('Rebuild search index'),
+            status=Task.RUNNING,
+            started_at=started_at,
+        )
+
+        self.state = {
+            'models': [models_config.get_model_name(model) for model in models],
+            'full_rebuild': not model_labels,
+            'chunks': chunks,
+            'completed': [],
+            'task_id': task.id,
+            'started_at': started_at.isoformat(),
+            'max_pks': max_pks,
+        }
+        self.save_state()
+
+    def discard(self):
+        """Discard rebuild state and staging entries"""
+        from watson.models import SearchEntry
+        from trionyx.models import get_class
+        if self.state:
+            Task = get_class('trionyx.Task')
+            Task.objects.filter(id=self.state['task_id'], status=Task.RUNNING).update(
+                status=Task.FAILED,
+                progress=100,
+                result=_('Rebuild discarded'),
+            )
+
+        SearchEntry.objects.filter(engine_slug=self.staging_engine_slug).delete()
+        self.state = {}
+        self.save_state()
+
+    def build_chunk(self, index):
+        """Index all objects of chunk in the staging engine, chunk can be rebuild safely"""
+        from django.contrib.contenttypes.models import ContentType
+        from watson.models import SearchEntry
+
+        label, start, end = self.state['chunks'][index]
+        model = apps.get_model(label)
+        content_type = ContentType.objects.get_for_model(model)
+
+        queryset = self.get_queryset(model)
+        entries = SearchEntry.objects.filter(engine_slug=self.staging_engine_slug, content_type=content_type)
+        if start is not None:
+            queryset = queryset.filter(pk__gte=start, pk__lte=end)
+            entries = entries.filter(object_id_int__gte=start, object_id_int__lte=end)
+
+        with transaction.atomic():
+            entries.delete()
+            self.create_entries(model, queryset.iterator(), self.staging_engine_slug)
+
+    def create_entries(self, model, objects, engine_slug):
+        """Create search entries for objects, returns number of created entries"""
+        from django.contrib.contenttypes.models import ContentType
+        from watson.models import SearchEntry, has_int_pk, get_str_pk
+
+        adapter = search.default_search_engine.get_adapter(model)
+        content_type = ContentType.objects.get_for_model(model)
+        connection = connections[router.db_for_write(SearchEntry)]
+
+        return len(SearchEntry.objects.bulk_create([
+            SearchEntry(
+                engine_slug=engine_slug,
+                content_type=content_type,
+                object_id=get_str_pk(obj, connection),
+                object_id_int=int(obj.pk) if has_int_pk(model) else None,
+                title=adapter.get_title(obj),
+                description=adapter.get_description(obj),
+                content=adapter.get_content(obj),
+                url=adapter.get_url(obj),
+                meta_encoded=adapter.serialize_meta(obj),
+            ) for obj in objects
+        ], batch_size=500))
+
+    def sync_changes(self, model):
+        """Sync live entries of model with the objects that are created, changed or deleted since the rebuild was planned"""
+        from django.contrib.contenttypes.models import ContentType
+        from watson.models import SearchEntry, has_int_pk, get_str_pk
+
+        label = models_config.get_model_name(model)
+        started_at = parse_datetime(self.state['started_at']) if self.state.get('started_at') else None
+        max_pks = self.state.get('max_pks', {})
+        queryset = self.get_queryset(model)
+        entries = SearchEntry.objects.filter(engine_slug=self.engine_slug, content_type=ContentType.objects.get_for_model(model))
+
+        if has_int_pk(model):
+            # Objects deleted during the rebuild
+            entries.exclude(object_id_int__in=queryset.values('pk')).delete()
+
+        changed = Q()
+        if has_int_pk(model) and label in max_pks:
+            changed |= Q(pk__gt=max_pks[label]) if max_pks[label] is not None else Q(pk__isnull=False)
+        if started_at and any(field.name == 'updated_at' for field in model._meta.get_fields()):
+            changed |= Q(updated_at__gte=started_at)
+        if not changed:
+            return 0
+
+        objects = list(queryset.filter(changed))
+        connection = connections[router.db_for_write(SearchEntry)]
+        entries.filter(object_id__in=[get_str_pk(obj, connection) for obj in objects]).delete()
+        return self.create_entries(model, objects, self.engine_slug)
+
+    def mark_completed(self, index):
+        """Checkpoint chunk as completed and update task progress, returns True when all chunks are completed"""
+        from trionyx.models import get_class
+
+        with CacheLock('search-index-rebuild'):
+            self.state = self.load_state()
+            if index not in self.state['completed']:
+                self.state['completed'].append(index)
+            self.save_state()
+
+        Task = get_class('trionyx.Task')
+        Task.objects.filter(id=self.state['task_id']).update(progress=min(self.progress, 99))
+        return not self.pending_chunks
+
+    def finish(self):
+        """Swap the staging entries with the live entries in one transaction"""
+        with CacheLock('search-index-rebuild-finish'):
+            self.state = self.load_state()
+            if not self.state:
+                # Already finished by other process
+                return None
+
+            if self.pending_chunks:
+                raise ValueError('Search index rebuild has pending chunks')
+
+            count = self.swap()
+            self.state = {}
+            self.save_state()
+
+        return count
+
+    def swap(self):
+        """Replace live entries with staging entries and complete rebuild task"""
+        from django.contrib.contenttypes.models import ContentType
+        from watson.models import SearchEntry
+        from trionyx.models import get_class
+
+        models = self.get_models(self.state['models'])
+        content_types = [ContentType.objects.get_for_model(model) for model in models]
+        live_entries = SearchEntry.objects.filter(engine_slug=self.engine_slug)
+
+        with transaction.atomic():
+            if self.state['full_rebuild']:
+                live_entries.delete()
+            else:
+                live_entries.filter(content_type__in=content_types).delete()
+
+            SearchEntry.objects.filter(
+                engine_slug=self.staging_engine_slug,
+                content_type__in=content_types,
+            ).update(engine_slug=self.engine_slug)
+
+            for model in models:
+                self.sync_changes(model)
+            count = live_entries.filter(content_type__in=content_types).count()
+
+        Task = get_class('trionyx.Task')
+        task = Task.objects.filter(id=self.state['task_id']).first()
+        if task:
+            task.status = Task.COMPLETED
+            task.progress = 100
+            task.result = _('Rebuilt {count} search entries').format(count=count)
+            task.execution_time = int((timezone.now() - task.started_at).total_seconds()) if task.started_at else 0
+            task.save()
+
+        return count
+
+    def run(self, workers=1):
+        """Build all pending chunks, with a process pool when workers is more than one"""
+        pending = self.pending_chunks
+        if workers > 1 and len(pending) > 1:
+            # Forked processes can't share the database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for index in pool.map(_build_search_index_chunk, pending):
+                    self.mark_completed(index)
+                    yield index
+        else:
+            for index in pending:
+                self.build_chunk(index)
+                self.mark_completed(index)
+                yield index
@@ -1,15 +1,12 @@
 function trionyxInitialize() {
-    $('.select').select2({
-        width: '100%',
-        escapeMarkup: function(markup) {
-            return markup;
-        }
-    });
-    $('.selectmultiple').select2({
-        width: '100%',
-        escapeMarkup: function(markup) {
-            return markup;
-        }
+    $('.select, .selectmultiple').each(function (index, select) {
+        $(select).select2({
+            width: '100%',
+            escapeMarkup: function(markup) {
+                return markup;
+            },
+            ajax: $(select).data('ajax-url') ? select2AjaxOptions($(select).data('ajax-url')) : undefined,
+        });
     });
     $('.datetimepicker').each(function(index, input) {
         $(input).datetimepicker(getDataOptions(input, [
@@ -151,6 +148,7 @@ function initGlobalSearch(searchUrl) {
             search: '',
             show: false,
             ajaxCall: null,
+            debounceTimeout: null,
 
             results: [],
         },
@@ -160,15 +158,28 @@ function initGlobalSearch(searchUrl) {
                 if (this.ajaxCall) {
                     this.ajaxCall.abort();
                 }
+                clearTimeout(this.debounceTimeout);
 
                 if (!search) {
                     this.results = [];
                     return;
                 }
 
+                this.debounceTimeout = setTimeout(function () {
+                    self.doSearch(search);
+                }, 200);
+            }
+        },
+        methods: {
+            doSearch: function(search) {
+                var self = this;
                 this.ajaxCall = $.ajax({
                     type: 'GET',
-                    url: this.searchUrl + '?search=' + this.search,
+                    url: this.searchUrl,
+                    data: {
+                        search: search,
+                        typeahead: search.length < 3 ? 1 : 0,
+                    },
                 }).done(function(response) {
                     if (response.status !== 'success') {
                         return;
@@ -178,9 +189,7 @@ function initGlobalSearch(searchUrl) {
                 }).always(function () {
                     self.ajaxCall = null;
                 });
-            }
-        },
-        methods: {
+            },
             close: function(){
               this.search = '';
               this.show = false;
@@ -576,12 +585,15 @@ $(function(){
 });
 
 /* layout */
-function txUpdateLayout(id, component) {
+function txUpdateLayout(id, component, params) {
     if (id in window.trionyx_layouts) {
         var url = window.trionyx_layouts[id] + '?layout_id=' + id;
         if (typeof component !== 'undefined' && component) {
             url += '&component=' + component;
         }
+        if (typeof params !== 'undefined' && params) {
+            url += '&' + $.param(params);
+        }
 
         $.get(url, function(response) {
             if (response.status === 'success') {
@@ -600,6 +612,31 @@ function txUpdateLayout(id, component) {
     }
 }
 
+function txLoadMore(id, component, params) {
+    if (!(id in window.trionyx_layouts)) {
+        return;
+    }
+
+    var url = window.trionyx_layouts[id] + '?' + $.param($.extend({layout_id: id, component: component}, params));
+    $.get(url, function(response) {
+        if (response.status !== 'success') {
+            return;
+        }
+
+        var findRows = function(element) {
+            return element.is('[data-lazy-rows]') ? element : element.find('[data-lazy-rows]').first();
+        };
+        var current = $('#' + id + ' #component-' + component);
+        var loaded = $('<div></div>').html(response.data).find('#component-' + component);
+
+        current.find('[data-lazy-more]').remove();
+        findRows(current).append(findRows(loaded).children());
+        findRows(current).after(loaded.find('[data-lazy-more]'));
+
+        trionyxInitialize();
+    });
+}
+
 /* Form depend */
 function trionyxFormDepend(selector, dependencies) {
     function trionyxFormDependenciesChange() {
@@ -624,6 +661,27 @@ function trionyxFormDepend(selector, dependencies) {
 }
 
 
+/* Select2 ajax options with keyset pagination, cursor of previous page is used to load next page */
+function select2AjaxOptions(url) {
+    var cursors = {};
+    return {
+        url: url,
+        delay: 200,
+        data: function (params) {
+            var page = params.page || 1;
+            return {
+                q: params.term,
+                cursor: page > 1 ? cursors[page - 1] : '',
+            };
+        },
+        processResults: function (data, params) {
+            cursors[params.page || 1] = data.pagination ? data.pagination.cursor : null;
+            return data;
+        },
+    };
+}
+
+
 /* Widget model form field */
 function widgetModelFormField(modelField, name, fields) {
     var field = $('#widget-field-' + name);
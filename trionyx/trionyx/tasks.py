@@ -30,6 +30,20 @@ def cleanup_unexpectedly_stopped_tasks():
     )
 
 
+@shared_task
+def rebuild_search_index_chunk(index):
+    """Build search index chunk and swap search index when it's the last completed chunk"""
+    from trionyx.trionyx.search import SearchIndexRebuild
+
+    rebuild = SearchIndexRebuild()
+    if not rebuild.is_planned:
+        return
+
+    rebuild.build_chunk(index)
+    if rebuild.mark_completed(index):
+        rebuild.finish()
+
+
 class MassUpdateTask(BaseTask):
     """Mass update task"""
 
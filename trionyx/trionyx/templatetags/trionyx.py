@@ -29,8 +29,8 @@ def active_menu_item(request, item):
 
 @register.simple_tag(takes_context=True)
 def render_component(context, component):
-    """Render given component"""
-    return component.render(context.flatten(), context.get('request'))
+    """Render given component, in the current template context"""
+    return component.render(context, context.get('request'))
 
 
 @register.filter
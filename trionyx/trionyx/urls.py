@@ -9,25 +9,18 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path, include
 from django.views.generic import TemplateView
-from django.views.decorators.cache import cache_page
-from django.template.loader import render_to_string
-from rest_framework.schemas import get_schema_view
-from rest_framework.permissions import AllowAny
 
 from trionyx import views as core_views
 from trionyx.trionyx import views
-from trionyx.api.routers import AutoRouter, APISchemaGenerator
+from trionyx.api.routers import AutoRouter
+from trionyx.api.schema import OpenAPISchemaView
 
 app_name = 'trionyx'
 
 api_auto_router = AutoRouter()
 
 api_patterns = [
-    path('openapi', cache_page(60 * 60)(get_schema_view(
-        description=render_to_string('trionyx/api/description.html') + '',
-        generator_class=APISchemaGenerator,
-        permission_classes=[AllowAny],
-    )), name='openapi-schema'),
+    path('openapi', OpenAPISchemaView.as_view(), name='openapi-schema'),
     path('api/', TemplateView.as_view(
         template_name='trionyx/api/redoc.html',
         extra_context={'schema_url': 'trionyx:openapi-schema'}
@@ -56,6 +49,10 @@ urlpatterns = [
     # Changelog
     path('changelog/', views.ChangelogDialog.as_view(), name='changelog'),
 
+    # Render profiles
+    path('render-profiles/', views.RenderProfilesJsendView.as_view(), name='render-profiles'),
+    path('render-profiles/<str:id>/', views.RenderProfilesJsendView.as_view(), name='render-profile'),
+
     # Dashboard
     path('', views.DashboardView.as_view(), name='dashboard'),
     path('dashboard/save/', views.SaveDashboardJsendView.as_view(), name='dashboard-save'),
@@ -7,38 +7,42 @@ trionyx.trionyx.view.accounts
 """
 import os
 import re
+import hashlib
 import json
 import logging
-from collections import OrderedDict
 
 from docutils.core import publish_parts
-from django.core.paginator import Paginator
+from django.apps import apps
+from django.core.cache import cache
 from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.core.exceptions import PermissionDenied
 from django.contrib.auth.views import LoginView as DjangoLoginView
 from django.contrib.auth import logout as django_logout
 from django.contrib.auth.models import Permission
 from django.shortcuts import redirect
 from django.urls import reverse
-from watson import search as watson
 from django.contrib.contenttypes.models import ContentType
 from django.views.generic import TemplateView
 from django.conf import settings
 from django.templatetags.static import static
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import ugettext_lazy as _, get_language
 from django.contrib import messages
 from django.forms.widgets import SelectMultiple
 from django.contrib.auth import get_user_model
 
 from trionyx.models import get_class
-from trionyx.views import UpdateView, DetailTabView, DialogView, JsendView
-from trionyx.views.mixins import ModelClassMixin, ModelPermissionMixin
+from trionyx.views import UpdateView, DetailTabView, DialogView, JsendView, AsyncJsendView, database_sync_to_async
+from trionyx.views.mixins import ModelClassMixin, ModelPermissionMixin, ReadReplicaMixin
 from trionyx.config import models_config
 from trionyx.widgets import widgets
 from trionyx import utils
 from trionyx.forms.helper import FormHelper
 from trionyx.forms import form_register, modelform_factory, ModelAjaxChoiceField
-from trionyx.models import filter_queryset_with_user_filters
+from trionyx.models import filter_queryset_with_user_filters, filter_verbose_name_prefix, keyset_paginate
 from trionyx.trionyx.tasks import MassUpdateTask
+from trionyx.trionyx.search import get_search_backend
+from trionyx.trionyx.auth import get_auth_version
+from trionyx.profiler import RenderProfiler
 
 User = get_user_model()
 Task = get_class('trionyx.Task')
@@ -228,49 +232,84 @@ def create_permission_jstree(selected=None, disabled=False):
 # Ajax form views
 # =============================================================================
 def ajaxFormModelChoices(request, id):
-    """View for select2 ajax data request"""
+    """
+    View for select2 ajax data request
+
+    Choices are keyset paginated on (verbose_name, pk) with the `cursor` from the previous page,
+    the first page is cached shortly per field and search.
+    """
     if id not in ModelAjaxChoiceField.registered_fields:
         return JsonResponse({})
 
     field = ModelAjaxChoiceField.registered_fields[id]
-    query = field.queryset.order_by('verbose_name')
+    search = request.GET.get('q', '').strip()
+    cursor = request.GET.get('cursor')
+
+    cache_key = 'trionyx-form-choices-{}-{}'.format(id, hashlib.md5(search.lower().encode()).hexdigest())
+    if not cursor:
+        data = cache.get(cache_key)
+        if data is not None:
+            return JsonResponse(data)
 
-    search = request.GET.get('q', None)
+    query = field.queryset
     if search:
         config = models_config.get_config(query.model)
         if not config.disable_search_index:
-            query = watson.filter(query, search, ranking=False)
+            query = get_search_backend().filter(query, search)
         else:
-            query = query.filter(verbose_name__contains=search)
+            query = filter_verbose_name_prefix(query, search)
 
-    pages = Paginator(query, 20)
-    page = pages.page(int(request.GET.get('page', 1)))
+    rows, next_cursor = keyset_paginate(query.values('pk', 'verbose_name'), ['verbose_name', 'pk'], cursor, page_size=20)
 
     result = [
         {'id': '', 'text': '------'}
-    ] if not isinstance(field.widget, SelectMultiple) and not field.required and page.number == 1 else []
+    ] if not isinstance(field.widget, SelectMultiple) and not field.required and not cursor else []
 
-    return JsonResponse({
+    data = {
         'results': result + [{
-            'id': row[0],
-            'text': row[1],
-        } for row in page.object_list.values_list('id', 'verbose_name')],
+            'id': row['pk'],
+            'text': row['verbose_name'],
+        } for row in rows],
         'pagination': {
-            'more': page.has_next(),
+            'more': next_cursor is not None,
+            'cursor': next_cursor,
         }
-    })
+    }
+
+    if not cursor:
+        cache.set(cache_key, data, timeout=30)
+    return JsonResponse(data)
 
 
 # =============================================================================
 # Global search
 # =============================================================================
-class GlobalSearchJsendView(JsendView):
-    """View for global search uses watson to search all models"""
+class GlobalSearchJsendView(ReadReplicaMixin, AsyncJsendView):
+    """
+    View for global search uses the search backend to search all models
 
-    def handle_request(self, request):
-        """Handle search"""
-        models = []
-        content_types = {}
+    With `typeahead=1` only the verbose_name prefix is matched, results are cached per user for a short time
+    so repeated requests while typing don't hit the database. Cache keys have the auth version of the user,
+    so a permission change is used directly. Searches run with `database_sync_to_async`.
+    """
+
+    top_k = 10
+    """Max results per model"""
+
+    cache_timeout = 30
+    """Seconds search results are cached per user"""
+
+    models_cache_timeout = 60 * 5
+    """Seconds the searchable models of user are cached"""
+
+    def get_search_models(self, request):
+        """Get list of (model label, content type id) the user can search, cached per user and auth version"""
+        cache_key = f'trionyx-global-search-models-{request.user.id}-{get_auth_version(request.user.id)}'
+        search_models = cache.get(cache_key)
+        if search_models is not None:
+            return search_models
+
+        search_models = []
         for config in models_config.get_all_configs(False):
             if config.disable_search_index or not config.global_search:
                 continue
@@ -282,26 +321,62 @@ class GlobalSearchJsendView(JsendView):
             ).lower()):
                 continue
 
-            models.append(config.model)
-            content_type = ContentType.objects.get_for_model(config.model, False)
-            content_types[content_type.id] = str(config.model._meta.verbose_name_plural)
+            search_models.append((
+                models_config.get_model_name(config.model),
+                ContentType.objects.get_for_model(config.model, False).id,
+            ))
 
-        results = OrderedDict()
-        for entry in watson.search(request.GET.get('search', ''), models=models)[:100]:
-            if entry.content_type_id not in results:
-                results[entry.content_type_id] = {
-                    'name': content_types[entry.content_type_id],
-                    'items': [],
-                }
+        cache.set(cache_key, search_models, timeout=self.models_cache_timeout)
+        return search_models
 
-            if len(results[entry.content_type_id]['items']) <= 10:
-                results[entry.content_type_id]['items'].append({
+    async def handle_request(self, request):
+        """Handle search"""
+        search = request.GET.get('search', '').strip()
+        typeahead = request.GET.get('typeahead') in ['1', 'true']
+        if not search:
+            return []
+
+        cache_key = 'trionyx-global-search-{}-{}-{}-{}-{}'.format(
+            request.user.id,
+            await database_sync_to_async(get_auth_version)(request.user.id),
+            get_language(),
+            'typeahead' if typeahead else 'search',
+            hashlib.md5(search.lower().encode()).hexdigest(),
+        )
+        results = await database_sync_to_async(cache.get)(cache_key)
+        if results is None:
+            results = await database_sync_to_async(self.search)(request, search, typeahead)
+            await database_sync_to_async(cache.set)(cache_key, results, timeout=self.cache_timeout)
+        return results
+
+    def search(self, request, search, typeahead=False):
+        """Search models of user, results are grouped by model and sorted by best rank"""
+        backend = get_search_backend()
+        results = []
+        for label, content_type_id in self.get_search_models(request):
+            model = apps.get_model(label)
+            if typeahead:
+                entries = backend.typeahead(search, model, limit=self.top_k)
+            else:
+                entries = backend.search(search, models=[model], limit=self.top_k)
+
+            if not entries:
+                continue
+
+            results.append({
+                'name': str(model._meta.verbose_name_plural),
+                'rank': max(entry.rank for entry in entries),
+                'items': [{
                     'url': entry.url,
                     'title': entry.title,
                     'description': entry.description,
-                })
+                } for entry in entries],
+            })
 
-        return list(results.values())
+        return [
+            {'name': result['name'], 'items': result['items']}
+            for result in sorted(results, key=lambda result: result['rank'], reverse=True)
+        ]
 
 
 class FilterFieldsJsendView(JsendView):
@@ -330,11 +405,15 @@ class FilterFieldsJsendView(JsendView):
         }
 
 
-class UserTasksJsend(JsendView):
+class UserTasksJsend(AsyncJsendView):
     """User tasks view"""
 
-    def handle_request(self, request):
+    async def handle_request(self, request):
         """Get user open tasks"""
+        return await database_sync_to_async(self.get_tasks)(request)
+
+    def get_tasks(self, request):
+        """Get latest tasks of user"""
         return [
             {
                 'id': task.id,
@@ -347,6 +426,33 @@ class UserTasksJsend(JsendView):
         ]
 
 
+# =============================================================================
+# Render profiles
+# =============================================================================
+class RenderProfilesJsendView(JsendView):
+    """View for browsing recorded layout render profiles, only for superusers"""
+
+    def dispatch(self, request, *args, **kwargs):
+        """Only allow superusers"""
+        if not request.user.is_superuser:
+            raise PermissionDenied()
+        return super().dispatch(request, *args, **kwargs)
+
+    def handle_request(self, request, id=None):
+        """Get latest profiles or the full trace for given profile id"""
+        if not id:
+            return [
+                {**profile, 'url': reverse('trionyx:render-profile', kwargs={'id': profile['id']})}
+                for profile in RenderProfiler.get_profiles()
+            ]
+
+        profile = RenderProfiler.get_profile(id)
+        if not profile:
+            self.status = self.ERROR
+            self.message = str(_('Render profile does not exist'))
+        return profile
+
+
 # =============================================================================
 # Changelog
 # =============================================================================
@@ -438,10 +544,10 @@ class DashboardView(TemplateView):
         return context
 
 
-class WidgetDataJsendView(JsendView):
-    """Jsend view to get widget data"""
+class WidgetDataJsendView(ReadReplicaMixin, AsyncJsendView):
+    """Jsend view to get widget data, the widget queries run with `database_sync_to_async`"""
 
-    def handle_request(self, request):
+    async def handle_request(self, request):
         """Get widget data"""
         data = json.loads(request.body.decode('utf-8'))
 
@@ -450,10 +556,10 @@ class WidgetDataJsendView(JsendView):
 
         widget = widgets.get(data['code'])()
 
-        if not widget.is_visible(self.request):
+        if not await database_sync_to_async(widget.is_visible)(self.request):
             raise LookupError('Widget data is not available')
 
-        return widget.get_data(request, data.get('config', {}))
+        return await database_sync_to_async(widget.get_data)(request, data.get('config', {}))
 
 
 class SaveDashboardJsendView(JsendView):
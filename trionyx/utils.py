@@ -11,7 +11,7 @@ import random
 import string
 import importlib
 import hashlib
-import threading
+from contextvars import ContextVar
 from functools import reduce
 from typing import List, Any, Optional
 
@@ -23,8 +23,8 @@ from django.core.cache import cache
 logger = logging.getLogger(__name__)
 
 
-LOCAL_DATA = threading.local()
-"""Data storage for current request thread"""
+LOCAL_DATA: ContextVar = ContextVar('trionyx_data')
+"""Data storage for current request, local to the thread or to the async task (and its sync_to_async calls) under ASGI"""
 
 
 class CacheLock:
@@ -62,6 +62,11 @@ def random_string(size: int) -> str:
     return ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(size))
 
 
+def create_etag(*parts: Any) -> str:
+    """Create quoted ETag value from given parts"""
+    return '"{}"'.format(hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest())
+
+
 def import_object_by_string(namespace: str) -> Any:
     """Import object by complete namespace"""
     segments = namespace.split('.')
@@ -179,20 +184,18 @@ def datetime_format_to_django_template(format):
 
 def set_local_data(code, value):
     """Set local process data"""
-    trionyx_data = getattr(LOCAL_DATA, 'trionyx_data', {})
-    trionyx_data[code] = value
-    setattr(LOCAL_DATA, 'trionyx_data', trionyx_data)
+    # Set a copy, under ASGI concurrent tasks can start with the same dict
+    LOCAL_DATA.set({**LOCAL_DATA.get({}), code: value})
 
 
 def get_local_data(code, default=None):
     """Get local process data"""
-    trionyx_data = getattr(LOCAL_DATA, 'trionyx_data', {})
-    return trionyx_data.get(code, default)
+    return LOCAL_DATA.get({}).get(code, default)
 
 
 def clear_local_data():
     """Clear all local data"""
-    LOCAL_DATA.trionyx_data = {}
+    LOCAL_DATA.set({})
 
 
 def get_current_request():
@@ -10,7 +10,7 @@ from collections import defaultdict
 
 from django.utils.translation import ugettext_lazy as _
 from trionyx.config import models_config, TX_MODEL_OVERWRITES
-from trionyx.layout import Layout, Column12, Panel, DescriptionList, Component
+from trionyx.layout import Layout, Column12, Panel, DescriptionList, Component, fragment_cache
 
 from .models import (  # noqa F401
     ListView, ListJsendView, ListExportView, ListChoicesJsendView, DetailTabView,
@@ -20,7 +20,7 @@ from .dialogs import (  # noqa F401
     DialogView, UpdateDialog, CreateDialog, LayoutDialog, DeleteDialog
 )
 
-from .ajax import JsendView  # noqa F401
+from .ajax import JsendView, AsyncJsendView, database_sync_to_async  # noqa F401
 
 logger = logging.getLogger(__name__)
 
@@ -32,23 +32,35 @@ class LayoutRegister:
         """Init"""
         self.layouts = {}
 
-    def add_layout(self, code, func):
+    def add_layout(self, code, func, cache=False, cache_timeout=None, cache_depends_on=None):
         """Add layout"""
         if code in self.layouts and self.layouts[code]['layout']:
             raise ValueError("Layout {} already registered".format(code))
 
-        if code in self.layouts:
-            self.layouts[code]['layout'] = func
-        else:
+        if code not in self.layouts:
             self.layouts[code] = {
-                'layout': func,
                 'updates': [],
             }
 
-    def register(self, code):
-        """Add layout to register"""
+        self.layouts[code].update({
+            'layout': func,
+            'cache': cache,
+            'cache_timeout': cache_timeout,
+            'cache_depends_on': cache_depends_on if cache_depends_on else [],
+        })
+
+    def register(self, code, cache=False, cache_timeout=None, cache_depends_on=None):
+        """
+        Add layout to register
+
+        :param code: Layout code
+        :param cache: Cache rendered layout per object version, user permissions and locale
+        :param cache_timeout: Seconds rendered layout is cached
+        :param cache_depends_on: Models (class or alias) the layout depends on, cache is invalidated when one is saved
+        :return:
+        """
         def wrapper(create_layout):
-            self.add_layout(code, create_layout)
+            self.add_layout(code, create_layout, cache, cache_timeout, cache_depends_on)
             return create_layout
         return wrapper
 
@@ -102,6 +114,29 @@ class LayoutRegister:
 
         return layout
 
+    def get_fragment_key(self, code, object, request=None):
+        """Get fragment cache key of rendered layout, None when cache is not enabled for layout"""
+        layout_config = self.layouts.get(code)
+        if not layout_config or not layout_config.get('cache'):
+            return None
+        return fragment_cache.get_key(f'layout-{code}', object, request, layout_config['cache_depends_on'])
+
+    def render_layout(self, code, object, request=None):
+        """Render layout for given object, from cache when cache is enabled for layout"""
+        if code not in self.layouts:
+            raise LookupError('layout does not exist')
+
+        key = self.get_fragment_key(code, object, request)
+        if not key:
+            return self.get_layout(code, object).render(request)
+
+        layout_config = self.layouts[code]
+        output = fragment_cache.get(key)
+        if output is None:
+            output = self.get_layout(code, object).render(request)
+            fragment_cache.set(key, output, layout_config['cache_timeout'])
+        return output
+
 
 class SidebarRegister:
     """Register sidebars"""
@@ -187,7 +222,8 @@ class TabRegister:
                 return item
         raise LookupError('Given tab does not exits or is filtered')
 
-    def register(self, model_alias, code='general', name=None, order=10, display_filter=None):
+    def register(self, model_alias, code='general', name=None, order=10, display_filter=None,
+                 cache=False, cache_timeout=None, cache_depends_on=None):
         """
         Register new tab
 
@@ -195,6 +231,9 @@ class TabRegister:
         :param code:
         :param name:
         :param order:
+        :param cache: Cache rendered tab per object version, user permissions and locale
+        :param cache_timeout: Seconds rendered tab is cached
+        :param cache_depends_on: Models (class or alias) the tab depends on, cache is invalidated when one is saved
         :return:
         """
         model_alias = self.get_model_alias(model_alias)
@@ -216,7 +255,7 @@ class TabRegister:
 
             self.tabs[model_alias].append(item)
             self.tabs[model_alias] = sorted(self.tabs[model_alias], key=lambda item: item.order if item.order else 10)
-            layouts.add_layout(f'{model_alias}-{code}', create_layout)
+            layouts.add_layout(f'{model_alias}-{code}', create_layout, cache, cache_timeout, cache_depends_on)
 
             return create_layout
         return wrapper
@@ -311,6 +350,11 @@ class TabItem:
         model_alias = self.model_alias if self.model_alias else tabs.get_model_alias(object)
         return layouts.get_layout(f'{model_alias}-{self.code}', object)
 
+    def render_layout(self, object, request=None):
+        """Render layout for given object, from cache when cache is enabled for tab"""
+        model_alias = self.model_alias if self.model_alias else tabs.get_model_alias(object)
+        return layouts.render_layout(f'{model_alias}-{self.code}', object, request)
+
     def __str__(self):
         """Tab string representation"""
         if not self.name:
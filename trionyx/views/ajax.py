@@ -5,15 +5,54 @@ trionyx.views.ajax
 :copyright: 2019 by Maikel Martens
 :license: GPLv3
 """
+import asyncio
 import logging
+from contextvars import ContextVar
+from functools import update_wrapper, wraps
 from typing import ClassVar, Any
 
+from asgiref.sync import sync_to_async
+from django.db import connections, close_old_connections
 from django.http import JsonResponse
 from django.http.request import HttpRequest
 from django.views.generic import View
 
 logger = logging.getLogger(__name__)
 
+DB_THREAD_SENSITIVE: ContextVar = ContextVar('trionyx_db_thread_sensitive', default=True)
+"""Run database code of async views on the shared thread, set per request by AsyncJsendView"""
+
+
+def is_connection_bound() -> bool:
+    """
+    Check if database code must use the connections of the current thread,
+    because a connection is in a transaction or has execute wrappers (query inspector, render profiler)
+    """
+    return any(connection.in_atomic_block or connection.execute_wrappers for connection in connections.all())
+
+
+def database_sync_to_async(func):
+    """
+    Wrap sync function with database access so it can be awaited in async views
+
+    The function runs in a thread of its own with its own connections, so concurrent requests don't wait
+    on each other. Old connections are closed around the call like Django does around a request.
+    When the connections of the request are bound to the shared thread (see `is_connection_bound`),
+    the function runs on that thread instead.
+    """
+    if DB_THREAD_SENSITIVE.get():
+        return sync_to_async(func)
+
+    @wraps(func)
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
 
 class JsendView(View):
     """Django view for sending JSON response by the JSend specification
@@ -39,13 +78,21 @@ class JsendView(View):
 
     def _handle_request(self, request: HttpRequest, *args, **kwargs):
         """Handle request"""
+        data = None
         try:
             data = self.handle_request(request, *args, **kwargs)
         except Exception as e:
-            logger.exception(e)
-            self.status = self.ERROR
-            self.message = str(e)
+            self.handle_exception(e)
+        return self.create_response(data)
+
+    def handle_exception(self, exception: Exception):
+        """Log exception and set error status"""
+        logger.exception(exception, exc_info=exception)
+        self.status = self.ERROR
+        self.message = str(exception)
 
+    def create_response(self, data: Any) -> JsonResponse:
+        """Create JSend response"""
         if self.status == self.ERROR:
             jsend = {
                 'status': self.status,
@@ -68,3 +115,50 @@ class JsendView(View):
     def post(self, request: HttpRequest, *args, **kwargs):
         """Handle POST request"""
         return self._handle_request(request, *args, **kwargs)
+
+
+class AsyncJsendView(JsendView):
+    """JsendView for ASGI where `handle_request` can be an `async def`
+
+    Dispatch (permission checks, mixins) runs in a thread and the awaited `handle_request`
+    in the event loop, so a worker is not blocked while the request waits on slow queries.
+    Django has no async ORM yet, database access must be wrapped with `database_sync_to_async`,
+    which runs it in its own thread so slow queries of concurrent requests overlap:
+
+        class StatsJsendView(AsyncJsendView):
+            async def handle_request(self, request):
+                return await database_sync_to_async(get_stats)(request.user)
+
+    Under WSGI the view is run with `async_to_sync` by Django.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        """Create async view function"""
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            token = DB_THREAD_SENSITIVE.set(await sync_to_async(is_connection_bound)())
+            try:
+                response = await database_sync_to_async(view)(request, *args, **kwargs)
+                if asyncio.iscoroutine(response):
+                    response = await response
+                return response
+            finally:
+                DB_THREAD_SENSITIVE.reset(token)
+
+        update_wrapper(async_view, view)
+        return async_view
+
+    async def _handle_request(self, request: HttpRequest, *args, **kwargs):
+        """Handle request"""
+        data = None
+        try:
+            if asyncio.iscoroutinefunction(self.handle_request):
+                data = await self.handle_request(request, *args, **kwargs)
+            else:
+                data = await database_sync_to_async(self.handle_request)(request, *args, **kwargs)
+        except Exception as e:
+            # Exception is logged to database by the LogDBHandler
+            await database_sync_to_async(self.handle_exception)(e)
+        return self.create_response(data)
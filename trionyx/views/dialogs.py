@@ -180,7 +180,7 @@ class LayoutDialog(DialogView):
         """Render layout for object"""
         from trionyx.views import layouts
         try:
-            content = layouts.get_layout(self.kwargs.get('code'), self.object).render(self.request)
+            content = layouts.render_layout(self.kwargs.get('code'), self.object, self.request)
         except Exception as e:
             logger.exception(e)
             content = _('Layout does not exists')
@@ -5,6 +5,7 @@ trionyx.views.mixins
 :copyright: 2018 by Maikel Martens
 :license: GPLv3
 """
+import asyncio
 from typing import Optional, Type, Any
 
 from django.apps import apps
@@ -12,7 +13,9 @@ from django.db.models import Model
 from django.http.request import HttpRequest
 from django.core.exceptions import PermissionDenied
 from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
 
+from trionyx import db
 from trionyx.config import models_config, ModelConfig
 
 
@@ -86,6 +89,47 @@ class ModelPermissionMixin:
         return None
 
 
+class ReadReplicaMixin:
+    """Mixin that reads from the read replicas, when configured with `TX_DB_REPLICAS`"""
+
+    def dispatch(self, request, *args, **kwargs):
+        """Use read replicas for request"""
+        db.use_read_replica(getattr(request, 'user', None))
+        return super().dispatch(request, *args, **kwargs)  # type: ignore
+
+
+class ConditionalResponseMixin:
+    """Mixin that adds an ETag to GET responses, with a 304 response when the client already has that version"""
+
+    def get_etag(self) -> Optional[str]:
+        """Get ETag of response, None when response has no ETag"""
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        """Handle If-None-Match for GET requests"""
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)  # type: ignore
+
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)  # type: ignore
+
+        if asyncio.iscoroutine(response):
+            # Response of async handler (AsyncJsendView)
+            async def add_etag(coroutine):
+                return self.add_etag(await coroutine, etag)
+            return add_etag(response)
+        return self.add_etag(response, etag)
+
+    def add_etag(self, response, etag: Optional[str]):
+        """Add ETag and cache headers to response"""
+        if etag and response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
 class SessionValueMixin:
     """Mixin for handling session values"""
 
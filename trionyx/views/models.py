@@ -25,15 +25,20 @@ from django.http import Http404, StreamingHttpResponse
 from django.urls import reverse
 from django.core.paginator import Paginator
 from django.contrib import messages
-from watson import search as watson
 from django.template.loader import render_to_string
 from django.contrib.contenttypes.models import ContentType
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import ugettext_lazy as _, get_language
+from django.utils import timezone
+from django.db.models import Max, Count
 
-from trionyx.views.mixins import ModelClassMixin, SessionValueMixin, ModelPermissionMixin
+from trionyx.views.mixins import (
+    ModelClassMixin, SessionValueMixin, ModelPermissionMixin, ReadReplicaMixin, ConditionalResponseMixin
+)
+from trionyx import utils
 from trionyx.forms.helper import FormHelper
-from trionyx.models import filter_queryset_with_user_filters
-from .ajax import JsendView
+from trionyx.models import filter_queryset_with_user_filters, filter_verbose_name_prefix, keyset_paginate, RelationPlanner
+from trionyx.trionyx.search import get_search_backend
+from .ajax import JsendView, AsyncJsendView, database_sync_to_async
 
 logger = logging.getLogger(__name__)
 
@@ -197,36 +202,58 @@ class ModelListMixin(ModelClassMixin, SessionValueMixin):
 
     def get_queryset(self):
         """Get qeuryset for model"""
+        return self.plan_relations(self.get_filtered_queryset()).order_by(self.get_sort())
+
+    def get_filtered_queryset(self):
+        """Get queryset with search and filters applied"""
         config = self.get_model_config()
         query = self.search_queryset()
 
         if config.list_update_queryset:
             query = config.list_update_queryset(query)
 
-        query = filter_queryset_with_user_filters(query, self.get_filters(), self.request)
+        return filter_queryset_with_user_filters(query, self.get_filters(), self.request)
 
-        fields = self.get_all_fields()
-        prefetch_related = self.get_model_config().list_prefetch_related if self.get_model_config().list_prefetch_related else []
-        for field in self.get_current_fields():
-            field_parts = field.split('__')
-            if len(field_parts) > 1:
-                prefetch_related.append('__'.join(field_parts[:-1]))
-            elif fields[field]['type'] == 'related':
-                prefetch_related.append(field)
+    def plan_relations(self, query):
+        """Load relations of current fields with select_related or prefetch_related and only select the used columns"""
+        return self.get_relation_planner().apply(query, only_columns=self.get_model_config().list_only_columns)
 
-        if prefetch_related:
-            query = query.prefetch_related(*set(prefetch_related))
+    def get_relation_planner(self):
+        """Get relation planner for the current fields"""
+        from trionyx.renderer import renderer
+        config = self.get_model_config()
+        fields = config.get_list_fields()
+
+        planner = RelationPlanner(config.model)
+        for lookup in config.list_prefetch_related or []:
+            planner.add_prefetch(lookup)
 
-        return query.order_by(self.get_sort())
+        for column in config.list_extra_columns or []:
+            planner.add_field(column, default_renderer=False)
+
+        for field in self.get_current_fields():
+            planner.add_field(
+                field,
+                default_renderer=fields[field]['renderer'] == renderer.render_field,
+                columns=[*fields[field].get('columns', []), *getattr(fields[field]['renderer'], 'required_columns', [])],
+            )
+        return planner
 
     def search_queryset(self):
         """Get search query set"""
         queryset = self.get_model_class().objects.get_queryset()
-        return watson.filter(queryset, self.get_search(), ranking=False)
+        search = self.get_search()
+        return get_search_backend().filter(queryset, search) if search else queryset
 
 
-class ListJsendView(ModelPermissionMixin, JsendView, ModelListMixin):
-    """Ajax list view"""
+class ListJsendView(ModelPermissionMixin, ReadReplicaMixin, ConditionalResponseMixin, AsyncJsendView, ModelListMixin):
+    """
+    Ajax list view
+
+    GET requests use the list state saved in the session and have an ETag based on the count and
+    last change of the listed objects (and of joined relations), so pollers get a 304 when nothing changed.
+    The list queries run with `database_sync_to_async`, under ASGI the worker is free while they run.
+    """
 
     permission_type = 'view'
 
@@ -238,8 +265,35 @@ class ListJsendView(ModelPermissionMixin, JsendView, ModelListMixin):
         self.sort = None
         self.fields = None
 
-    def handle_request(self, request, *args, **kwargs):
+    def get_etag(self):
+        """Get ETag from list state and a count and max updated_at aggregate of the listed objects"""
+        version_fields = self.get_relation_planner().get_version_fields()
+        if version_fields is None:
+            return None
+
+        versions = self.get_filtered_queryset().aggregate(
+            count=Count('pk'),
+            **{f'version_{index}': Max(field) for index, field in enumerate(version_fields)}
+        )
+        return utils.create_etag(
+            self.request.get_full_path(),
+            *[versions[key] for key in sorted(versions)],
+            self.get_search(),
+            self.get_filters(),
+            self.get_sort(),
+            self.get_page_size(),
+            self.get_session_value('page', 1),
+            self.get_current_fields(),
+            get_language(),
+            timezone.get_current_timezone_name(),
+        )
+
+    async def handle_request(self, request, *args, **kwargs):
         """Give back list items + config"""
+        return await database_sync_to_async(self.get_list_data)()
+
+    def get_list_data(self):
+        """Get list items + config"""
         paginator = self.get_paginator()
         # Call search first, it will reset page if search is changed
         search = self.get_search()
@@ -281,7 +335,7 @@ class ListJsendView(ModelPermissionMixin, JsendView, ModelListMixin):
         return items
 
 
-class ListExportView(ModelPermissionMixin, View, ModelListMixin):
+class ListExportView(ModelPermissionMixin, ReadReplicaMixin, View, ModelListMixin):
     """View for downloading an export of a list view"""
 
     permission_type = 'view'
@@ -330,23 +384,71 @@ class ListExportView(ModelPermissionMixin, View, ModelListMixin):
         return response
 
 
-class ListChoicesJsendView(ModelPermissionMixin, JsendView, ModelListMixin):
-    """View for getting choices list for related field"""
+class ListChoicesJsendView(ModelPermissionMixin, ConditionalResponseMixin, JsendView, ModelListMixin):
+    """
+    View for getting choices list for related field
+
+    Choices are keyset paginated on (verbose_name, pk) with a hard page size cap and can be searched on
+    verbose_name prefix with `q` or be fetched for given `ids`. Response has an ETag based on the
+    max updated_at of the related table, so unchanged choices are served with a 304.
+    """
 
     permission_type = 'view'
 
-    def handle_request(self, request, *args, **kwargs):
-        """Build choices list for related field"""
-        try:
-            ModelClass = self.get_model_class()
-            fields = request.GET.get('field').split('__')
-            RelatedClass = getattr(ModelClass, fields[0]).field.related_model
+    page_size = 50
+    """Max choices returned per request"""
 
-            for field in fields[1:]:
+    def get_related_model(self):
+        """Get related model of requested field, returns None for invalid field"""
+        try:
+            RelatedClass = self.get_model_class()
+            for field in self.request.GET.get('field').split('__'):
                 RelatedClass = getattr(RelatedClass, field).field.related_model
         except Exception:
-            return []
-        return list(RelatedClass.objects.values_list('id', 'verbose_name'))
+            return None
+        return RelatedClass
+
+    def get_etag(self):
+        """Get ETag of choices response, based on request and the count and last change of related table"""
+        RelatedClass = self.get_related_model()
+        if not RelatedClass or not hasattr(RelatedClass, 'updated_at'):
+            return None
+
+        # Base manager is used so soft deleted objects also change the ETag, count changes on hard deletes
+        versions = RelatedClass._base_manager.aggregate(count=Count('pk'), last_change=Max('updated_at'))
+        return utils.create_etag(
+            self.request.get_full_path(),
+            versions['count'],
+            versions['last_change'].isoformat() if versions['last_change'] else '',
+            get_language(),
+        )
+
+    def handle_request(self, request, *args, **kwargs):
+        """Build choices list for related field"""
+        RelatedClass = self.get_related_model()
+        if not RelatedClass:
+            return {'choices': [], 'more': False, 'cursor': None}
+
+        query = RelatedClass.objects.values('pk', 'verbose_name')
+        if request.GET.get('ids'):
+            return {
+                'choices': [
+                    [row['pk'], row['verbose_name']]
+                    for row in query.filter(pk__in=request.GET['ids'].split(',')[:self.page_size])
+                ],
+                'more': False,
+                'cursor': None,
+            }
+
+        if request.GET.get('q'):
+            query = filter_verbose_name_prefix(query, request.GET['q'].strip())
+
+        rows, cursor = keyset_paginate(query, ['verbose_name', 'pk'], request.GET.get('cursor'), page_size=self.page_size)
+        return {
+            'choices': [[row['pk'], row['verbose_name']] for row in rows],
+            'more': cursor is not None,
+            'cursor': cursor,
+        }
 
 
 # =============================================================================
@@ -444,18 +546,32 @@ class DetailTabView(ModelPermissionMixin, DetailView, ModelClassMixin):
         return list(tabs.get_tabs(self.get_model_alias(), self.object))
 
 
-class DetailTabJsendView(ModelPermissionMixin, JsendView, ModelClassMixin):
-    """View for getting tab view with ajax"""
+class DetailTabJsendView(ModelPermissionMixin, ConditionalResponseMixin, JsendView, ModelClassMixin):
+    """
+    View for getting tab view with ajax
+
+    Tabs that are registered with `cache=True` have an ETag based on the fragment cache key,
+    which changes with the object version, the declared `cache_depends_on` models, user permissions and locale.
+    """
 
     permission_type = 'view'
 
+    def get_model_alias(self):
+        """Get model alias of tab"""
+        return self.request.GET.get('model_alias') or '{}.{}'.format(self.kwargs.get('app'), self.kwargs.get('model'))
+
+    def get_etag(self):
+        """Get ETag for tabs with cache enabled"""
+        from trionyx.views import layouts
+        key = layouts.get_fragment_key(f"{self.get_model_alias()}-{self.request.GET.get('tab')}", self.get_object(), self.request)
+        return utils.create_etag(self.request.get_full_path(), key) if key else None
+
     def handle_request(self, request, app, model, pk):
         """Render and return tab"""
         from trionyx.views import tabs
 
         tab_code = request.GET.get('tab')
-        model_alias = request.GET.get('model_alias')
-        model_alias = model_alias if model_alias else '{}.{}'.format(app, model)
+        model_alias = self.get_model_alias()
 
         item = tabs.get_tab(model_alias, self.get_object(), tab_code)
 
@@ -467,7 +583,7 @@ class DetailTabJsendView(ModelPermissionMixin, JsendView, ModelClassMixin):
                     'tab': tab_code,
                 }),
             }, request=request),
-            'content': item.get_layout(self.get_object()).render(request),
+            'content': item.render_layout(self.get_object(), request),
         }
 
     def get_object(self):
@@ -490,7 +606,7 @@ class LayoutView(DetailTabView):
         context = super().get_context_data(**kwargs)
         from trionyx.views import layouts
         try:
-            context['layout'] = layouts.get_layout(self.kwargs.get('code'), self.object).render(self.request)
+            context['layout'] = layouts.render_layout(self.kwargs.get('code'), self.object, self.request)
         except Exception:
             raise Http404()
         return context